@@ -0,0 +1,9 @@
+"""Startar databastjänsten, SERVER_MODE=sync (Flask och waitress, standard) eller async (ASGI och asyncpg)"""
+import os
+
+if os.environ.get('SERVER_MODE', 'sync') == 'async':
+    from .asgi import main
+else:
+    from .database import main
+
+main()
@@ -0,0 +1,577 @@
+"""
+Asynkron variant av databastjänsten (SERVER_MODE=async): samma routes och svar som
+Flask-appen i database.py, men som en ASGI-app på uvicorn med en asyncpg-pool.
+Väntande long-poll anrop och långsamma klienter kostar en korutin istället för en tråd.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+import uuid
+import zlib
+
+import asyncpg
+import uvicorn
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.datastructures import MIMEAccept, MultiDict
+from werkzeug.http import parse_accept_header
+
+from .bulk import import_channels_async, parse_body, validate
+from .config_cache import AsyncConfigCache
+from .database import (CHANGES_TIMEOUT, DB_CONFIG, DB_STATEMENT_TIMEOUT_MS, MAX_BULK_ROWS, PARTITION_MAINTENANCE_INTERVAL,
+                       PORT, SSE_KEEPALIVE, STATUS_CACHE_TTL, STREAM_BATCH_SIZE, channel_query, request_count,
+                       request_latency, status_filters)
+from .results import (PARTITION_DAYS_AHEAD, RESULT_COLUMNS, RESULTS_UNNEST, accepted_window, column_arrays,
+                      parse_results, status_retention_days)
+from .rollups import RESOLUTIONS, UPSERT_ROLLUP_SQL, minute_retention_days, rollup_columns, rollup_query, rollup_series
+from .status_store import (SELECT_LATEST_SQL, UPSERT_LATEST_SQL, AsyncStatusEvents, filter_snapshot, snapshot,
+                           sse_event, transitions)
+
+# Anslutningar i asyncpg-poolen, och hur länge ett anrop väntar på en innan det får 503
+ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 20))
+DB_CHECKOUT_TIMEOUT = float(os.environ.get('DB_CHECKOUT_TIMEOUT', 5))
+
+_pool = None
+_rendered = {}
+last_partition_maintenance = 0.0
+# Referenser till bakgrundstasks så att de inte skräpsamlas innan de kört klart
+_background = set()
+
+
+class DatabaseBusy(Exception):
+    """Ingen anslutning blev ledig inom DB_CHECKOUT_TIMEOUT"""
+
+
+@contextlib.asynccontextmanager
+async def db_connection():
+    """Lånar en anslutning ur asyncpg-poolen"""
+    try:
+        conn = await _pool.acquire(timeout=DB_CHECKOUT_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise DatabaseBusy()
+    try:
+        yield conn
+    finally:
+        await _pool.release(conn)
+
+
+def numbered(sql):
+    """Byt psycopg2-platshållare (%s) mot asyncpg:s ($1, $2, ...)"""
+    parts = sql.split('%s')
+    return parts[0] + ''.join(f"${i}{part}" for i, part in enumerate(parts[1:], 1))
+
+
+RESULT_INSERT_SQL = numbered(
+    f"INSERT INTO channel_status ({', '.join(RESULT_COLUMNS)}) "
+    f"SELECT {', '.join('to_timestamp(checked_at)' if c == 'checked_at' else c for c in RESULT_COLUMNS)} "
+    f"FROM {RESULTS_UNNEST}"
+)
+UPSERT_LATEST_ASYNC_SQL = numbered(UPSERT_LATEST_SQL)
+UPSERT_ROLLUP_ASYNC_SQL = {seconds: numbered(sql) for seconds, sql in UPSERT_ROLLUP_SQL.items()}
+
+status_events = AsyncStatusEvents()
+_status_cache = None
+_status_lock = asyncio.Lock()
+
+
+async def load_channels(conn):
+    rows = await conn.fetch("SELECT id, channel_name, channel_url FROM channels ORDER BY id;")
+    return [{"id": row[0], "name": row[1], "url": row[2]} for row in rows]
+
+
+async def load_settings(conn):
+    return {row[0]: row[1] for row in await conn.fetch("SELECT key, value FROM settings;")}
+
+
+config_cache = AsyncConfigCache(None, {'channels': load_channels, 'settings': load_settings})
+
+
+def etag_matches(request, etag):
+    """Som werkzeugs if_none_match.contains: jämför taggar utan citattecken och W/-prefix"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix('W/').strip('"') for tag in header.split(',')}
+    return etag in tags or '*' in tags
+
+
+def with_version(response, etag, version):
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['X-Config-Version'] = str(version)
+    return response
+
+
+def not_modified(etag, version):
+    return with_version(Response(status_code=304), etag, version)
+
+
+async def cached_response(request, name, wrap=None):
+    """Svar från cachen med ETag och X-Config-Version, JSON-kroppen serialiseras en gång per version"""
+    version, value = await config_cache.get(name)
+    etag = f"{name}-{version}"
+    if etag_matches(request, etag):
+        return not_modified(etag, version)
+    rendered = _rendered.get(name)
+    if rendered is None or rendered[0] != version:
+        rendered = _rendered[name] = (version, json.dumps({wrap: value} if wrap else value).encode())
+    return with_version(Response(rendered[1], media_type='application/json'), etag, version)
+
+
+async def read_json(request):
+    """request.get_json(silent=True): None om kroppen inte är giltig JSON"""
+    try:
+        return json.loads(await request.body())
+    except ValueError:
+        return None
+
+
+async def stream_channels(fields, sql, params):
+    """NDJSON, en kanal per rad, läst i omgångar från en server-side cursor"""
+    async with db_connection() as conn:
+        async with conn.transaction():
+            async for row in conn.cursor(numbered(sql), *params, prefetch=STREAM_BATCH_SIZE):
+                yield json.dumps(dict(zip(fields, row))) + "\n"
+
+
+async def get_channels(request):
+    accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+    streaming = (request.query_params.get('format') == 'ndjson' or
+                 accept.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson')
+    if not streaming and not request.query_params:
+        return await cached_response(request, 'channels', wrap='channels')
+
+    try:
+        fields, sql, params, limit = channel_query(MultiDict(request.query_params.multi_items()))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+
+    version, _ = await config_cache.get('channels')
+    etag = f"channels-{version}-{zlib.crc32(request.scope['query_string']):08x}"
+    if etag_matches(request, etag):
+        return not_modified(etag, version)
+
+    if streaming:
+        response = StreamingResponse(stream_channels(fields, sql, params), media_type='application/x-ndjson')
+    else:
+        async with db_connection() as conn:
+            channels = [dict(zip(fields, row)) for row in await conn.fetch(numbered(sql), *params)]
+        body = {"channels": channels}
+        if limit is not None:
+            body["next_after_id"] = channels[-1]['id'] if len(channels) == limit else None
+        response = JSONResponse(body)
+    return with_version(response, etag, version)
+
+
+async def update_assignments(request):
+    data = await read_json(request) or {}
+    assignments = data.get("assignments") if isinstance(data, dict) else None
+    if not isinstance(assignments, dict):
+        return JSONResponse({"error": "assignments must be an object of worker_id -> channel ids"}, 400)
+    try:
+        wanted = {int(channel_id): str(worker_id) for worker_id, ids in assignments.items() for channel_id in ids}
+    except (TypeError, ValueError):
+        return JSONResponse({"error": "Channel ids must be integers"}, 400)
+
+    async with db_connection() as conn:
+        async with conn.transaction():
+            rows = await conn.fetch("SELECT id, worker_id FROM channels;")
+            changes = [(channel_id, wanted.get(channel_id)) for channel_id, current in rows
+                       if wanted.get(channel_id) != current]
+            # Triggern räknar upp kanalversionen även för en tom UPDATE, så hoppa över den
+            if changes:
+                await conn.execute(
+                    "UPDATE channels SET worker_id = v.worker_id "
+                    "FROM unnest($1::int[], $2::text[]) AS v(id, worker_id) WHERE channels.id = v.id",
+                    [c[0] for c in changes], [c[1] for c in changes]
+                )
+    if changes:
+        config_cache.invalidate()
+    return JSONResponse({"updated": len(changes)})
+
+
+async def channel_changes(request):
+    try:
+        since = int(request.query_params.get('since', 0))
+    except ValueError:
+        since = 0
+    try:
+        timeout = min(float(request.query_params.get('timeout', CHANGES_TIMEOUT)), CHANGES_TIMEOUT)
+    except ValueError:
+        timeout = CHANGES_TIMEOUT
+
+    # Väntan kostar bara en korutin, så här behövs inget tak som MAX_LONG_POLLS
+    changed = await config_cache.wait_for_change('channels', since, timeout)
+    if changed is None:
+        return Response(status_code=204)
+    version, channels = changed
+    return with_version(JSONResponse({"version": version, "channels": channels}), f"channels-{version}", version)
+
+
+async def add_channel(request):
+    try:
+        data = await read_json(request)
+        if not data:
+            return JSONResponse({"error": "No JSON data provided"}, 400)
+
+        name = data.get("name")
+        url = data.get("url")
+        channel_key = data.get("channel_key", str(uuid.uuid4()))
+
+        if not name or not url:
+            return JSONResponse({"error": "Name and URL are required"}, 400)
+
+        async with db_connection() as conn:
+            new_channel = await conn.fetchrow(
+                "INSERT INTO channels (channel_key, channel_name, channel_url) VALUES ($1, $2, $3) "
+                "RETURNING id, channel_key, channel_name, channel_url;",
+                channel_key, name, url
+            )
+        config_cache.invalidate()
+
+        return JSONResponse({
+            "message": "Channel added successfully",
+            "channel": {
+                "id": new_channel[0],
+                "channel_key": new_channel[1],
+                "name": new_channel[2],
+                "url": new_channel[3]
+            }
+        }, 201)
+
+    except asyncpg.PostgresError as e:
+        print(f"Database error: {e}")
+        return JSONResponse({"error": "Database error occurred"}, 500)
+    except DatabaseBusy:
+        raise
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+
+async def bulk_channels(request):
+    try:
+        raw_rows = parse_body(request.headers.get('content-type'), await request.body())
+    except (ValueError, UnicodeDecodeError) as e:
+        return JSONResponse({"error": f"Could not parse request: {e}"}, 400)
+    if len(raw_rows) > MAX_BULK_ROWS:
+        return JSONResponse({"error": f"At most {MAX_BULK_ROWS} rows per request"}, 413)
+
+    rows, results = validate(raw_rows)
+    if rows:
+        try:
+            async with db_connection() as conn:
+                async with conn.transaction():
+                    results.extend(await import_channels_async(conn, rows))
+        except asyncpg.PostgresError as e:
+            print(f"Database error: {e}")
+            return JSONResponse({"error": "Database error occurred"}, 500)
+        config_cache.invalidate()
+
+    results.sort(key=lambda r: r["row"])
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return JSONResponse({"summary": summary, "results": results})
+
+
+async def get_channel(request):
+    async with db_connection() as conn:
+        channel = await conn.fetchrow("SELECT id, channel_name, channel_url FROM channels WHERE id = $1;",
+                                      request.path_params['channel_id'])
+    if channel is None:
+        return JSONResponse({"error": "Channel not found"}, 404)
+    return JSONResponse({"id": channel[0], "name": channel[1], "url": channel[2]})
+
+
+async def delete_channel(request):
+    channel_id = request.path_params['channel_id']
+    try:
+        async with db_connection() as conn:
+            deleted = await conn.fetchrow("DELETE FROM channels WHERE id = $1 RETURNING id;", channel_id)
+        config_cache.invalidate()
+
+        if deleted:
+            return JSONResponse({"message": f"Channel {channel_id} deleted successfully"}, 200)
+        return JSONResponse({"error": "Channel not found"}, 404)
+
+    except DatabaseBusy:
+        raise
+    except Exception as e:
+        print(f"Error deleting channel: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+
+async def health_check(request):
+    try:
+        async with db_connection() as conn:
+            await conn.fetchval("SELECT 1;")
+        return JSONResponse({"status": "healthy"}, 200)
+    except Exception as e:
+        return JSONResponse({"status": "unhealthy", "error": str(e)}, 500)
+
+
+async def get_settings(request):
+    return await cached_response(request, 'settings')
+
+
+async def update_setting(request):
+    data = await read_json(request) or {}
+    value = data.get("value")
+
+    if not value:
+        return JSONResponse({"error": "Value is required"}, 400)
+
+    async with db_connection() as conn:
+        updated = await conn.fetchrow("UPDATE settings SET value = $1 WHERE key = $2 RETURNING key, value;",
+                                      value, request.path_params['key'])
+    config_cache.invalidate()
+
+    if updated:
+        return JSONResponse({"key": updated[0], "value": updated[1]})
+    return JSONResponse({"error": "Setting not found"}, 404)
+
+
+async def maintain_partitions():
+    """
+    Skapa kommande dagspartitioner och ta bort gamla enligt status_retention_days, i en egen
+    transaktion. Fel loggas, ingest ska inte stanna för att underhållet misslyckas.
+    """
+    try:
+        async with db_connection() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT ensure_channel_status_partitions($1);", PARTITION_DAYS_AHEAD)
+                retention = await conn.fetchval("SELECT value FROM settings WHERE key = 'status_retention_days';")
+                dropped = await conn.fetchval(
+                    "SELECT drop_channel_status_partitions($1);",
+                    status_retention_days({'status_retention_days': retention} if retention else {}))
+                await conn.execute("SELECT prune_channel_rollups();")
+    except Exception as e:
+        print(f"❌ Partitionsunderhåll misslyckades: {e}")
+        return
+    if dropped:
+        print(f"🗑️ Tog bort {dropped} gamla partitioner av channel_status")
+
+
+def schedule_partition_maintenance():
+    """Kör maintain_partitions som en egen task högst en gång per PARTITION_MAINTENANCE_INTERVAL"""
+    global last_partition_maintenance
+    if time.time() - last_partition_maintenance < PARTITION_MAINTENANCE_INTERVAL:
+        return
+    # Ett misslyckat underhåll försöks igen nästa intervall, inte vid varje anrop
+    last_partition_maintenance = time.time()
+    task = asyncio.create_task(maintain_partitions())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def add_results(request):
+    data = await read_json(request)
+    results = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(results, list):
+        return JSONResponse({"error": "Expected a JSON list of results"}, 400)
+
+    schedule_partition_maintenance()
+    _, settings = await config_cache.get('settings')
+    rows, rejected = parse_results(results, accepted_window(settings, time.time()))
+    if not rows:
+        return JSONResponse({"inserted": 0, "rejected": rejected}, 200 if not rejected else 400)
+
+    try:
+        async with db_connection() as conn:
+            async with conn.transaction():
+                # En kolumn-array per kolumn, hela batchen skrivs med en enda sats
+                columns = column_arrays(rows)
+                await conn.execute(RESULT_INSERT_SQL, *columns)
+                changed = transitions(await conn.fetch(UPSERT_LATEST_ASYNC_SQL, *columns))
+                for _, seconds, _ in RESOLUTIONS:
+                    await conn.execute(UPSERT_ROLLUP_ASYNC_SQL[seconds], *rollup_columns(rows, seconds))
+    except asyncpg.PostgresError as e:
+        print(f"Database error: {e}")
+        return JSONResponse({"error": "Database error occurred"}, 500)
+
+    status_events.publish(changed)
+    return JSONResponse({"inserted": len(rows), "rejected": rejected}, 201)
+
+
+async def get_rollups(request):
+    try:
+        _, settings = await config_cache.get('settings')
+        resolution, step, sql, params = rollup_query(MultiDict(request.query_params.multi_items()),
+                                                     minute_retention_days(settings), time.time())
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+
+    try:
+        async with db_connection() as conn:
+            series = rollup_series(await conn.fetch(numbered(sql), *params))
+    except asyncpg.PostgresError as e:
+        print(f"Database error: {e}")
+        return JSONResponse({"error": "Database error occurred"}, 500)
+    return JSONResponse({"resolution": resolution, "step": step, "series": series})
+
+
+async def fleet_status():
+    """Ögonblicksbild av hela flottan, läst med en fråga högst en gång per STATUS_CACHE_TTL"""
+    global _status_cache
+    async with _status_lock:
+        if _status_cache is None or time.monotonic() - _status_cache[0] >= STATUS_CACHE_TTL:
+            async with db_connection() as conn:
+                _status_cache = (time.monotonic(), snapshot(await conn.fetch(SELECT_LATEST_SQL)))
+        return _status_cache[1]
+
+
+async def get_status(request):
+    statuses, renditions = status_filters(request.query_params)
+    try:
+        body = filter_snapshot(await fleet_status(), statuses, renditions)
+    except asyncpg.PostgresError as e:
+        print(f"Database error: {e}")
+        return JSONResponse({"error": "Database error occurred"}, 500)
+    return JSONResponse(dict(body, last_event_id=status_events.last_id))
+
+
+async def status_event_stream(request):
+    """Statusövergångar som server-sent events, en korutin per klient"""
+    _, renditions = status_filters(request.query_params)
+    after = status_events.start_id(request.headers.get('Last-Event-ID', request.query_params.get('last_event_id')))
+
+    async def stream():
+        nonlocal after
+        yield "retry: 5000\n\n"
+        while not status_events.closed:
+            events = await status_events.wait(after, SSE_KEEPALIVE)
+            if not events and not status_events.closed:
+                yield ": keepalive\n\n"
+                continue
+            for event_id, event in events:
+                after = event_id
+                if renditions or event["rendition"] == '':
+                    yield sse_event(event_id, event)
+
+    return StreamingResponse(stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def metrics(request):
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+async def database_busy(request, exc):
+    return JSONResponse({"error": "Database busy, try again"}, 503)
+
+
+def connect_kwargs():
+    """DB_CONFIG med asyncpg:s namn"""
+    return {
+        'database': DB_CONFIG['dbname'],
+        'user': DB_CONFIG['user'],
+        'password': DB_CONFIG['password'],
+        'host': DB_CONFIG['host'],
+        'port': int(DB_CONFIG['port']),
+    }
+
+
+async def create_pool(retries=30, retry_interval=1):
+    """Skapa poolen, och vänta på databasen som wait_for_db gör i sync-läget"""
+    for i in range(retries):
+        try:
+            pool = await asyncpg.create_pool(
+                min_size=1,
+                max_size=ASYNC_DB_POOL_SIZE,
+                timeout=5,
+                server_settings={'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS)},
+                **connect_kwargs()
+            )
+            print("✅ Databasanslutning etablerad")
+            return pool
+        except (OSError, asyncpg.PostgresError, asyncio.TimeoutError):
+            print(f"⏳ Väntar på databas... försök {i+1}/{retries}")
+            await asyncio.sleep(retry_interval)
+    print("❌ Kunde inte ansluta till databasen")
+    raise RuntimeError("Database not available")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global _pool
+    _pool = await create_pool()
+    config_cache.pool = _pool
+    stop_event = asyncio.Event()
+    # Ladda om cachen direkt när kanaler eller inställningar ändras i databasen
+    listener = asyncio.create_task(config_cache.listen(lambda: asyncpg.connect(**connect_kwargs()), stop_event))
+    try:
+        yield
+    finally:
+        stop_event.set()
+        await listener
+        await _pool.close()
+
+
+class RequestMetrics:
+    """ASGI-middleware för samma http_requests_total och http_request_duration_seconds som Flask-appen"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        started = time.time()
+
+        async def send_and_measure(message):
+            if message['type'] == 'http.response.start':
+                request_count.inc()
+                request_latency.observe(time.time() - started)
+            await send(message)
+
+        await self.app(scope, receive, send_and_measure)
+
+
+app = Starlette(
+    routes=[
+        Route('/metrics', metrics),
+        Route('/channels', get_channels, methods=['GET']),
+        Route('/channels', add_channel, methods=['POST']),
+        Route('/channels/assignments', update_assignments, methods=['PUT']),
+        Route('/channels/changes', channel_changes, methods=['GET']),
+        Route('/channels/bulk', bulk_channels, methods=['POST']),
+        Route('/channels/{channel_id:int}', get_channel, methods=['GET']),
+        Route('/channels/{channel_id:int}', delete_channel, methods=['DELETE']),
+        Route('/health', health_check),
+        Route('/settings', get_settings, methods=['GET']),
+        Route('/settings/{key}', update_setting, methods=['PUT']),
+        Route('/results', add_results, methods=['POST']),
+        Route('/rollups', get_rollups, methods=['GET']),
+        Route('/status', get_status, methods=['GET']),
+        Route('/status/events', status_event_stream, methods=['GET']),
+    ],
+    exception_handlers={DatabaseBusy: database_busy},
+    lifespan=lifespan,
+)
+asgi_app = RequestMetrics(app)
+
+
+class ShutdownServer(uvicorn.Server):
+    """uvicorn väntar på pågående svar vid avstängning, SSE-strömmarna avslutas därför direkt"""
+
+    def handle_exit(self, sig, frame):
+        super().handle_exit(sig, frame)
+        loop = asyncio.get_event_loop()
+        loop.call_soon_threadsafe(status_events.close)
+
+
+def main():
+    print("🚀 Starting database service (async)...")
+    # uvicorn hanterar SIGTERM/SIGINT och avslutar lifespan innan processen går ned
+    config = uvicorn.Config(asgi_app, host='0.0.0.0', port=PORT, log_level='warning', access_log=False)
+    ShutdownServer(config).run()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Lasttest av databastjänsten i sync-läge (Flask och waitress) och async-läge (ASGI och asyncpg)
+mot en lokal Postgres. Tjänsten startas i en egen process per läge med DB_* från miljön och
+får samma blandning av anrop: workers som hämtar /channels med If-None-Match och postar
+/results, long-polls mot /channels/changes och /health-prober.
+
+Kör: python -m database_service.benchmarks.loadtest [--modes sync async] [--clients 200]
+     [--long-polls 500] [--duration 20] [--batch-size 100]
+Resultatet skrivs som JSON till stdout. Resultatraderna som skrivs tas bort efteråt.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import psycopg2
+
+LOADTEST_RENDITION = 'loadtest'
+HEALTH_INTERVAL = 5.0
+CHANGES_TIMEOUT = 5
+
+
+class RouteStats:
+    """Latenser och fel för en route"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+
+    def record(self, seconds, status):
+        """status är HTTP-statusen eller namnet på undantaget om anropet inte fick något svar"""
+        self.latencies.append(seconds)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if not isinstance(status, int) or status >= 500:
+            self.errors += 1
+
+    def summary(self, duration):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        return {
+            'requests': len(latencies),
+            'errors': self.errors,
+            'statuses': dict(sorted(self.statuses.items())),
+            'rps': round(len(latencies) / duration, 1),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+        }
+
+
+async def timed(stats, route, call):
+    started = time.perf_counter()
+    try:
+        response = await call()
+        status = response.status_code
+    except httpx.HTTPError as e:
+        response, status = None, type(e).__name__
+    stats.setdefault(route, RouteStats()).record(time.perf_counter() - started, status)
+    return response
+
+
+def synthetic_results(channel_ids, batch_size):
+    now = time.time()
+    return [
+        {'channel_id': channel_ids[i % len(channel_ids)], 'rendition': LOADTEST_RENDITION, 'checked_at': now,
+         'status': 'green', 'response_time': 0.05, 'ttfb': 0.03, 'segment_count': 5, 'check_duration': 0.2}
+        for i in range(batch_size)
+    ]
+
+
+async def worker_client(client, stats, deadline, batch_size):
+    """Som en monitor worker: villkorlig GET av kanalerna och en batch resultat, om och om igen"""
+    etag, channel_ids = None, [0]
+    while time.monotonic() < deadline:
+        headers = {'If-None-Match': etag} if etag else {}
+        response = await timed(stats, 'GET /channels', lambda: client.get('/channels', headers=headers))
+        if response is not None and response.status_code == 200:
+            etag = response.headers.get('ETag')
+            channel_ids = [c['id'] for c in response.json()['channels']] or [0]
+        payload = {'results': synthetic_results(channel_ids, batch_size)}
+        await timed(stats, 'POST /results', lambda: client.post('/results', json=payload))
+
+
+async def long_poll_client(client, stats, deadline):
+    """Som en manager som väntar på kanaländringar"""
+    since = 0
+    while time.monotonic() < deadline:
+        response = await timed(stats, 'GET /channels/changes', lambda: client.get(
+            '/channels/changes', params={'since': since, 'timeout': CHANGES_TIMEOUT}))
+        if response is not None and response.status_code == 200:
+            since = response.json()['version']
+
+
+async def health_client(client, stats, deadline):
+    while time.monotonic() < deadline:
+        await timed(stats, 'GET /health', lambda: client.get('/health'))
+        await asyncio.sleep(HEALTH_INTERVAL)
+
+
+async def run_load(base_url, clients, long_polls, duration, batch_size):
+    limits = httpx.Limits(max_connections=clients + long_polls + 10, max_keepalive_connections=clients + long_polls)
+    stats = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=CHANGES_TIMEOUT + 30) as client:
+        deadline = time.monotonic() + duration
+        tasks = [worker_client(client, stats, deadline, batch_size) for _ in range(clients)]
+        tasks += [long_poll_client(client, stats, deadline) for _ in range(long_polls)]
+        tasks.append(health_client(client, stats, deadline))
+        started = time.monotonic()
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+    return {route: route_stats.summary(elapsed) for route, route_stats in sorted(stats.items())}
+
+
+def process_cpu_seconds(pid):
+    """Användar- och systemtid för en process från /proc (Linux), None annars"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def start_server(mode, port, timeout=30):
+    """Starta databastjänsten i SERVER_MODE=mode och vänta tills /health svarar"""
+    env = dict(os.environ, SERVER_MODE=mode, PORT=str(port))
+    process = subprocess.Popen([sys.executable, '-m', 'database_service'], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/health', timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Database service did not start in {mode} mode")
+
+
+def cleanup():
+    conn = psycopg2.connect(
+        dbname=os.environ.get('DB_NAME', 'channeldb'), user=os.environ.get('DB_USER', 'postgres'),
+        password=os.environ.get('DB_PASSWORD'), host=os.environ.get('DB_HOST', 'localhost'),
+        port=os.environ.get('DB_PORT', '5432'))
+    with conn, conn.cursor() as cur:
+        for table in ('channel_status', 'channel_status_latest', 'channel_rollup_1m', 'channel_rollup_1h'):
+            cur.execute(f"DELETE FROM {table} WHERE rendition = %s;", (LOADTEST_RENDITION,))
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['sync', 'async'], choices=['sync', 'async'])
+    parser.add_argument('--clients', type=int, default=200, help="samtidiga workers som hämtar kanaler och postar resultat")
+    parser.add_argument('--long-polls', type=int, default=500, help="samtidiga long-polls mot /channels/changes")
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--batch-size', type=int, default=100, help="resultat per POST /results")
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--keep-results', action='store_true', help="ta inte bort resultatraderna efteråt")
+    args = parser.parse_args()
+
+    runs = []
+    for mode in args.modes:
+        process = start_server(mode, args.port)
+        try:
+            cpu_before = process_cpu_seconds(process.pid)
+            routes = asyncio.run(run_load(f'http://127.0.0.1:{args.port}', args.clients, args.long_polls,
+                                          args.duration, args.batch_size))
+            cpu_after = process_cpu_seconds(process.pid)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        runs.append({
+            'mode': mode,
+            'server_cpu_seconds': round(cpu_after - cpu_before, 2) if cpu_before is not None else None,
+            'routes': routes,
+        })
+    if not args.keep_results:
+        cleanup()
+
+    print(json.dumps({
+        'benchmark': 'database_service_load',
+        'clients': args.clients,
+        'long_polls': args.long_polls,
+        'duration': args.duration,
+        'batch_size': args.batch_size,
+        'runs': runs,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import csv
+import io
+import json
+
+# Kolumnnamn som accepteras i JSON och CSV, mappade till kolumnerna i channels
+FIELD_ALIASES = {
+    'channel_key': 'channel_key',
+    'key': 'channel_key',
+    'channel_name': 'channel_name',
+    'name': 'channel_name',
+    'channel_url': 'channel_url',
+    'url': 'channel_url',
+    'channel_description': 'channel_description',
+    'description': 'channel_description',
+    'delete': 'delete',
+}
+IMPORT_COLUMNS = ('row_no', 'channel_key', 'channel_name', 'channel_url', 'channel_description', 'delete')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+def parse_body(content_type, body):
+    """Läs en bulk-begäran som JSON (lista eller {"channels": [...]}) eller CSV med rubrikrad"""
+    if content_type and 'csv' in content_type:
+        return list(csv.DictReader(io.StringIO(body.decode('utf-8-sig'))))
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get('channels')
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of channels or {\"channels\": [...]}")
+    return data
+
+
+def normalize(raw):
+    """Gör om en rad till kolumnnamn. Returnerar (rad, fel)."""
+    if not isinstance(raw, dict):
+        return None, "Row must be an object"
+    row = {}
+    for name, value in raw.items():
+        column = FIELD_ALIASES.get(str(name).strip().lower())
+        if column is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        row[column] = value if value != '' else None
+
+    delete = row.get('delete')
+    row['delete'] = delete if isinstance(delete, bool) else str(delete).lower() in TRUE_VALUES
+    if not row.get('channel_key'):
+        return None, "channel_key is required"
+    if not row['delete'] and not (row.get('channel_name') and row.get('channel_url')):
+        return None, "name and url are required"
+    return row, None
+
+
+def validate(raw_rows):
+    """
+    Validera raderna. Returnerar (giltiga rader med row_no, resultat för ogiltiga).
+    En channel_key som förekommer flera gånger gäller bara första raden.
+    """
+    rows, results, seen = [], [], set()
+    for row_no, raw in enumerate(raw_rows):
+        row, error = normalize(raw)
+        if row is not None and row['channel_key'] in seen:
+            row, error = None, "Duplicate channel_key in request"
+        if row is None:
+            results.append({"row": row_no, "status": "error", "error": error})
+            continue
+        seen.add(row['channel_key'])
+        row['row_no'] = row_no
+        rows.append(row)
+    return rows, results
+
+
+def copy_buffer(rows):
+    """CSV för COPY ... FROM STDIN, tomma fält blir NULL"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['' if row.get(c) is None else row.get(c) for c in IMPORT_COLUMNS])
+    buffer.seek(0)
+    return buffer
+
+
+STAGING_TABLE_SQL = """
+    CREATE TEMP TABLE channel_import (
+        row_no INTEGER,
+        channel_key TEXT,
+        channel_name TEXT,
+        channel_url TEXT,
+        channel_description TEXT,
+        delete BOOLEAN
+    ) ON COMMIT DROP;
+"""
+UPSERT_SQL = """
+    INSERT INTO channels (channel_key, channel_name, channel_url, channel_description)
+    SELECT channel_key, channel_name, channel_url, channel_description FROM channel_import WHERE NOT delete
+    ON CONFLICT (channel_key) DO UPDATE SET
+        channel_name = EXCLUDED.channel_name,
+        channel_url = EXCLUDED.channel_url,
+        channel_description = COALESCE(EXCLUDED.channel_description, channels.channel_description)
+    WHERE (channels.channel_name, channels.channel_url) IS DISTINCT FROM (EXCLUDED.channel_name, EXCLUDED.channel_url)
+       OR (EXCLUDED.channel_description IS NOT NULL
+           AND EXCLUDED.channel_description IS DISTINCT FROM channels.channel_description)
+    RETURNING id, channel_key, xmax = 0;
+"""
+DELETE_SQL = """
+    DELETE FROM channels c USING channel_import i
+    WHERE i.delete AND c.channel_key = i.channel_key
+    RETURNING c.id, c.channel_key;
+"""
+# Rader som inte ändrade något: oförändrade kanaler och borttagningar av okända nycklar
+REMAINING_SQL = """
+    SELECT i.channel_key, c.id FROM channel_import i
+    LEFT JOIN channels c ON c.channel_key = i.channel_key
+"""
+
+
+def import_records(rows):
+    """Raderna som tupler i IMPORT_COLUMNS-ordning med rätt typer, för COPY med asyncpg"""
+    return [
+        (row['row_no'],) + tuple(None if row.get(c) is None else str(row[c]) for c in IMPORT_COLUMNS[1:-1])
+        + (row['delete'],)
+        for row in rows
+    ]
+
+
+def collect_results(rows, upserted, deleted, remaining):
+    """Ett resultat per rad utifrån raderna som RETURNING och REMAINING_SQL gav"""
+    results = {}
+    for channel_id, key, inserted in upserted:
+        results[key] = (channel_id, "created" if inserted else "updated")
+    for channel_id, key in deleted:
+        results[key] = (channel_id, "deleted")
+    for key, channel_id in remaining:
+        if key not in results:
+            results[key] = (channel_id, "unchanged" if channel_id is not None else "not_found")
+    return [
+        {"row": row['row_no'], "channel_key": row['channel_key'], "id": results[row['channel_key']][0],
+         "status": results[row['channel_key']][1]}
+        for row in rows
+    ]
+
+
+def import_channels(cur, rows):
+    """
+    Upsert och borttagning av kanaler via en temporär staging-tabell, i anroparens transaktion.
+    Nya kanaler får id från sekvensen. Returnerar ett resultat per rad.
+    """
+    cur.execute(STAGING_TABLE_SQL)
+    cur.copy_expert(f"COPY channel_import ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", copy_buffer(rows))
+    cur.execute(UPSERT_SQL)
+    upserted = cur.fetchall()
+    cur.execute(DELETE_SQL)
+    deleted = cur.fetchall()
+    cur.execute(REMAINING_SQL)
+    return collect_results(rows, upserted, deleted, cur.fetchall())
+
+
+async def import_channels_async(conn, rows):
+    """Samma som import_channels för en asyncpg-anslutning, i anroparens transaktion"""
+    await conn.execute(STAGING_TABLE_SQL)
+    await conn.copy_records_to_table('channel_import', records=import_records(rows), columns=IMPORT_COLUMNS)
+    upserted = await conn.fetch(UPSERT_SQL)
+    deleted = await conn.fetch(DELETE_SQL)
+    remaining = await conn.fetch(REMAINING_SQL)
+    return collect_results(rows, upserted, deleted, remaining)
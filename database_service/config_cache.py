@@ -0,0 +1,214 @@
+import asyncio
+import select
+import threading
+import time
+
+import asyncpg
+import psycopg2
+import psycopg2.extensions
+
+NOTIFY_CHANNEL = 'config_changed'
+# Utan LISTEN-anslutning jämförs versionen mot databasen högst så här ofta
+DEFAULT_REVALIDATE_AFTER = 5.0
+
+
+class ConfigCache:
+    """
+    Cache av kanaler och inställningar i databastjänstens process.
+
+    Varje namn har ett versionsnummer från tabellen config_version som triggers
+    räknar upp vid ändringar. Cachen laddas om när versionen ändrats, antingen
+    direkt via LISTEN/NOTIFY eller, utan lyssnare, när den är äldre än
+    revalidate_after sekunder. Väntande long-poll anrop väcks vid varje ny version.
+    """
+
+    def __init__(self, cursor, loaders, revalidate_after=DEFAULT_REVALIDATE_AFTER, clock=time.monotonic):
+        self.cursor = cursor
+        self.loaders = loaders
+        self.revalidate_after = revalidate_after
+        self.clock = clock
+        self.listening = False
+        self._versions = {}
+        self._values = {}
+        self._checked_at = None
+        self._changed = threading.Condition()
+        self._refresh_lock = threading.Lock()
+
+    def get(self, name):
+        """Returnerar (version, värde), laddar om från databasen om cachen kan vara inaktuell"""
+        if self._stale():
+            self.refresh()
+        with self._changed:
+            return self._versions[name], self._values[name]
+
+    def _stale(self):
+        if self._checked_at is None:
+            return True
+        return not self.listening and self.clock() - self._checked_at >= self.revalidate_after
+
+    def invalidate(self):
+        """Tvinga omladdning vid nästa läsning, t.ex. direkt efter en skrivning i den här processen"""
+        self._checked_at = None
+
+    def refresh(self):
+        """Läs versionerna och ladda om det som ändrats"""
+        with self._refresh_lock:
+            with self.cursor() as cur:
+                cur.execute("SELECT name, version FROM config_version;")
+                versions = dict(cur.fetchall())
+                changed = {
+                    name: loader(cur) for name, loader in self.loaders.items()
+                    if name not in self._versions or versions.get(name) != self._versions[name]
+                }
+            if changed:
+                with self._changed:
+                    for name, value in changed.items():
+                        self._versions[name] = versions.get(name, 0)
+                        self._values[name] = value
+                    self._changed.notify_all()
+            self._checked_at = self.clock()
+
+    def wait_for_change(self, name, since, timeout):
+        """Blockera tills versionen för name är nyare än since. Returnerar (version, värde) eller None vid timeout."""
+        deadline = self.clock() + timeout
+        version, value = self.get(name)
+        while version <= since:
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return None
+            with self._changed:
+                if self._versions[name] <= since:
+                    self._changed.wait(remaining if self.listening else min(remaining, self.revalidate_after))
+            version, value = self.get(name)
+        return version, value
+
+    def listen(self, connect, stop_event, retry_interval=5.0):
+        """Lyssna på NOTIFY config_changed på en egen anslutning och ladda om vid varje ändring"""
+        while not stop_event.is_set():
+            conn = None
+            try:
+                conn = connect()
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {NOTIFY_CHANNEL};")
+                # Ändringar som skett innan LISTEN började gäller
+                self.refresh()
+                self.listening = True
+                print("👂 Lyssnar på konfigurationsändringar")
+                while not stop_event.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self.refresh()
+            except psycopg2.Error as e:
+                print(f"❌ Tappade LISTEN-anslutningen: {e}")
+            finally:
+                self.listening = False
+                if conn is not None:
+                    conn.close()
+            stop_event.wait(retry_interval)
+
+
+class AsyncConfigCache:
+    """
+    ConfigCache för den asynkrona servern. Samma versionering, men laddas med en
+    asyncpg-pool och väntande long-poll anrop är korutiner istället för trådar.
+    Loaders tar en asyncpg-anslutning.
+    """
+
+    def __init__(self, pool, loaders, revalidate_after=DEFAULT_REVALIDATE_AFTER, clock=time.monotonic):
+        self.pool = pool
+        self.loaders = loaders
+        self.revalidate_after = revalidate_after
+        self.clock = clock
+        self.listening = False
+        self._versions = {}
+        self._values = {}
+        self._checked_at = None
+        self._changed = asyncio.Condition()
+        self._refresh_lock = asyncio.Lock()
+
+    async def get(self, name):
+        """Returnerar (version, värde), laddar om från databasen om cachen kan vara inaktuell"""
+        if self._stale():
+            await self.refresh()
+        return self._versions[name], self._values[name]
+
+    def _stale(self):
+        if self._checked_at is None:
+            return True
+        return not self.listening and self.clock() - self._checked_at >= self.revalidate_after
+
+    def invalidate(self):
+        self._checked_at = None
+
+    async def refresh(self):
+        """Läs versionerna och ladda om det som ändrats"""
+        async with self._refresh_lock:
+            # Någon annan kan ha laddat om medan vi väntade på låset
+            if not self._stale() and self._versions:
+                return
+            async with self.pool.acquire() as conn:
+                versions = dict(await conn.fetch("SELECT name, version FROM config_version;"))
+                changed = {}
+                for name, loader in self.loaders.items():
+                    if name not in self._versions or versions.get(name) != self._versions[name]:
+                        changed[name] = await loader(conn)
+            if changed:
+                async with self._changed:
+                    for name, value in changed.items():
+                        self._versions[name] = versions.get(name, 0)
+                        self._values[name] = value
+                    self._changed.notify_all()
+            self._checked_at = self.clock()
+
+    async def wait_for_change(self, name, since, timeout):
+        """Vänta tills versionen för name är nyare än since. Returnerar (version, värde) eller None vid timeout."""
+        deadline = self.clock() + timeout
+        version, value = await self.get(name)
+        while version <= since:
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return None
+            async with self._changed:
+                if self._versions[name] <= since:
+                    wait = remaining if self.listening else min(remaining, self.revalidate_after)
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+            version, value = await self.get(name)
+        return version, value
+
+    async def listen(self, connect, stop_event, retry_interval=5.0):
+        """Lyssna på NOTIFY config_changed på en egen anslutning och ladda om vid varje ändring"""
+        while not stop_event.is_set():
+            conn = None
+            try:
+                conn = await connect()
+                notified = asyncio.Event()
+                await conn.add_listener(NOTIFY_CHANNEL, lambda *args: notified.set())
+                self.invalidate()
+                await self.refresh()
+                self.listening = True
+                print("👂 Lyssnar på konfigurationsändringar")
+                while not stop_event.is_set() and not conn.is_closed():
+                    try:
+                        await asyncio.wait_for(notified.wait(), 1.0)
+                    except asyncio.TimeoutError:
+                        continue
+                    notified.clear()
+                    self.invalidate()
+                    await self.refresh()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                print(f"❌ Tappade LISTEN-anslutningen: {e}")
+            finally:
+                self.listening = False
+                if conn is not None:
+                    await conn.close()
+            try:
+                await asyncio.wait_for(stop_event.wait(), retry_interval)
+            except asyncio.TimeoutError:
+                pass
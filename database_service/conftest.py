@@ -0,0 +1,16 @@
+import pytest
+
+
+class FakeClock:
+    """Klocka som bara går framåt när testet ändrar now"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
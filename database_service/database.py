@@ -1,6 +1,8 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
+import json
 import os
 import psycopg2
+from psycopg2.extras import execute_values
 import uuid  # Importera för att generera unika keys
 from dotenv import load_dotenv
 import signal
@@ -8,6 +10,18 @@ import sys
 from waitress import serve  # eller gunicorn för Linux
 from prometheus_client import Counter, Histogram, generate_latest
 import time
+import zlib
+from contextlib import contextmanager
+import threading
+
+from .bulk import import_channels, parse_body, validate
+from .config_cache import ConfigCache
+from .db_pool import ConnectionPool, PoolTimeout
+from .results import (PARTITION_DAYS_AHEAD, RESULT_COLUMNS, RESULT_TEMPLATE, accepted_window, column_arrays,
+                      parse_results, status_retention_days)
+from .rollups import RESOLUTIONS, UPSERT_ROLLUP_SQL, minute_retention_days, rollup_columns, rollup_query, rollup_series
+from .status_store import (SELECT_LATEST_SQL, UPSERT_LATEST_SQL, StatusEvents, filter_snapshot, snapshot,
+                           sse_event, transitions)
 
 # Ladda miljövariabler från .env
 load_dotenv()
@@ -20,6 +34,35 @@ DB_CONFIG = {
     'port': os.environ.get('DB_PORT', '5432')
 }
 
+# Waitress trådar, poolen dimensioneras efter dem så att varje tråd alltid kan få en anslutning
+WAITRESS_THREADS = int(os.environ.get('WAITRESS_THREADS', 8))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', WAITRESS_THREADS))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 5000))
+# Längsta väntan för long-poll på /channels/changes, och hur många trådar som får vänta samtidigt
+CHANGES_TIMEOUT = float(os.environ.get('CHANGES_TIMEOUT', 30))
+MAX_LONG_POLLS = int(os.environ.get('MAX_LONG_POLLS', max(1, WAITRESS_THREADS // 4)))
+PORT = int(os.environ.get('PORT', 5000))
+# /status läses om från databasen högst så här ofta, oavsett hur många dashboards som frågar
+STATUS_CACHE_TTL = float(os.environ.get('STATUS_CACHE_TTL', 1.0))
+# SSE-strömmar håller en tråd var i sync-läget
+MAX_STATUS_STREAMS = int(os.environ.get('MAX_STATUS_STREAMS', max(1, WAITRESS_THREADS // 4)))
+SSE_KEEPALIVE = 15.0
+
+# Fält som kan väljas med /channels?fields= och motsvarande kolumner
+CHANNEL_FIELDS = {
+    'id': 'id',
+    'name': 'channel_name',
+    'url': 'channel_url',
+    'key': 'channel_key',
+    'description': 'channel_description',
+    'worker_id': 'worker_id',
+}
+DEFAULT_CHANNEL_FIELDS = ('id', 'name', 'url')
+MAX_PAGE_SIZE = 10000
+# Rader per FETCH från den server-side cursor som används för NDJSON
+STREAM_BATCH_SIZE = 1000
+MAX_BULK_ROWS = int(os.environ.get('MAX_BULK_ROWS', 50000))
+
 app = Flask(__name__)
 
 request_count = Counter('http_requests_total', 'Total HTTP requests')
@@ -39,24 +82,207 @@ def after_request(response):
 def metrics():
     return generate_latest()
 
-def get_db_connection():
-    """Returnerar en ny databasanslutning."""
-    return psycopg2.connect(**DB_CONFIG)
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Returnerar den delade anslutningspoolen (skapas vid första anropet)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DB_POOL_SIZE,
+                    statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS,
+                    connect_timeout=5,
+                    **DB_CONFIG
+                )
+    return _pool
+
+@contextmanager
+def db_cursor(commit=False):
+    """Lånar en anslutning ur poolen och ger en cursor. Med commit=True committas transaktionen."""
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            yield cur
+        if commit:
+            conn.commit()
+
+def load_channels(cur):
+    cur.execute("SELECT id, channel_name, channel_url FROM channels ORDER BY id;")  # ✅ Hämtar ID, namn och URL
+    return [{"id": row[0], "name": row[1], "url": row[2]} for row in cur.fetchall()]
+
+def load_settings(cur):
+    cur.execute("SELECT key, value FROM settings;")
+    return {row[0]: row[1] for row in cur.fetchall()}
+
+config_cache = ConfigCache(db_cursor, {'channels': load_channels, 'settings': load_settings})
+long_polls = threading.BoundedSemaphore(MAX_LONG_POLLS)
+_rendered = {}
+
+def cached_response(name, wrap=None):
+    """
+    Svar från cachen med ETag och X-Config-Version. JSON-kroppen serialiseras en gång
+    per version och If-None-Match med aktuell version ger 304.
+    """
+    version, value = config_cache.get(name)
+    rendered = _rendered.get(name)
+    if rendered is None or rendered[0] != version:
+        rendered = _rendered[name] = (version, json.dumps({wrap: value} if wrap else value))
+    response = app.response_class(rendered[1], mimetype='application/json')
+    response.set_etag(f"{name}-{version}")
+    response.headers['X-Config-Version'] = str(version)
+    return response.make_conditional(request)
+
+@app.errorhandler(PoolTimeout)
+def pool_timeout(e):
+    return jsonify({"error": "Database busy, try again"}), 503
+
+def channel_query(args):
+    """
+    Bygger SELECT för /channels utifrån fields, after_id (keyset), limit och worker_id.
+    Returnerar (fält, sql, parametrar, limit). Okända fält ger ValueError.
+    """
+    fields = [f.strip() for f in args['fields'].split(',') if f.strip()] if args.get('fields') else list(DEFAULT_CHANNEL_FIELDS)
+    unknown = [f for f in fields if f not in CHANNEL_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    # id behövs alltid för att kunna bläddra vidare
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+
+    where, params = [], []
+    after_id = args.get('after_id', type=int)
+    if after_id is not None:
+        where.append("id > %s")
+        params.append(after_id)
+    if 'worker_id' in args:
+        if args['worker_id']:
+            where.append("worker_id = %s")
+            params.append(args['worker_id'])
+        else:
+            where.append("worker_id IS NULL")
+
+    sql = f"SELECT {', '.join(CHANNEL_FIELDS[f] for f in fields)} FROM channels"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id"
+
+    limit = args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        sql += " LIMIT %s"
+        params.append(limit)
+    return fields, sql, params, limit
+
+def stream_channels(fields, sql, params):
+    """NDJSON, en kanal per rad, läst i omgångar från en server-side cursor så att minnet inte växer med tabellen"""
+    with get_pool().connection() as conn:
+        with conn.cursor(name='channels_stream') as cur:
+            cur.itersize = STREAM_BATCH_SIZE
+            cur.execute(sql, params)
+            for row in cur:
+                yield json.dumps(dict(zip(fields, row))) + "\n"
 
 @app.route("/channels", methods=["GET"])
 def get_channels():
-    """Hämtar alla kanaler från databasen."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, channel_name, channel_url FROM channels;")  # ✅ Hämtar ID, namn och URL
-    channels = [{"id": row[0], "name": row[1], "url": row[2]} for row in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return jsonify({"channels": channels})
+    """
+    Hämtar kanaler. Utan parametrar svaras hela listan från cachen.
+    ?after_id=&limit= bläddrar, ?fields= väljer fält, ?worker_id= ger en workers kanaler
+    och ?format=ndjson (eller Accept: application/x-ndjson) strömmar svaret.
+    """
+    streaming = (request.args.get('format') == 'ndjson' or
+                 request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson')
+    if not streaming and not request.args:
+        return cached_response('channels', wrap='channels')
+
+    try:
+        fields, sql, params, limit = channel_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Svaret beror bara på kanalversionen och frågan, så If-None-Match kan besvaras utan databasfråga
+    version, _ = config_cache.get('channels')
+    etag = f"channels-{version}-{zlib.crc32(request.query_string):08x}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    if streaming:
+        response = app.response_class(stream_channels(fields, sql, params), mimetype='application/x-ndjson')
+    else:
+        with db_cursor() as cur:
+            cur.execute(sql, params)
+            channels = [dict(zip(fields, row)) for row in cur.fetchall()]
+        body = {"channels": channels}
+        if limit is not None:
+            body["next_after_id"] = channels[-1]['id'] if len(channels) == limit else None
+        response = jsonify(body)
+    response.set_etag(etag)
+    response.headers['X-Config-Version'] = str(version)
+    return response
+
+@app.route("/channels/assignments", methods=["PUT"])
+def update_assignments():
+    """
+    Sätter worker_id för kanalerna från {"assignments": {"<worker_id>": [kanal-ID, ...]}}.
+    Kanaler som inte finns med blir otilldelade. Bara ändrade rader skrivs.
+    """
+    data = request.json or {}
+    assignments = data.get("assignments")
+    if not isinstance(assignments, dict):
+        return jsonify({"error": "assignments must be an object of worker_id -> channel ids"}), 400
+    try:
+        wanted = {int(channel_id): str(worker_id) for worker_id, ids in assignments.items() for channel_id in ids}
+    except (TypeError, ValueError):
+        return jsonify({"error": "Channel ids must be integers"}), 400
+
+    with db_cursor(commit=True) as cur:
+        cur.execute("SELECT id, worker_id FROM channels;")
+        changes = [(channel_id, wanted.get(channel_id)) for channel_id, current in cur.fetchall()
+                   if wanted.get(channel_id) != current]
+        # Triggern räknar upp kanalversionen även för en tom UPDATE, så hoppa över den
+        if changes:
+            execute_values(
+                cur,
+                "UPDATE channels SET worker_id = v.worker_id FROM (VALUES %s) AS v(id, worker_id) WHERE channels.id = v.id",
+                changes,
+                template="(%s, %s::text)",
+                page_size=1000
+            )
+    if changes:
+        config_cache.invalidate()
+    return jsonify({"updated": len(changes)})
+
+@app.route("/channels/changes", methods=["GET"])
+def channel_changes():
+    """
+    Long-poll: svarar när kanalversionen är nyare än ?since=, med version och alla kanaler.
+    Ger 204 om inget ändrats inom ?timeout= sekunder (högst CHANGES_TIMEOUT).
+    """
+    since = request.args.get('since', default=0, type=int)
+    timeout = min(request.args.get('timeout', default=CHANGES_TIMEOUT, type=float), CHANGES_TIMEOUT)
+
+    # Begränsa antalet trådar som blockeras, övriga får svar direkt
+    waiting = long_polls.acquire(blocking=False)
+    try:
+        changed = config_cache.wait_for_change('channels', since, timeout if waiting else 0)
+    finally:
+        if waiting:
+            long_polls.release()
+
+    if changed is None:
+        return '', 204
+    version, channels = changed
+    response = jsonify({"version": version, "channels": channels})
+    response.set_etag(f"channels-{version}")
+    response.headers['X-Config-Version'] = str(version)
+    return response
 
 @app.route("/channels", methods=["POST"])
 def add_channel():
-    """Lägger till en ny kanal i databasen med ett automatiskt genererat kanal-ID och channel_key."""
+    """Lägger till en ny kanal i databasen. ID:t kommer från sekvensen och channel_key genereras om den saknas."""
     try:
         data = request.json
         if not data:
@@ -69,23 +295,13 @@ def add_channel():
         if not name or not url:
             return jsonify({"error": "Name and URL are required"}), 400
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Hämta det högsta befintliga kanal-ID:t och räkna ut nästa ID
-        cur.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM channels;")
-        new_id = cur.fetchone()[0]
-
-        # Lägg till kanalen med det nya kanal-ID:t och genererat `channel_key`
-        cur.execute(
-            "INSERT INTO channels (id, channel_key, channel_name, channel_url) VALUES (%s, %s, %s, %s) RETURNING id, channel_key, channel_name, channel_url;",
-            (new_id, channel_key, name, url)
-        )
-        
-        new_channel = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_cursor(commit=True) as cur:
+            cur.execute(
+                "INSERT INTO channels (channel_key, channel_name, channel_url) VALUES (%s, %s, %s) RETURNING id, channel_key, channel_name, channel_url;",
+                (channel_key, name, url)
+            )
+            new_channel = cur.fetchone()
+        config_cache.invalidate()
 
         return jsonify({
             "message": "Channel added successfully",
@@ -100,19 +316,48 @@ def add_channel():
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         return jsonify({"error": "Database error occurred"}), 500
+    except PoolTimeout:
+        raise
     except Exception as e:
         print(f"Unexpected error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/channels/bulk", methods=["POST"])
+def bulk_channels():
+    """
+    Lägger till, uppdaterar och tar bort många kanaler i en transaktion.
+    Tar emot en JSON-lista (eller {"channels": [...]}) eller CSV med rubrikrad. Kanaler matchas
+    på channel_key, rader med delete=true tas bort. Svarar med ett resultat per rad.
+    """
+    try:
+        raw_rows = parse_body(request.content_type, request.get_data())
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"Could not parse request: {e}"}), 400
+    if len(raw_rows) > MAX_BULK_ROWS:
+        return jsonify({"error": f"At most {MAX_BULK_ROWS} rows per request"}), 413
+
+    rows, results = validate(raw_rows)
+    if rows:
+        try:
+            with db_cursor(commit=True) as cur:
+                results.extend(import_channels(cur, rows))
+        except psycopg2.Error as e:
+            print(f"Database error: {e}")
+            return jsonify({"error": "Database error occurred"}), 500
+        config_cache.invalidate()
+
+    results.sort(key=lambda r: r["row"])
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return jsonify({"summary": summary, "results": results})
+
 @app.route("/channels/<int:channel_id>", methods=["GET"])
 def get_channel(channel_id):
     """Hämtar en specifik kanal från databasen."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, channel_name, channel_url FROM channels WHERE id = %s;", (channel_id,))
-    channel = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("SELECT id, channel_name, channel_url FROM channels WHERE id = %s;", (channel_id,))
+        channel = cur.fetchone()
     
     if channel is None:
         return jsonify({"error": "Channel not found"}), 404
@@ -127,23 +372,17 @@ def get_channel(channel_id):
 def health_check():
     """Enkel hälsokontroll endpoint."""
     try:
-        # Testa databasanslutning med timeout
-        conn = psycopg2.connect(**DB_CONFIG, connect_timeout=5)
-        conn.close()
+        # Testa en anslutning ur poolen istället för att öppna en ny
+        with db_cursor() as cur:
+            cur.execute("SELECT 1;")
         return jsonify({"status": "healthy"}), 200
     except Exception as e:
         return jsonify({"status": "unhealthy", "error": str(e)}), 500
 
 @app.route("/settings", methods=["GET"])
 def get_settings():
-    """Hämtar alla inställningar från databasen."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT key, value FROM settings;")
-    settings = {row[0]: row[1] for row in cur.fetchall()}
-    cur.close()
-    conn.close()
-    return jsonify(settings)
+    """Hämtar alla inställningar (från cachen)."""
+    return cached_response('settings')
 
 @app.route("/settings/<key>", methods=["PUT"])
 def update_setting(key):
@@ -154,16 +393,13 @@ def update_setting(key):
     if not value:
         return jsonify({"error": "Value is required"}), 400
         
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE settings SET value = %s WHERE key = %s RETURNING key, value;",
-        (value, key)
-    )
-    updated = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor(commit=True) as cur:
+        cur.execute(
+            "UPDATE settings SET value = %s WHERE key = %s RETURNING key, value;",
+            (value, key)
+        )
+        updated = cur.fetchone()
+    config_cache.invalidate()
     
     if updated:
         return jsonify({"key": updated[0], "value": updated[1]})
@@ -173,24 +409,179 @@ def update_setting(key):
 def delete_channel(channel_id):
     """Tar bort en kanal från databasen."""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("DELETE FROM channels WHERE id = %s RETURNING id;", (channel_id,))
-        deleted = cur.fetchone()
-        
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_cursor(commit=True) as cur:
+            cur.execute("DELETE FROM channels WHERE id = %s RETURNING id;", (channel_id,))
+            deleted = cur.fetchone()
+        config_cache.invalidate()
         
         if deleted:
             return jsonify({"message": f"Channel {channel_id} deleted successfully"}), 200
         return jsonify({"error": "Channel not found"}), 404
         
+    except PoolTimeout:
+        raise
     except Exception as e:
         print(f"Error deleting channel: {e}")
         return jsonify({"error": str(e)}), 500
 
+PARTITION_MAINTENANCE_INTERVAL = 3600
+
+last_partition_maintenance = 0.0
+_maintenance_lock = threading.Lock()
+
+def maintain_partitions():
+    """
+    Skapa kommande dagspartitioner och ta bort gamla enligt status_retention_days, i en egen
+    transaktion. Fel loggas, ingest ska inte stanna för att underhållet misslyckas.
+    """
+    try:
+        with db_cursor(commit=True) as cur:
+            cur.execute("SELECT ensure_channel_status_partitions(%s);", (PARTITION_DAYS_AHEAD,))
+            cur.execute("SELECT value FROM settings WHERE key = 'status_retention_days';")
+            row = cur.fetchone()
+            cur.execute("SELECT drop_channel_status_partitions(%s);",
+                        (status_retention_days({'status_retention_days': row[0]} if row else {}),))
+            dropped = cur.fetchone()[0]
+            cur.execute("SELECT prune_channel_rollups();")
+    except Exception as e:
+        print(f"❌ Partitionsunderhåll misslyckades: {e}")
+        return
+    if dropped:
+        print(f"🗑️ Tog bort {dropped} gamla partitioner av channel_status")
+
+def schedule_partition_maintenance():
+    """Kör maintain_partitions i en egen tråd högst en gång per PARTITION_MAINTENANCE_INTERVAL"""
+    global last_partition_maintenance
+    with _maintenance_lock:
+        if time.time() - last_partition_maintenance < PARTITION_MAINTENANCE_INTERVAL:
+            return
+        # Ett misslyckat underhåll försöks igen nästa intervall, inte vid varje anrop
+        last_partition_maintenance = time.time()
+    threading.Thread(target=maintain_partitions, name="partition-maintenance", daemon=True).start()
+
+status_events = StatusEvents()
+status_streams = threading.BoundedSemaphore(MAX_STATUS_STREAMS)
+_status_cache = None
+_status_lock = threading.Lock()
+
+@app.route("/results", methods=["POST"])
+def add_results():
+    """
+    Tar emot en batch kontrollresultat och skriver dem med en multi-row INSERT. I samma
+    transaktion uppdateras channel_status_latest och rollups per minut och timme, och
+    statusövergångar skickas till /status/events. Rader med checked_at äldre än
+    status_retention_days eller mer än en dag fram i tiden avvisas.
+    """
+    data = request.get_json(silent=True)
+    results = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(results, list):
+        return jsonify({"error": "Expected a JSON list of results"}), 400
+
+    schedule_partition_maintenance()
+    rows, rejected = parse_results(results, accepted_window(config_cache.get('settings')[1], time.time()))
+    if not rows:
+        return jsonify({"inserted": 0, "rejected": rejected}), 200 if not rejected else 400
+
+    try:
+        with db_cursor(commit=True) as cur:
+            execute_values(
+                cur,
+                f"INSERT INTO channel_status ({', '.join(RESULT_COLUMNS)}) VALUES %s",
+                rows,
+                template=RESULT_TEMPLATE,
+                page_size=1000
+            )
+            cur.execute(UPSERT_LATEST_SQL, column_arrays(rows))
+            changed = transitions(cur.fetchall())
+            for _, seconds, _ in RESOLUTIONS:
+                cur.execute(UPSERT_ROLLUP_SQL[seconds], rollup_columns(rows, seconds))
+    except psycopg2.Error as e:
+        print(f"Database error: {e}")
+        return jsonify({"error": "Database error occurred"}), 500
+
+    status_events.publish(changed)
+    return jsonify({"inserted": len(rows), "rejected": rejected}), 201
+
+@app.route("/rollups", methods=["GET"])
+def get_rollups():
+    """
+    Antal kontroller, felandel och latenspercentiler per kanal över tid, från rollup-tabellerna.
+    Upplösningen (minut eller timme) väljs utifrån intervallet och step.
+    """
+    try:
+        settings = config_cache.get('settings')[1]
+        resolution, step, sql, params = rollup_query(request.args, minute_retention_days(settings), time.time())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        with db_cursor() as cur:
+            cur.execute(sql, params)
+            series = rollup_series(cur.fetchall())
+    except psycopg2.Error as e:
+        print(f"Database error: {e}")
+        return jsonify({"error": "Database error occurred"}), 500
+    return jsonify({"resolution": resolution, "step": step, "series": series})
+
+def fleet_status():
+    """Ögonblicksbild av hela flottan, läst med en fråga högst en gång per STATUS_CACHE_TTL"""
+    global _status_cache
+    with _status_lock:
+        if _status_cache is None or time.monotonic() - _status_cache[0] >= STATUS_CACHE_TTL:
+            with db_cursor() as cur:
+                cur.execute(SELECT_LATEST_SQL)
+                _status_cache = (time.monotonic(), snapshot(cur.fetchall()))
+        return _status_cache[1]
+
+def status_filters(args):
+    statuses = {s.strip() for s in args['status'].split(',') if s.strip()} if args.get('status') else None
+    return statuses, args.get('renditions', '1') not in ('0', 'false')
+
+@app.route("/status", methods=["GET"])
+def get_status():
+    """
+    Senaste status för alla kanaler och renditioner från channel_status_latest.
+    ?status=red,yellow ger bara kanaler med de statusarna, ?renditions=0 utelämnar renditionerna.
+    """
+    statuses, renditions = status_filters(request.args)
+    try:
+        body = filter_snapshot(fleet_status(), statuses, renditions)
+    except psycopg2.Error as e:
+        print(f"Database error: {e}")
+        return jsonify({"error": "Database error occurred"}), 500
+    return jsonify(dict(body, last_event_id=status_events.last_id))
+
+@app.route("/status/events", methods=["GET"])
+def status_event_stream():
+    """
+    Server-sent events med statusövergångar (inte varje kontroll). Last-Event-ID
+    (eller ?last_event_id=) fortsätter där klienten slutade, annars börjar strömmen nu.
+    ?renditions=0 skickar bara kanalernas sammanlagda status.
+    """
+    if not status_streams.acquire(blocking=False):
+        return jsonify({"error": "Too many status streams"}), 503
+    _, renditions = status_filters(request.args)
+    after = status_events.start_id(request.headers.get('Last-Event-ID', request.args.get('last_event_id')))
+
+    def stream():
+        nonlocal after
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                events = status_events.wait(after, SSE_KEEPALIVE)
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                for event_id, event in events:
+                    after = event_id
+                    if renditions or event["rendition"] == '':
+                        yield sse_event(event_id, event)
+        finally:
+            status_streams.release()
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 def wait_for_db():
     """Väntar på att databasen ska bli tillgänglig."""
     max_retries = 30
@@ -209,7 +600,7 @@ def wait_for_db():
     print("❌ Kunde inte ansluta till databasen")
     return False
 
-if __name__ == "__main__":
+def main():
     signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
     signal.signal(signal.SIGINT, lambda sig, frame: sys.exit(0))
     
@@ -217,6 +608,16 @@ if __name__ == "__main__":
     
     # Vänta på att databasen ska bli tillgänglig
     if wait_for_db():
-        serve(app, host='0.0.0.0', port=5000)
+        # Ladda om cachen direkt när kanaler eller inställningar ändras i databasen
+        threading.Thread(
+            target=config_cache.listen,
+            args=(lambda: psycopg2.connect(**DB_CONFIG, connect_timeout=5), threading.Event()),
+            name='config-listener',
+            daemon=True
+        ).start()
+        serve(app, host='0.0.0.0', port=PORT, threads=WAITRESS_THREADS)
     else:
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+from prometheus_client import Counter, Gauge, Histogram
+
+pool_checkout_seconds = Histogram('db_pool_checkout_seconds', 'Time spent waiting for a pooled DB connection')
+pool_checkout_timeouts = Counter('db_pool_checkout_timeouts_total', 'Checkouts that timed out waiting for a connection')
+pool_discarded = Counter('db_pool_discarded_connections_total', 'Pooled connections discarded after failing a health check')
+pool_in_use = Gauge('db_pool_connections_in_use', 'DB connections currently checked out')
+pool_size = Gauge('db_pool_connections_max', 'Maximum number of pooled DB connections')
+
+
+class PoolTimeout(Exception):
+    """Ingen anslutning blev ledig inom checkout_timeout"""
+
+
+class ConnectionPool:
+    """
+    Trådsäker, begränsad pool av psycopg2-anslutningar.
+
+    Checkout väntar upp till checkout_timeout sekunder på en ledig anslutning.
+    Anslutningar som legat oanvända längre än health_check_after sekunder
+    kontrolleras med SELECT 1 innan de lämnas ut, trasiga ersätts.
+    Varje anslutning får statement_timeout satt vid uppkoppling.
+    """
+
+    def __init__(self, maxconn, checkout_timeout=5.0, health_check_after=30.0, statement_timeout_ms=5000, **dsn):
+        if statement_timeout_ms:
+            dsn['options'] = f"-c statement_timeout={int(statement_timeout_ms)}"
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self._pool = ThreadedConnectionPool(0, maxconn, **dsn)
+        # Anslutningar öppnas först när de behövs, men psycopg2 stänger allt som lämnas
+        # tillbaka när poolen har minconn lediga. Med minconn = maxconn behålls de.
+        self._pool.minconn = maxconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        pool_size.set(maxconn)
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        if not self._healthy(conn):
+            pool_discarded.inc()
+            self._discard(conn)
+            conn = self._pool.getconn()
+        return conn
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    @contextmanager
+    def connection(self):
+        """Låna en anslutning. Oavslutade transaktioner rullas tillbaka när den lämnas tillbaka."""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            pool_checkout_timeouts.inc()
+            raise PoolTimeout(f"No database connection available within {self.checkout_timeout}s")
+        pool_checkout_seconds.observe(time.perf_counter() - started)
+        pool_in_use.inc()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        finally:
+            try:
+                if conn is not None:
+                    self._release(conn)
+            finally:
+                pool_in_use.dec()
+                self._slots.release()
+
+    def _release(self, conn):
+        if conn.closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        self._last_used[id(conn)] = time.monotonic()
+        self._pool.putconn(conn)
+
+    def closeall(self):
+        self._pool.closeall()
+        self._last_used.clear()
@@ -0,0 +1,69 @@
+-- Historik över kontrollresultat, en rad per rendition och kontroll.
+-- rendition = '' är kanalens sammanlagda status.
+CREATE TABLE IF NOT EXISTS channel_status (
+    channel_id INTEGER NOT NULL,
+    rendition TEXT NOT NULL DEFAULT '',
+    checked_at TIMESTAMPTZ NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT,
+    segment_count INTEGER,
+    media_sequence BIGINT,
+    response_time REAL,
+    ttfb REAL,
+    download_time REAL,
+    throughput DOUBLE PRECISION,
+    realtime_factor REAL,
+    stall_seconds REAL,
+    check_duration REAL
+) PARTITION BY RANGE (checked_at);
+
+CREATE INDEX IF NOT EXISTS channel_status_channel_time_idx ON channel_status (channel_id, checked_at DESC);
+
+-- Fångar rader utanför skapade partitioner så att inga resultat tappas
+CREATE TABLE IF NOT EXISTS channel_status_default PARTITION OF channel_status DEFAULT;
+
+-- Skapa dagspartitioner från idag och days_ahead dagar framåt
+CREATE OR REPLACE FUNCTION ensure_channel_status_partitions(days_ahead INTEGER DEFAULT 2) RETURNS void AS $$
+DECLARE
+    day DATE;
+BEGIN
+    FOR i IN 0..days_ahead LOOP
+        day := (now() AT TIME ZONE 'UTC')::date + i;
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF channel_status FOR VALUES FROM (%L) TO (%L)',
+            'channel_status_' || to_char(day, 'YYYYMMDD'),
+            day::timestamp AT TIME ZONE 'UTC',
+            (day + 1)::timestamp AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Ta bort dagspartitioner äldre än retention_days, returnerar antal borttagna
+CREATE OR REPLACE FUNCTION drop_channel_status_partitions(retention_days INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    part RECORD;
+    dropped INTEGER := 0;
+    cutoff TEXT := 'channel_status_' || to_char((now() AT TIME ZONE 'UTC')::date - retention_days, 'YYYYMMDD');
+BEGIN
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'channel_status' AND c.relname ~ '^channel_status_[0-9]{8}$'
+    LOOP
+        IF part.relname < cutoff THEN
+            EXECUTE format('DROP TABLE IF EXISTS %I', part.relname);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_channel_status_partitions(2);
+
+INSERT INTO settings (key, value) VALUES
+    ('status_retention_days', '7')
+ON CONFLICT (key) DO NOTHING;
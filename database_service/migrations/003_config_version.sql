@@ -0,0 +1,31 @@
+-- Versionsnummer för kanaler och inställningar. Räknas upp av triggers vid varje ändring
+-- och skickas ut med NOTIFY config_changed ('<namn>:<version>') så att databastjänsten
+-- kan hålla en cache och klienter kan fråga med If-None-Match.
+CREATE TABLE IF NOT EXISTS config_version (
+    name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1
+);
+
+INSERT INTO config_version (name) VALUES ('channels'), ('settings')
+ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_config_version() RETURNS trigger AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    UPDATE config_version SET version = version + 1 WHERE name = TG_ARGV[0]
+    RETURNING version INTO new_version;
+    PERFORM pg_notify('config_changed', TG_ARGV[0] || ':' || new_version);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS channels_config_version ON channels;
+CREATE TRIGGER channels_config_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON channels
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version('channels');
+
+DROP TRIGGER IF EXISTS settings_config_version ON settings;
+CREATE TRIGGER settings_config_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON settings
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version('settings');
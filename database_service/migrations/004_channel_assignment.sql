@@ -0,0 +1,4 @@
+-- Vilken monitor worker som övervakar kanalen, sätts av monitor_manager via PUT /channels/assignments
+ALTER TABLE channels ADD COLUMN IF NOT EXISTS worker_id TEXT;
+
+CREATE INDEX IF NOT EXISTS channels_worker_idx ON channels (worker_id, id);
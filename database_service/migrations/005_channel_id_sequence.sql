@@ -0,0 +1,3 @@
+-- Kanaler lades tidigare till med id = MAX(id) + 1 utan att använda sekvensen.
+-- Flytta fram sekvensen förbi befintliga id:n så att nya kanaler inte krockar.
+SELECT setval(pg_get_serial_sequence('channels', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM channels;
@@ -0,0 +1,36 @@
+-- Senaste status per kanal och rendition, en rad per (channel_id, rendition) som skrivs
+-- över vid varje inkommande batch. Dashboarden läser hela flottan härifrån istället för
+-- att söka i historiken. changed_at är när statusen senast ändrades och previous_status
+-- statusen före den ändringen.
+CREATE TABLE IF NOT EXISTS channel_status_latest (
+    channel_id INTEGER NOT NULL,
+    rendition TEXT NOT NULL DEFAULT '',
+    checked_at TIMESTAMPTZ NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT,
+    segment_count INTEGER,
+    media_sequence BIGINT,
+    response_time REAL,
+    ttfb REAL,
+    download_time REAL,
+    throughput DOUBLE PRECISION,
+    realtime_factor REAL,
+    stall_seconds REAL,
+    check_duration REAL,
+    changed_at TIMESTAMPTZ NOT NULL,
+    previous_status TEXT,
+    PRIMARY KEY (channel_id, rendition)
+);
+
+-- Borttagna kanaler ska inte ligga kvar i ögonblicksbilden
+CREATE OR REPLACE FUNCTION delete_channel_status_latest() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM channel_status_latest WHERE channel_id = OLD.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS channels_delete_status_latest ON channels;
+CREATE TRIGGER channels_delete_status_latest
+    AFTER DELETE ON channels
+    FOR EACH ROW EXECUTE FUNCTION delete_channel_status_latest();
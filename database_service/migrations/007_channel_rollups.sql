@@ -0,0 +1,66 @@
+-- Aggregerad historik per kanal, rendition och minut respektive timme, uppdaterad vid
+-- varje POST /results. Latenserna sparas som histogram med logaritmiska buckets
+-- (database_service/rollups.py) som kan slås ihop, så att percentiler går att räkna
+-- över godtyckliga intervall utan att läsa rådata. Histogrammen är int4-arrayer där
+-- arrayens undre gräns är första bucketen med värden, t.ex. '[21:23]={5,3,1}'.
+
+-- Summera två histogram bucket för bucket, resultatet börjar på den lägsta av de två gränserna
+CREATE OR REPLACE FUNCTION histogram_add(a INTEGER[], b INTEGER[]) RETURNS INTEGER[] AS $$
+    SELECT CASE
+        WHEN a IS NULL THEN b
+        WHEN b IS NULL THEN a
+        ELSE (
+            SELECT format('[%s:%s]=', LEAST(array_lower(a, 1), array_lower(b, 1)),
+                          GREATEST(array_upper(a, 1), array_upper(b, 1)))
+                   || array_agg(COALESCE(a[i], 0) + COALESCE(b[i], 0) ORDER BY i)::text
+            FROM generate_series(LEAST(array_lower(a, 1), array_lower(b, 1)),
+                                 GREATEST(array_upper(a, 1), array_upper(b, 1))) AS i
+        )::INTEGER[]
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE AGGREGATE histogram_sum(INTEGER[]) (
+    SFUNC = histogram_add,
+    STYPE = INTEGER[]
+);
+
+CREATE TABLE IF NOT EXISTS channel_rollup_1m (
+    channel_id INTEGER NOT NULL,
+    rendition TEXT NOT NULL DEFAULT '',
+    bucket TIMESTAMPTZ NOT NULL,
+    checks INTEGER NOT NULL,
+    green INTEGER NOT NULL,
+    yellow INTEGER NOT NULL,
+    red INTEGER NOT NULL,
+    response_time_count INTEGER NOT NULL,
+    response_time_sum DOUBLE PRECISION NOT NULL,
+    response_time_max REAL,
+    response_time_hist INTEGER[],
+    ttfb_hist INTEGER[],
+    stall_seconds_max REAL,
+    PRIMARY KEY (channel_id, rendition, bucket)
+);
+CREATE INDEX IF NOT EXISTS channel_rollup_1m_bucket_idx ON channel_rollup_1m (bucket);
+
+CREATE TABLE IF NOT EXISTS channel_rollup_1h (LIKE channel_rollup_1m INCLUDING ALL);
+
+-- Ta bort rollups äldre än rollup_1m_retention_days / rollup_1h_retention_days, returnerar antal rader
+CREATE OR REPLACE FUNCTION prune_channel_rollups() RETURNS INTEGER AS $$
+DECLARE
+    minute_days INTEGER := COALESCE((SELECT value::int FROM settings WHERE key = 'rollup_1m_retention_days'), 14);
+    hour_days INTEGER := COALESCE((SELECT value::int FROM settings WHERE key = 'rollup_1h_retention_days'), 400);
+    deleted INTEGER;
+    total INTEGER;
+BEGIN
+    DELETE FROM channel_rollup_1m WHERE bucket < now() - make_interval(days => minute_days);
+    GET DIAGNOSTICS total = ROW_COUNT;
+    DELETE FROM channel_rollup_1h WHERE bucket < now() - make_interval(days => hour_days);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN total + deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+INSERT INTO settings (key, value) VALUES
+    ('rollup_1m_retention_days', '14'),
+    ('rollup_1h_retention_days', '400')
+ON CONFLICT (key) DO NOTHING;
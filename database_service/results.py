@@ -0,0 +1,94 @@
+RESULT_COLUMNS = (
+    'channel_id', 'rendition', 'checked_at', 'status', 'message', 'segment_count', 'media_sequence',
+    'response_time', 'ttfb', 'download_time', 'throughput', 'realtime_factor', 'stall_seconds', 'check_duration'
+)
+CHECKED_AT = RESULT_COLUMNS.index('checked_at')
+RESULT_TEMPLATE = '(' + ', '.join('to_timestamp(%s)' if c == 'checked_at' else '%s' for c in RESULT_COLUMNS) + ')'
+
+# Typ i databasen och Python-konvertering per kolumn, för frågor som tar en array per kolumn
+RESULT_TYPES = {
+    'channel_id': ('int4', int),
+    'rendition': ('text', str),
+    'checked_at': ('float8', float),
+    'status': ('text', str),
+    'message': ('text', str),
+    'segment_count': ('int4', int),
+    'media_sequence': ('int8', int),
+    'response_time': ('float4', float),
+    'ttfb': ('float4', float),
+    'download_time': ('float4', float),
+    'throughput': ('float8', float),
+    'realtime_factor': ('float4', float),
+    'stall_seconds': ('float4', float),
+    'check_duration': ('float4', float),
+}
+
+# En batch resultat som tabell, med en array per kolumn som parametrar (checked_at i epoch-sekunder)
+RESULTS_UNNEST = (
+    f"unnest({', '.join(f'%s::{RESULT_TYPES[c][0]}[]' for c in RESULT_COLUMNS)}) "
+    f"AS r({', '.join(RESULT_COLUMNS)})"
+)
+
+
+DEFAULT_STATUS_RETENTION_DAYS = 7
+# Dagspartitioner som skapas framåt av partitionsunderhållet
+PARTITION_DAYS_AHEAD = 2
+DAY = 86400
+
+
+def status_retention_days(settings):
+    """status_retention_days från inställningarna"""
+    try:
+        return int(settings.get('status_retention_days', DEFAULT_STATUS_RETENTION_DAYS))
+    except (TypeError, ValueError):
+        return DEFAULT_STATUS_RETENTION_DAYS
+
+
+def accepted_window(settings, now):
+    """
+    (tidigast, senast) checked_at som tas emot. Äldre rader skulle hamna utanför retention
+    och rader längre fram än partitionerna i DEFAULT-partitionen, där de stoppar skapandet
+    av dagens partition. Framåt lämnas en dags marginal, underhållet körs bara en gång i timmen.
+    """
+    return now - status_retention_days(settings) * DAY, now + (PARTITION_DAYS_AHEAD - 1) * DAY
+
+
+def result_row(result):
+    """Gör om ett kontrollresultat till en tuple i RESULT_COLUMNS-ordning, None om det är ogiltigt"""
+    if not isinstance(result, dict) or result.get('channel_id') is None \
+            or result.get('checked_at') is None or not result.get('status'):
+        return None
+    row = [result.get(column) for column in RESULT_COLUMNS]
+    row[1] = row[1] or ''  # Tom rendition = kanalens sammanlagda status
+    return tuple(row)
+
+
+def typed_row(row):
+    """Konvertera en resultatrad till kolumnernas typer, None om ett värde inte går att konvertera"""
+    try:
+        return tuple(None if value is None else RESULT_TYPES[column][1](value)
+                     for column, value in zip(RESULT_COLUMNS, row))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_results(results, window=None):
+    """
+    Giltiga rader med rätt typer ur en lista kontrollresultat, med checked_at inom
+    window = (tidigast, senast) om det anges. Returnerar (rader, antal avvisade).
+    """
+    rows = []
+    for result in results:
+        row = result_row(result)
+        if row is not None:
+            row = typed_row(row)
+        if row is not None and window is not None and not window[0] <= row[CHECKED_AT] <= window[1]:
+            row = None
+        if row is not None:
+            rows.append(row)
+    return rows, len(results) - len(rows)
+
+
+def column_arrays(rows):
+    """Raderna som en lista per kolumn, parametrarna till RESULTS_UNNEST"""
+    return [list(column) for column in zip(*rows)]
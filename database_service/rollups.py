@@ -0,0 +1,235 @@
+import math
+
+from .results import RESULT_COLUMNS
+
+# Latenshistogram: bucket i täcker (HISTOGRAM_MIN * G^(i-1), HISTOGRAM_MIN * G^i] sekunder.
+# Med G = 1.2 är percentilerna högst 20 % för höga, från 1 ms upp till ~96 s.
+HISTOGRAM_MIN = 0.001
+HISTOGRAM_GROWTH = 1.2
+HISTOGRAM_BUCKETS = 64
+
+# (namn, sekunder, tabell) från finast till grövst
+RESOLUTIONS = (
+    ('1m', 60, 'channel_rollup_1m'),
+    ('1h', 3600, 'channel_rollup_1h'),
+)
+DEFAULT_MINUTE_RETENTION_DAYS = 14
+# Längre intervall än så här läses från timtabellen även om minuterna finns kvar
+MAX_MINUTE_RANGE = 2 * 86400
+MAX_POINTS = 2000
+DEFAULT_RANGE = 3600
+
+_COLUMNS = {name: i for i, name in enumerate(RESULT_COLUMNS)}
+
+ROLLUP_COLUMNS = (
+    'channel_id', 'rendition', 'bucket', 'checks', 'green', 'yellow', 'red', 'response_time_count',
+    'response_time_sum', 'response_time_max', 'response_time_hist', 'ttfb_hist', 'stall_seconds_max'
+)
+_ROLLUP_TYPES = ('int4', 'text', 'float8', 'int4', 'int4', 'int4', 'int4', 'int4',
+                 'float8', 'float4', 'text', 'text', 'float4')
+_SUMMED = ('checks', 'green', 'yellow', 'red', 'response_time_count', 'response_time_sum')
+_MAXED = ('response_time_max', 'stall_seconds_max')
+_MERGED = ('response_time_hist', 'ttfb_hist')
+
+
+def _upsert_sql(table):
+    select = ', '.join(
+        'to_timestamp(bucket)' if c == 'bucket' else f'{c}::int4[]' if c in _MERGED else c for c in ROLLUP_COLUMNS
+    )
+    updates = [f'{c} = r.{c} + EXCLUDED.{c}' for c in _SUMMED]
+    updates += [f'{c} = GREATEST(r.{c}, EXCLUDED.{c})' for c in _MAXED]
+    updates += [f'{c} = histogram_add(r.{c}, EXCLUDED.{c})' for c in _MERGED]
+    return f"""
+        INSERT INTO {table} AS r ({', '.join(ROLLUP_COLUMNS)})
+        SELECT {select}
+        FROM unnest({', '.join(f'%s::{t}[]' for t in _ROLLUP_TYPES)}) AS u({', '.join(ROLLUP_COLUMNS)})
+        ON CONFLICT (channel_id, rendition, bucket) DO UPDATE SET {', '.join(updates)}
+    """
+
+
+# Lägg en batch förberäknade buckets på befintliga, en sats per upplösning
+UPSERT_ROLLUP_SQL = {seconds: _upsert_sql(table) for _, seconds, table in RESOLUTIONS}
+
+
+def histogram_index(seconds):
+    if seconds <= HISTOGRAM_MIN:
+        return 0
+    return min(HISTOGRAM_BUCKETS - 1, math.ceil(math.log(seconds / HISTOGRAM_MIN, HISTOGRAM_GROWTH) - 1e-9))
+
+
+def histogram_literal(counts):
+    """Histogram som Postgres-array där undre gränsen är första bucketen med värden, None om tomt"""
+    if not counts:
+        return None
+    low, high = min(counts), max(counts)
+    return f"[{low}:{high}]={{{','.join(str(counts.get(i, 0)) for i in range(low, high + 1))}}}"
+
+
+def histogram_quantile(low, counts, q, maximum=None):
+    """
+    Övre gränsen för bucketen där kvantilen q hamnar. low är index för counts[0].
+    Gränsen begränsas av största uppmätta värdet om det är känt.
+    """
+    total = sum(counts or ())
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for offset, count in enumerate(counts):
+        seen += count
+        if seen >= rank:
+            value = HISTOGRAM_MIN * HISTOGRAM_GROWTH ** (low + offset)
+            return min(value, maximum) if maximum is not None else value
+    return maximum
+
+
+class _Bucket:
+    __slots__ = ('checks', 'statuses', 'rt_count', 'rt_sum', 'rt_max', 'rt_hist', 'ttfb_hist', 'stall_max')
+
+    def __init__(self):
+        self.checks = 0
+        self.statuses = {'green': 0, 'yellow': 0, 'red': 0}
+        self.rt_count = 0
+        self.rt_sum = 0.0
+        self.rt_max = None
+        self.rt_hist = {}
+        self.ttfb_hist = {}
+        self.stall_max = None
+
+
+def _observe(hist, seconds):
+    index = histogram_index(seconds)
+    hist[index] = hist.get(index, 0) + 1
+
+
+def rollup_columns(rows, seconds):
+    """
+    Aggregera typade resultatrader (RESULT_COLUMNS-ordning) till buckets om seconds sekunder.
+    Returnerar en lista per kolumn i ROLLUP_COLUMNS-ordning, parametrarna till UPSERT_ROLLUP_SQL.
+    Raderna sorteras på nyckeln så att samtidiga batchar låser i samma ordning.
+    """
+    buckets = {}
+    channel, rendition, checked = _COLUMNS['channel_id'], _COLUMNS['rendition'], _COLUMNS['checked_at']
+    status, response_time = _COLUMNS['status'], _COLUMNS['response_time']
+    ttfb, stall = _COLUMNS['ttfb'], _COLUMNS['stall_seconds']
+    for row in rows:
+        key = (row[channel], row[rendition], row[checked] // seconds * seconds)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = _Bucket()
+        bucket.checks += 1
+        if row[status] in bucket.statuses:
+            bucket.statuses[row[status]] += 1
+        if row[response_time] is not None:
+            bucket.rt_count += 1
+            bucket.rt_sum += row[response_time]
+            bucket.rt_max = row[response_time] if bucket.rt_max is None else max(bucket.rt_max, row[response_time])
+            _observe(bucket.rt_hist, row[response_time])
+        if row[ttfb] is not None:
+            _observe(bucket.ttfb_hist, row[ttfb])
+        if row[stall] is not None:
+            bucket.stall_max = row[stall] if bucket.stall_max is None else max(bucket.stall_max, row[stall])
+
+    out = [(*key, b.checks, b.statuses['green'], b.statuses['yellow'], b.statuses['red'], b.rt_count, b.rt_sum,
+            b.rt_max, histogram_literal(b.rt_hist), histogram_literal(b.ttfb_hist), b.stall_max)
+           for key, b in sorted(buckets.items())]
+    return [list(column) for column in zip(*out)]
+
+
+def minute_retention_days(settings):
+    """rollup_1m_retention_days från inställningarna"""
+    try:
+        return int(settings.get('rollup_1m_retention_days', DEFAULT_MINUTE_RETENTION_DAYS))
+    except (TypeError, ValueError):
+        return DEFAULT_MINUTE_RETENTION_DAYS
+
+
+def choose_resolution(start, end, step, minute_retention_days, now):
+    """Minuter för korta och nya intervall, annars timmar. Returnerar (namn, sekunder, tabell)."""
+    minute, hour = RESOLUTIONS
+    if end - start > MAX_MINUTE_RANGE or start < now - minute_retention_days * 86400 or (step or 0) >= hour[1]:
+        return hour
+    return minute
+
+
+def rollup_query(args, minute_retention_days, now):
+    """
+    Bygger frågan för /rollups utifrån from, to, step, channel_id och rendition.
+    Returnerar (upplösning, step, sql, parametrar). Ogiltiga parametrar ger ValueError.
+    """
+    end = args.get('to', type=float) or now
+    start = args.get('from', type=float) or end - DEFAULT_RANGE
+    if start >= end:
+        raise ValueError("'from' must be before 'to'")
+    requested = args.get('step', type=int)
+    if requested is not None and requested <= 0:
+        raise ValueError("'step' must be positive")
+    name, seconds, table = choose_resolution(start, end, requested, minute_retention_days, now)
+
+    # step är en multipel av upplösningen och ger högst MAX_POINTS punkter per serie. Punkterna
+    # räknas från from avrundat nedåt till upplösningen, så step >= intervallet ger en punkt.
+    aligned = start // seconds * seconds
+    step = max(requested or seconds, math.ceil((end - start) / MAX_POINTS))
+    step = math.ceil(step / seconds) * seconds
+    if requested is not None and requested >= end - start:
+        step = max(step, math.ceil((end - aligned) / seconds) * seconds)
+
+    channel_ids = None
+    if args.get('channel_id'):
+        try:
+            channel_ids = [int(c) for c in args['channel_id'].split(',') if c.strip()]
+        except ValueError:
+            raise ValueError("'channel_id' must be a comma separated list of ids")
+
+    # Histogrammen slås ihop i databasen, och skivas så att arrayerna börjar på 1 för drivrutinerna
+    sql = f"""
+        SELECT channel_id, rendition, t, checks, green, yellow, red, rt_count, rt_sum, rt_max, stall_max,
+               array_lower(rt_hist, 1), rt_hist[array_lower(rt_hist, 1):],
+               array_lower(ttfb_hist, 1), ttfb_hist[array_lower(ttfb_hist, 1):]
+        FROM (
+            SELECT channel_id, rendition, %s + floor((extract(epoch FROM bucket) - %s) / %s) * %s AS t,
+                   sum(checks) AS checks, sum(green) AS green, sum(yellow) AS yellow, sum(red) AS red,
+                   sum(response_time_count) AS rt_count, sum(response_time_sum) AS rt_sum,
+                   max(response_time_max) AS rt_max, max(stall_seconds_max) AS stall_max,
+                   histogram_sum(response_time_hist) AS rt_hist, histogram_sum(ttfb_hist) AS ttfb_hist
+            FROM {table}
+            WHERE bucket >= to_timestamp(%s) AND bucket < to_timestamp(%s) AND rendition = %s
+              AND (%s::int4[] IS NULL OR channel_id = ANY(%s::int4[]))
+            GROUP BY channel_id, rendition, t
+        ) AS merged
+        ORDER BY channel_id, rendition, t
+    """
+    params = [aligned, aligned, step, step, aligned, end, args.get('rendition', ''), channel_ids, channel_ids]
+    return name, step, sql, params
+
+
+def _rounded(value, digits=4):
+    return round(value, digits) if value is not None else None
+
+
+def rollup_series(rows):
+    """Svaret från rollup_query som serier per kanal och rendition med percentiler per punkt"""
+    series = []
+    current = None
+    for (channel_id, rendition, t, checks, green, yellow, red, rt_count, rt_sum, rt_max, stall_max,
+         rt_low, rt_hist, ttfb_low, ttfb_hist) in rows:
+        if current is None or (current["channel_id"], current["rendition"]) != (channel_id, rendition):
+            current = {"channel_id": channel_id, "rendition": rendition, "points": []}
+            series.append(current)
+        current["points"].append({
+            "t": int(t),
+            "checks": checks,
+            "green": green,
+            "yellow": yellow,
+            "red": red,
+            "error_rate": _rounded(red / checks) if checks else None,
+            "response_time_mean": _rounded(rt_sum / rt_count) if rt_count else None,
+            "response_time_p50": _rounded(histogram_quantile(rt_low, rt_hist, 0.50, rt_max)),
+            "response_time_p95": _rounded(histogram_quantile(rt_low, rt_hist, 0.95, rt_max)),
+            "response_time_p99": _rounded(histogram_quantile(rt_low, rt_hist, 0.99, rt_max)),
+            "response_time_max": _rounded(rt_max),
+            "ttfb_p50": _rounded(histogram_quantile(ttfb_low, ttfb_hist, 0.50)),
+            "ttfb_p95": _rounded(histogram_quantile(ttfb_low, ttfb_hist, 0.95)),
+            "stall_seconds_max": _rounded(stall_max),
+        })
+    return series
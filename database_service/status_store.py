@@ -0,0 +1,165 @@
+import asyncio
+import json
+import threading
+from collections import deque
+
+from .results import RESULT_COLUMNS, RESULTS_UNNEST
+
+# Hur många övergångar som sparas för klienter som återansluter med Last-Event-ID
+DEFAULT_EVENT_BACKLOG = 10000
+
+_LATEST_VALUES = [c for c in RESULT_COLUMNS if c not in ('channel_id', 'rendition')]
+
+# Skriv senaste status för en batch. Flera resultat för samma rendition i batchen ger
+# bara det senaste, och äldre resultat än det som redan finns skriver inte över.
+# changed_at = checked_at i RETURNING betyder att statusen ändrades (eller är ny).
+UPSERT_LATEST_SQL = f"""
+    WITH incoming AS (
+        SELECT DISTINCT ON (r.channel_id, r.rendition) r.*
+        FROM {RESULTS_UNNEST}
+        JOIN channels c ON c.id = r.channel_id
+        ORDER BY r.channel_id, r.rendition, r.checked_at DESC
+    )
+    INSERT INTO channel_status_latest AS l ({', '.join(RESULT_COLUMNS)}, changed_at)
+    SELECT {', '.join('to_timestamp(checked_at)' if c == 'checked_at' else c for c in RESULT_COLUMNS)},
+           to_timestamp(checked_at)
+    FROM incoming
+    ON CONFLICT (channel_id, rendition) DO UPDATE SET
+        {', '.join(f'{c} = EXCLUDED.{c}' for c in _LATEST_VALUES)},
+        previous_status = CASE WHEN l.status IS DISTINCT FROM EXCLUDED.status THEN l.status ELSE l.previous_status END,
+        changed_at = CASE WHEN l.status IS DISTINCT FROM EXCLUDED.status THEN EXCLUDED.checked_at ELSE l.changed_at END
+    WHERE EXCLUDED.checked_at >= l.checked_at
+    RETURNING channel_id, rendition, status, previous_status, message,
+              extract(epoch FROM checked_at)::float8, changed_at = checked_at
+"""
+
+SELECT_LATEST_SQL = """
+    SELECT l.channel_id, c.channel_name, l.rendition, l.status, l.message,
+           extract(epoch FROM l.checked_at)::float8, extract(epoch FROM l.changed_at)::float8, l.previous_status,
+           l.response_time, l.stall_seconds
+    FROM channel_status_latest l
+    JOIN channels c ON c.id = l.channel_id
+    ORDER BY l.channel_id, l.rendition
+"""
+
+
+def transitions(returned):
+    """Statusövergångarna bland raderna som UPSERT_LATEST_SQL returnerade"""
+    return [
+        {"channel_id": channel_id, "rendition": rendition, "status": status, "previous_status": previous,
+         "message": message, "checked_at": checked_at}
+        for channel_id, rendition, status, previous, message, checked_at, changed in returned
+        if changed
+    ]
+
+
+def snapshot(rows):
+    """Hela flottans status från SELECT_LATEST_SQL: kanalens sammanlagda status med renditionerna under"""
+    channels, summary = [], {}
+    current = None
+    for channel_id, name, rendition, status, message, checked_at, changed_at, previous, response_time, stall in rows:
+        entry = {"status": status, "message": message, "checked_at": checked_at, "since": changed_at,
+                 "previous_status": previous, "response_time": response_time, "stall_seconds": stall}
+        if current is None or current["id"] != channel_id:
+            current = {"id": channel_id, "name": name, "status": None, "renditions": []}
+            channels.append(current)
+        if rendition == '':
+            current.update(entry)
+            summary[status] = summary.get(status, 0) + 1
+        else:
+            entry["rendition"] = rendition
+            current["renditions"].append(entry)
+    return {"summary": summary, "channels": channels}
+
+
+def filter_snapshot(snap, statuses=None, renditions=True):
+    """?status=red,yellow och ?renditions=0 på en ögonblicksbild, utan ny databasfråga"""
+    if statuses is None and renditions:
+        return snap
+    channels = [c for c in snap["channels"] if statuses is None or c["status"] in statuses]
+    if not renditions:
+        channels = [{k: v for k, v in c.items() if k != "renditions"} for c in channels]
+    return {"summary": snap["summary"], "channels": channels}
+
+
+def sse_event(event_id, data):
+    return f"id: {event_id}\nevent: transition\ndata: {json.dumps(data)}\n\n"
+
+
+class StatusEvents:
+    """
+    De senaste statusövergångarna i processen med löpnummer, för SSE-strömmen.
+    Klienter som återansluter med Last-Event-ID får det de missat så länge det finns kvar.
+    """
+
+    def __init__(self, backlog=DEFAULT_EVENT_BACKLOG):
+        self._events = deque(maxlen=backlog)
+        self._last_id = 0
+        self._changed = threading.Condition()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, events):
+        if not events:
+            return
+        with self._changed:
+            for event in events:
+                self._last_id += 1
+                self._events.append((self._last_id, event))
+            self._changed.notify_all()
+
+    def since(self, after):
+        """Övergångar efter after som (id, händelse). Ett id från före en omstart räknas som nu."""
+        with self._changed:
+            if after > self._last_id:
+                return []
+            return [(event_id, event) for event_id, event in self._events if event_id > after]
+
+    def start_id(self, last_event_id):
+        """Var en ny ström börjar: efter Last-Event-ID om det är giltigt, annars från nu"""
+        try:
+            after = int(last_event_id)
+        except (TypeError, ValueError):
+            return self._last_id
+        return after if after <= self._last_id else self._last_id
+
+    def wait(self, after, timeout):
+        """Blockera tills det finns övergångar efter after eller timeout gått"""
+        with self._changed:
+            if self._last_id <= after:
+                self._changed.wait(timeout)
+        return self.since(after)
+
+
+class AsyncStatusEvents(StatusEvents):
+    """StatusEvents för den asynkrona servern, väntan sker på event-loopen"""
+
+    def __init__(self, backlog=DEFAULT_EVENT_BACKLOG):
+        super().__init__(backlog)
+        self._published = asyncio.Event()
+        self.closed = False
+
+    def publish(self, events):
+        super().publish(events)
+        if events:
+            self._wake()
+
+    def close(self):
+        """Avsluta alla strömmar, så att servern kan stängas utan att vänta på klienterna"""
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        self._published.set()
+        self._published = asyncio.Event()
+
+    async def wait(self, after, timeout):
+        published = self._published
+        if self._last_id <= after and not self.closed:
+            try:
+                await asyncio.wait_for(published.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.since(after)
@@ -0,0 +1,31 @@
+import os
+import sys
+from starlette.testclient import TestClient
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database_service.asgi import app, numbered, RESULT_INSERT_SQL
+from database_service.results import result_row, typed_row
+
+
+def test_numbered_placeholders():
+    """✅ Testar att frågorna från channel_query får asyncpg-platshållare"""
+    assert numbered("SELECT id FROM channels WHERE id > %s AND worker_id = %s LIMIT %s") == \
+        "SELECT id FROM channels WHERE id > $1 AND worker_id = $2 LIMIT $3"
+
+
+def test_result_rows_are_typed_for_unnest():
+    """✅ Testar att resultat får kolumnernas typer och att ogiltiga värden ger en avvisad rad"""
+    row = typed_row(result_row({"channel_id": "7", "checked_at": 1700000000, "status": "green", "response_time": 1}))
+    assert row[:4] == (7, '', 1700000000.0, 'green')
+    assert isinstance(row[7], float)
+    assert typed_row(result_row({"channel_id": 1, "checked_at": 1, "status": "red", "segment_count": "many"})) is None
+    assert "to_timestamp(checked_at)" in RESULT_INSERT_SQL and "$14::float4[]" in RESULT_INSERT_SQL
+
+
+def test_unknown_fields_rejected_like_flask():
+    """✅ Testar att async-appen svarar som Flask-appen på okända fält, utan databas"""
+    response = TestClient(app).get("/channels?fields=id;DROP TABLE channels")
+    assert response.status_code == 400
+    assert "Unknown fields" in response.json()["error"]
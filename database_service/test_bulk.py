@@ -0,0 +1,32 @@
+import os
+import sys
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database_service.bulk import copy_buffer, parse_body, validate
+
+
+def test_parse_csv_and_validate_rows():
+    """✅ Testar CSV med alias, borttagning, dubbletter och saknade fält"""
+    body = (b"key,name,url,delete\n"
+            b"a,Kanal A,http://cdn.example/a.m3u8,\n"
+            b"b,,,true\n"
+            b"a,Igen,http://cdn.example/a2.m3u8,\n"
+            b"c,Utan URL,,\n")
+    rows, errors = validate(parse_body('text/csv', body))
+
+    assert [(r['row_no'], r['channel_key'], r['delete']) for r in rows] == [(0, 'a', False), (1, 'b', True)]
+    assert rows[0]['channel_name'] == 'Kanal A'
+    assert [(e['row'], e['error']) for e in errors] == [
+        (2, "Duplicate channel_key in request"),
+        (3, "name and url are required"),
+    ]
+
+
+def test_json_rows_become_copy_csv():
+    """✅ Testar att JSON-rader blir CSV för COPY med tomma fält som NULL"""
+    rows, errors = validate(parse_body('application/json', b'{"channels": [{"channel_key": "a", "name": "A, B", "url": "u"}]}'))
+
+    assert errors == []
+    assert copy_buffer(rows).getvalue() == '0,a,"A, B",u,,False\r\n'
@@ -0,0 +1,77 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database_service.config_cache import ConfigCache
+
+
+class FakeDatabase:
+    """Svarar på versionsfrågan och räknar hur många gånger kanalerna laddats"""
+    def __init__(self):
+        self.versions = {'channels': 1}
+        self.channels = ['a']
+        self.loads = 0
+
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, query):
+        pass
+
+    def fetchall(self):
+        return list(self.versions.items())
+
+    def load_channels(self, cur):
+        self.loads += 1
+        return list(self.channels)
+
+
+def make_cache(db, clock):
+    return ConfigCache(db.cursor, {'channels': db.load_channels}, revalidate_after=5.0, clock=clock)
+
+
+def test_cache_reloads_only_when_version_changes(clock):
+    """✅ Testar att kanalerna bara laddas om när versionen i databasen ändrats"""
+    db = FakeDatabase()
+    cache = make_cache(db, clock)
+
+    assert cache.get('channels') == (1, ['a'])
+    clock.now = 10.0
+    assert cache.get('channels') == (1, ['a'])
+    assert db.loads == 1
+
+    db.versions['channels'] = 2
+    db.channels = ['a', 'b']
+    # Inom revalidate_after används cachen, invalidate tvingar omladdning
+    assert cache.get('channels') == (1, ['a'])
+    cache.invalidate()
+    assert cache.get('channels') == (2, ['a', 'b'])
+    assert db.loads == 2
+
+
+def test_wait_for_change_wakes_on_refresh(clock):
+    """✅ Testar att long-poll väcks av en ny version och ger timeout annars"""
+    db = FakeDatabase()
+    cache = make_cache(db, clock)
+    cache.get('channels')
+    cache.listening = True
+
+    assert cache.wait_for_change('channels', since=0, timeout=0) == (1, ['a'])
+
+    def change():
+        db.versions['channels'] = 2
+        cache.refresh()
+
+    timer = threading.Timer(0.05, change)
+    timer.start()
+    cache.clock = time.monotonic
+    assert cache.wait_for_change('channels', since=1, timeout=2) == (2, ['a'])
+    timer.join()
+
+    assert cache.wait_for_change('channels', since=2, timeout=0.01) is None
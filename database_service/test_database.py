@@ -0,0 +1,43 @@
+import os
+import sys
+import pytest
+from werkzeug.datastructures import MultiDict
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database_service.database import channel_query
+from database_service.results import accepted_window, parse_results
+
+
+def test_channel_query_keyset_page():
+    """✅ Testar keyset-paginering, fältval och shard-filter"""
+    fields, sql, params, limit = channel_query(MultiDict({
+        'after_id': '100', 'limit': '50', 'fields': 'name,worker_id', 'worker_id': '2'
+    }))
+
+    assert fields == ['id', 'name', 'worker_id']
+    assert sql == ("SELECT id, channel_name, worker_id FROM channels "
+                   "WHERE id > %s AND worker_id = %s ORDER BY id LIMIT %s")
+    assert params == [100, '2', 50]
+    assert limit == 50
+
+
+def test_channel_query_rejects_unknown_fields():
+    """✅ Testar att okända fält inte kan smygas in i frågan"""
+    with pytest.raises(ValueError):
+        channel_query(MultiDict({'fields': 'id;DROP TABLE channels'}))
+
+
+def test_results_outside_partitions_rejected():
+    """✅ Testar att resultat äldre än retention eller för långt fram avvisas istället för att hamna i DEFAULT"""
+    now = 1_700_000_000.0
+    window = accepted_window({'status_retention_days': '3'}, now)
+    assert window == (now - 3 * 86400, now + 86400)
+    rows, rejected = parse_results([
+        {"channel_id": 1, "checked_at": now, "status": "green"},
+        {"channel_id": 1, "checked_at": now + 3 * 86400, "status": "green"},
+        {"channel_id": 1, "checked_at": now - 4 * 86400, "status": "green"},
+    ], window)
+    assert [row[2] for row in rows] == [now] and rejected == 2
+    assert accepted_window({'status_retention_days': 'x'}, now)[0] == now - 7 * 86400
@@ -0,0 +1,145 @@
+import os
+import sys
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database_service import database
+from database_service.db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.rollbacks = 0
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    @property
+    def info(self):
+        return self
+
+    @property
+    def transaction_status(self):
+        return self.status
+
+    def get_transaction_status(self):
+        return self.status
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Alla anslutningar poolen öppnat, utan någon databas"""
+    opened = []
+
+    def connect(*args, **kwargs):
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(psycopg2, "connect", connect)
+    return opened
+
+
+def test_connections_are_reused(connections):
+    """✅ Testar att en återlämnad anslutning lånas ut igen istället för att stängas"""
+    pool = ConnectionPool(2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert second is first and not first.closed
+    assert len(connections) == 1
+
+
+def test_checkout_timeout_raises_and_route_returns_503(connections, monkeypatch):
+    """✅ Testar att en full pool ger PoolTimeout efter checkout_timeout och 503 från routen"""
+    pool = ConnectionPool(1, checkout_timeout=0.05)
+    monkeypatch.setattr(database, "_pool", pool)
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+        response = database.app.test_client().delete("/channels/1")
+    assert response.status_code == 503
+    # Slotten är tillbaka när anslutningen lämnats tillbaka
+    with pool.connection():
+        pass
+
+
+def test_unhealthy_connection_is_replaced(connections):
+    """✅ Testar att en stängd eller trasig anslutning kastas och ersätts med en ny"""
+    pool = ConnectionPool(2, health_check_after=0)
+    with pool.connection() as conn:
+        pass
+    conn.closed = 1
+    with pool.connection() as replacement:
+        pass
+    assert replacement is not conn
+
+    replacement.broken = True
+    with pool.connection() as fresh:
+        pass
+    assert fresh is not replacement and replacement.closed
+    assert len(connections) == 3
+
+
+def test_open_transaction_rolled_back_on_release(connections):
+    """✅ Testar att en anslutning som lämnas tillbaka mitt i en transaktion rullas tillbaka"""
+    pool = ConnectionPool(1)
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE settings SET value = '1';")
+    assert conn.rollbacks == 1
+    assert conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+def test_slot_released_when_connect_fails(connections, monkeypatch):
+    """✅ Testar att slotten släpps när uppkopplingen misslyckas, så att poolen inte töms på platser"""
+    pool = ConnectionPool(1, checkout_timeout=0.05)
+
+    def refuse(*args, **kwargs):
+        raise psycopg2.OperationalError("could not connect to server")
+
+    monkeypatch.setattr(psycopg2, "connect", refuse)
+    for _ in range(3):
+        with pytest.raises(psycopg2.OperationalError):
+            with pool.connection():
+                pass
+
+    monkeypatch.setattr(psycopg2, "connect", lambda *args, **kwargs: FakeConnection())
+    with pool.connection() as conn:
+        assert not conn.closed
@@ -0,0 +1,85 @@
+import os
+import sys
+
+from werkzeug.datastructures import MultiDict
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database_service.results import parse_results
+from database_service.rollups import (HISTOGRAM_GROWTH, HISTOGRAM_MIN, ROLLUP_COLUMNS, histogram_index,
+                                      histogram_literal, histogram_quantile, rollup_columns, rollup_query,
+                                      rollup_series)
+
+NOW = 1_700_000_000.0
+
+
+def test_histogram_quantile_within_bucket_error():
+    """✅ Testar att percentilen ur histogrammet ligger inom en buckets fel från det verkliga värdet"""
+    values = [0.01 * i for i in range(1, 101)]
+    counts = {}
+    for value in values:
+        counts[histogram_index(value)] = counts.get(histogram_index(value), 0) + 1
+    low = min(counts)
+    dense = [counts.get(i, 0) for i in range(low, max(counts) + 1)]
+    p95 = histogram_quantile(low, dense, 0.95)
+    assert 0.95 <= p95 <= 0.95 * HISTOGRAM_GROWTH
+    assert histogram_quantile(low, dense, 1.0, maximum=1.0) == 1.0
+    assert histogram_quantile(0, [], 0.5) is None
+    assert histogram_index(HISTOGRAM_MIN / 2) == 0
+    assert histogram_literal({21: 5, 23: 1}) == '[21:23]={5,0,1}'
+
+
+def test_rollup_columns_aggregates_per_bucket():
+    """✅ Testar att en batch blir en rad per kanal, rendition och minut med summor och histogram"""
+    rows, _ = parse_results([
+        {"channel_id": 1, "checked_at": NOW + 1, "status": "green", "response_time": 0.1, "ttfb": 0.05},
+        {"channel_id": 1, "checked_at": NOW + 2, "status": "red", "response_time": 0.3},
+        {"channel_id": 1, "checked_at": NOW + 120, "status": "green"},
+        {"channel_id": 1, "rendition": "720p", "checked_at": NOW + 3, "status": "yellow", "stall_seconds": 4},
+    ])
+    columns = dict(zip(ROLLUP_COLUMNS, rollup_columns(rows, 60)))
+    assert columns['rendition'] == ['', '', '720p']
+    assert columns['bucket'] == [NOW // 60 * 60, (NOW + 120) // 60 * 60, NOW // 60 * 60]
+    assert columns['checks'] == [2, 1, 1]
+    assert (columns['green'][0], columns['red'][0], columns['yellow'][2]) == (1, 1, 1)
+    assert columns['response_time_count'][0] == 2
+    assert columns['response_time_max'][0] == 0.3
+    assert columns['response_time_hist'][0].startswith(f"[{histogram_index(0.1)}:{histogram_index(0.3)}]=")
+    assert columns['response_time_hist'][1] is None
+    assert columns['stall_seconds_max'][2] == 4.0
+
+
+def test_rollup_query_picks_resolution():
+    """✅ Testar att korta intervall läses per minut och långa, gamla eller grova per timme"""
+    hour = rollup_query(MultiDict({'from': NOW - 7 * 86400, 'to': NOW}), 14, NOW)
+    minute = rollup_query(MultiDict({'from': NOW - 600, 'to': NOW, 'channel_id': '1,2'}), 14, NOW)
+    assert (hour[0], minute[0]) == ('1h', '1m')
+    assert minute[1] == 60 and minute[3][-2:] == [[1, 2], [1, 2]]
+    assert 'channel_rollup_1h' in hour[2]
+    assert rollup_query(MultiDict({'from': NOW - 3 * 86400}), 2, NOW)[0] == '1h'
+    assert rollup_query(MultiDict({'from': NOW - 600, 'step': 3600}), 14, NOW)[0] == '1h'
+    # step lika med intervallet ger en enda punkt
+    whole = rollup_query(MultiDict({'from': NOW - 7 * 86400, 'to': NOW, 'step': 7 * 86400}), 14, NOW)
+    assert whole[3][0] + whole[1] >= NOW
+
+
+def test_rollup_query_rejects_bad_parameters():
+    """✅ Testar att ogiltiga parametrar ger ValueError"""
+    for args in ({'from': NOW, 'to': NOW - 1}, {'step': 0}, {'channel_id': 'abc'}):
+        try:
+            rollup_query(MultiDict(args), 14, NOW)
+        except ValueError:
+            continue
+        raise AssertionError(f"{args} accepterades")
+
+
+def test_rollup_series_percentiles():
+    """✅ Testar att rader från databasen blir serier med felandel och percentiler"""
+    low = histogram_index(0.1)
+    rows = [(1, '', NOW, 10, 9, 0, 1, 10, 1.0, 0.1, None, low, [10], None, None)]
+    point = rollup_series(rows)[0]["points"][0]
+    assert point["error_rate"] == 0.1
+    assert point["response_time_mean"] == 0.1
+    assert point["response_time_p95"] == 0.1
+    assert point["ttfb_p50"] is None
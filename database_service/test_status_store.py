@@ -0,0 +1,67 @@
+import os
+import sys
+import threading
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database_service.status_store import StatusEvents, filter_snapshot, snapshot, sse_event, transitions
+
+
+ROWS = [
+    (1, 'Kanal 1', '', 'red', 'Stall', 100.0, 90.0, 'green', 0.2, 30.0),
+    (1, 'Kanal 1', '1080p', 'red', 'Stall', 100.0, 90.0, 'green', 0.2, 30.0),
+    (1, 'Kanal 1', '720p', 'green', None, 100.0, 10.0, None, 0.1, 0.0),
+    (2, 'Kanal 2', '', 'green', None, 101.0, 5.0, None, 0.1, 0.0),
+]
+
+
+def test_snapshot_groups_renditions_under_channel():
+    """✅ Testar att ögonblicksbilden har kanalens status överst och renditionerna under"""
+    snap = snapshot(ROWS)
+    assert snap["summary"] == {"red": 1, "green": 1}
+    first = snap["channels"][0]
+    assert (first["id"], first["status"], first["since"], first["previous_status"]) == (1, 'red', 90.0, 'green')
+    assert [r["rendition"] for r in first["renditions"]] == ['1080p', '720p']
+    assert snap["channels"][1]["renditions"] == []
+
+
+def test_filter_snapshot():
+    """✅ Testar ?status= och ?renditions=0 utan att ändra den cachade ögonblicksbilden"""
+    snap = snapshot(ROWS)
+    red = filter_snapshot(snap, {'red'}, renditions=False)
+    assert [c["id"] for c in red["channels"]] == [1]
+    assert "renditions" not in red["channels"][0]
+    assert len(snap["channels"][0]["renditions"]) == 2
+    assert filter_snapshot(snap) is snap
+
+
+def test_transitions_only_changed_rows():
+    """✅ Testar att bara rader där statusen ändrades blir händelser"""
+    returned = [(1, '', 'red', 'green', 'Stall', 100.0, True), (2, '', 'green', None, None, 101.0, False)]
+    assert transitions(returned) == [
+        {"channel_id": 1, "rendition": '', "status": 'red', "previous_status": 'green', "message": 'Stall',
+         "checked_at": 100.0}
+    ]
+
+
+def test_status_events_resume_from_last_event_id():
+    """✅ Testar att en klient som återansluter får det den missat, och att okända id:n börjar från nu"""
+    events = StatusEvents(backlog=3)
+    events.publish([{"n": 1}, {"n": 2}])
+    events.publish([{"n": 3}, {"n": 4}])
+    assert [e["n"] for _, e in events.since(events.start_id("2"))] == [3, 4]
+    # Bara de tre senaste finns kvar
+    assert [i for i, _ in events.since(events.start_id("0"))] == [2, 3, 4]
+    assert events.start_id("999") == events.start_id(None) == 4
+    assert events.since(4) == []
+    assert sse_event(4, {"n": 4}) == 'id: 4\nevent: transition\ndata: {"n": 4}\n\n'
+
+
+def test_status_events_wait_wakes_on_publish():
+    """✅ Testar att en väntande ström vaknar när en övergång publiceras"""
+    events = StatusEvents()
+    timer = threading.Timer(0.05, events.publish, args=([{"n": 1}],))
+    timer.start()
+    assert events.wait(0, timeout=5) == [(1, {"n": 1})]
+    assert events.wait(1, timeout=0.01) == []
@@ -26,4 +26,218 @@ ON CONFLICT (key) DO NOTHING;
 -- Test channel för utveckling
 INSERT INTO channels (channel_key, channel_url, channel_name, channel_description) VALUES
     ('test_channel', 'https://test-streams.mux.dev/x36xhzz/x36xhzz.m3u8', 'Test Channel', 'Test Stream')
-ON CONFLICT (channel_key) DO NOTHING; 
\ No newline at end of file
+ON CONFLICT (channel_key) DO NOTHING; 
+-- Historik över kontrollresultat, en rad per rendition och kontroll.
+-- rendition = '' är kanalens sammanlagda status.
+CREATE TABLE IF NOT EXISTS channel_status (
+    channel_id INTEGER NOT NULL,
+    rendition TEXT NOT NULL DEFAULT '',
+    checked_at TIMESTAMPTZ NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT,
+    segment_count INTEGER,
+    media_sequence BIGINT,
+    response_time REAL,
+    ttfb REAL,
+    download_time REAL,
+    throughput DOUBLE PRECISION,
+    realtime_factor REAL,
+    stall_seconds REAL,
+    check_duration REAL
+) PARTITION BY RANGE (checked_at);
+
+CREATE INDEX IF NOT EXISTS channel_status_channel_time_idx ON channel_status (channel_id, checked_at DESC);
+
+-- Fångar rader utanför skapade partitioner så att inga resultat tappas
+CREATE TABLE IF NOT EXISTS channel_status_default PARTITION OF channel_status DEFAULT;
+
+-- Skapa dagspartitioner från idag och days_ahead dagar framåt
+CREATE OR REPLACE FUNCTION ensure_channel_status_partitions(days_ahead INTEGER DEFAULT 2) RETURNS void AS $$
+DECLARE
+    day DATE;
+BEGIN
+    FOR i IN 0..days_ahead LOOP
+        day := (now() AT TIME ZONE 'UTC')::date + i;
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF channel_status FOR VALUES FROM (%L) TO (%L)',
+            'channel_status_' || to_char(day, 'YYYYMMDD'),
+            day::timestamp AT TIME ZONE 'UTC',
+            (day + 1)::timestamp AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Ta bort dagspartitioner äldre än retention_days, returnerar antal borttagna
+CREATE OR REPLACE FUNCTION drop_channel_status_partitions(retention_days INTEGER) RETURNS INTEGER AS $$
+DECLARE
+    part RECORD;
+    dropped INTEGER := 0;
+    cutoff TEXT := 'channel_status_' || to_char((now() AT TIME ZONE 'UTC')::date - retention_days, 'YYYYMMDD');
+BEGIN
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'channel_status' AND c.relname ~ '^channel_status_[0-9]{8}$'
+    LOOP
+        IF part.relname < cutoff THEN
+            EXECUTE format('DROP TABLE IF EXISTS %I', part.relname);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_channel_status_partitions(2);
+
+INSERT INTO settings (key, value) VALUES
+    ('status_retention_days', '7')
+ON CONFLICT (key) DO NOTHING;
+
+-- Versionsnummer för kanaler och inställningar. Räknas upp av triggers vid varje ändring
+-- och skickas ut med NOTIFY config_changed ('<namn>:<version>') så att databastjänsten
+-- kan hålla en cache och klienter kan fråga med If-None-Match.
+CREATE TABLE IF NOT EXISTS config_version (
+    name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1
+);
+
+INSERT INTO config_version (name) VALUES ('channels'), ('settings')
+ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_config_version() RETURNS trigger AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    UPDATE config_version SET version = version + 1 WHERE name = TG_ARGV[0]
+    RETURNING version INTO new_version;
+    PERFORM pg_notify('config_changed', TG_ARGV[0] || ':' || new_version);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS channels_config_version ON channels;
+CREATE TRIGGER channels_config_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON channels
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version('channels');
+
+DROP TRIGGER IF EXISTS settings_config_version ON settings;
+CREATE TRIGGER settings_config_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON settings
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_config_version('settings');
+
+-- Vilken monitor worker som övervakar kanalen, sätts av monitor_manager via PUT /channels/assignments
+ALTER TABLE channels ADD COLUMN IF NOT EXISTS worker_id TEXT;
+
+CREATE INDEX IF NOT EXISTS channels_worker_idx ON channels (worker_id, id);
+
+-- Kanaler lades tidigare till med id = MAX(id) + 1 utan att använda sekvensen.
+-- Flytta fram sekvensen förbi befintliga id:n så att nya kanaler inte krockar.
+SELECT setval(pg_get_serial_sequence('channels', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM channels;
+
+-- Senaste status per kanal och rendition, en rad per (channel_id, rendition) som skrivs
+-- över vid varje inkommande batch. Dashboarden läser hela flottan härifrån istället för
+-- att söka i historiken. changed_at är när statusen senast ändrades och previous_status
+-- statusen före den ändringen.
+CREATE TABLE IF NOT EXISTS channel_status_latest (
+    channel_id INTEGER NOT NULL,
+    rendition TEXT NOT NULL DEFAULT '',
+    checked_at TIMESTAMPTZ NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT,
+    segment_count INTEGER,
+    media_sequence BIGINT,
+    response_time REAL,
+    ttfb REAL,
+    download_time REAL,
+    throughput DOUBLE PRECISION,
+    realtime_factor REAL,
+    stall_seconds REAL,
+    check_duration REAL,
+    changed_at TIMESTAMPTZ NOT NULL,
+    previous_status TEXT,
+    PRIMARY KEY (channel_id, rendition)
+);
+
+-- Borttagna kanaler ska inte ligga kvar i ögonblicksbilden
+CREATE OR REPLACE FUNCTION delete_channel_status_latest() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM channel_status_latest WHERE channel_id = OLD.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS channels_delete_status_latest ON channels;
+CREATE TRIGGER channels_delete_status_latest
+    AFTER DELETE ON channels
+    FOR EACH ROW EXECUTE FUNCTION delete_channel_status_latest();
+
+-- Aggregerad historik per kanal, rendition och minut respektive timme, uppdaterad vid
+-- varje POST /results. Latenserna sparas som histogram med logaritmiska buckets
+-- (database_service/rollups.py) som kan slås ihop, så att percentiler går att räkna
+-- över godtyckliga intervall utan att läsa rådata. Histogrammen är int4-arrayer där
+-- arrayens undre gräns är första bucketen med värden, t.ex. '[21:23]={5,3,1}'.
+
+-- Summera två histogram bucket för bucket, resultatet börjar på den lägsta av de två gränserna
+CREATE OR REPLACE FUNCTION histogram_add(a INTEGER[], b INTEGER[]) RETURNS INTEGER[] AS $$
+    SELECT CASE
+        WHEN a IS NULL THEN b
+        WHEN b IS NULL THEN a
+        ELSE (
+            SELECT format('[%s:%s]=', LEAST(array_lower(a, 1), array_lower(b, 1)),
+                          GREATEST(array_upper(a, 1), array_upper(b, 1)))
+                   || array_agg(COALESCE(a[i], 0) + COALESCE(b[i], 0) ORDER BY i)::text
+            FROM generate_series(LEAST(array_lower(a, 1), array_lower(b, 1)),
+                                 GREATEST(array_upper(a, 1), array_upper(b, 1))) AS i
+        )::INTEGER[]
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE AGGREGATE histogram_sum(INTEGER[]) (
+    SFUNC = histogram_add,
+    STYPE = INTEGER[]
+);
+
+CREATE TABLE IF NOT EXISTS channel_rollup_1m (
+    channel_id INTEGER NOT NULL,
+    rendition TEXT NOT NULL DEFAULT '',
+    bucket TIMESTAMPTZ NOT NULL,
+    checks INTEGER NOT NULL,
+    green INTEGER NOT NULL,
+    yellow INTEGER NOT NULL,
+    red INTEGER NOT NULL,
+    response_time_count INTEGER NOT NULL,
+    response_time_sum DOUBLE PRECISION NOT NULL,
+    response_time_max REAL,
+    response_time_hist INTEGER[],
+    ttfb_hist INTEGER[],
+    stall_seconds_max REAL,
+    PRIMARY KEY (channel_id, rendition, bucket)
+);
+CREATE INDEX IF NOT EXISTS channel_rollup_1m_bucket_idx ON channel_rollup_1m (bucket);
+
+CREATE TABLE IF NOT EXISTS channel_rollup_1h (LIKE channel_rollup_1m INCLUDING ALL);
+
+-- Ta bort rollups äldre än rollup_1m_retention_days / rollup_1h_retention_days, returnerar antal rader
+CREATE OR REPLACE FUNCTION prune_channel_rollups() RETURNS INTEGER AS $$
+DECLARE
+    minute_days INTEGER := COALESCE((SELECT value::int FROM settings WHERE key = 'rollup_1m_retention_days'), 14);
+    hour_days INTEGER := COALESCE((SELECT value::int FROM settings WHERE key = 'rollup_1h_retention_days'), 400);
+    deleted INTEGER;
+    total INTEGER;
+BEGIN
+    DELETE FROM channel_rollup_1m WHERE bucket < now() - make_interval(days => minute_days);
+    GET DIAGNOSTICS total = ROW_COUNT;
+    DELETE FROM channel_rollup_1h WHERE bucket < now() - make_interval(days => hour_days);
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN total + deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+INSERT INTO settings (key, value) VALUES
+    ('rollup_1m_retention_days', '14'),
+    ('rollup_1h_retention_days', '400')
+ON CONFLICT (key) DO NOTHING;
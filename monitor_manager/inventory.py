@@ -0,0 +1,121 @@
+import hashlib
+import json
+import threading
+
+# Labels som sätts på worker-containrar och som managern filtrerar på
+LABEL_ROLE = 'ott-monitor.role'
+LABEL_WORKER = 'ott-monitor.worker'
+LABEL_CONFIG_HASH = 'ott-monitor.config-hash'
+ROLE_WORKER = 'worker'
+WORKER_FILTER = f'{LABEL_ROLE}={ROLE_WORKER}'
+
+# Docker-händelse -> containerstatus
+EVENT_STATUS = {
+    'create': 'created',
+    'start': 'running',
+    'restart': 'running',
+    'unpause': 'running',
+    'pause': 'paused',
+    'stop': 'exited',
+    'die': 'exited',
+    'kill': 'exited',
+}
+
+
+def config_hash(options):
+    """
+    Kort hash av det en worker startas med. Kanaler ingår inte, workers
+    hämtar sin shard och laddar om den själva utan omstart.
+    """
+    payload = json.dumps(options, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def worker_labels(worker_id, config):
+    return {
+        LABEL_ROLE: ROLE_WORKER,
+        LABEL_WORKER: worker_id,
+        LABEL_CONFIG_HASH: config,
+    }
+
+
+class WorkerContainer:
+    """Det managern behöver veta om en worker-container"""
+    __slots__ = ('worker_id', 'container_id', 'name', 'status', 'config_hash')
+
+    def __init__(self, worker_id, container_id, name, status, config_hash):
+        self.worker_id = worker_id
+        self.container_id = container_id
+        self.name = name
+        self.status = status
+        self.config_hash = config_hash
+
+    @classmethod
+    def from_labels(cls, container_id, name, status, labels):
+        worker_id = labels.get(LABEL_WORKER)
+        if worker_id is None:
+            return None
+        return cls(worker_id, container_id, name, status, labels.get(LABEL_CONFIG_HASH))
+
+
+class Inventory:
+    """
+    Index över worker-containrar i minnet.
+
+    Laddas med ett label-filtrerat, sparse list-anrop (inga inspect per container)
+    och hålls sedan uppdaterat från Docker-händelser och managerns egna operationer.
+    """
+
+    def __init__(self):
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def load(self, docker_client):
+        """Ersätt indexet med det Docker rapporterar just nu"""
+        workers = {}
+        for container in docker_client.containers.list(all=True, sparse=True, filters={'label': WORKER_FILTER}):
+            attrs = container.attrs
+            names = attrs.get('Names') or ['']
+            record = WorkerContainer.from_labels(container.id, names[0].lstrip('/'), attrs.get('State'),
+                                                 attrs.get('Labels') or {})
+            if record is not None:
+                workers[record.worker_id] = record
+        with self._lock:
+            self._workers = workers
+
+    def apply_event(self, event):
+        """Uppdatera indexet från en Docker-händelse. Returnerar workerns ID om den berördes."""
+        actor = event.get('Actor', {})
+        attributes = actor.get('Attributes', {})
+        action = event.get('Action') or event.get('status')
+        if attributes.get(LABEL_ROLE) != ROLE_WORKER or action is None:
+            return None
+
+        worker_id = attributes.get(LABEL_WORKER)
+        with self._lock:
+            current = self._workers.get(worker_id)
+            if action == 'destroy':
+                if current is not None and current.container_id == actor.get('ID'):
+                    del self._workers[worker_id]
+                return worker_id
+            status = EVENT_STATUS.get(action)
+            if status is None:
+                return None
+            record = WorkerContainer.from_labels(actor.get('ID'), attributes.get('name'), status, attributes)
+            if record is not None:
+                self._workers[worker_id] = record
+        return worker_id
+
+    def add(self, record):
+        with self._lock:
+            self._workers[record.worker_id] = record
+
+    def discard(self, worker_id, container_id):
+        with self._lock:
+            current = self._workers.get(worker_id)
+            if current is not None and current.container_id == container_id:
+                del self._workers[worker_id]
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._workers)
@@ -2,10 +2,15 @@ import time
 import docker
 import requests
 import logging
-from typing import Dict
 import signal
 import sys
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .inventory import LABEL_ROLE, WORKER_FILTER, Inventory, WorkerContainer, config_hash, worker_labels
+from .reconcile import REMOVE, RESTART, START, OperationPool, plan_actions
+from .sharding import assign_channels, worker_pool
 
 # Konfigurera loggning
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)-8s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
@@ -14,6 +19,16 @@ logger = logging.getLogger(__name__)
 # Global flagga för att kontrollera om vi ska fortsätta köra
 running = True
 
+WORKER_PREFIX = 'monitor_worker_'
+LEGACY_PREFIX = 'monitor_service_'
+# Long-poll mot /channels/changes
+CHANGES_TIMEOUT = 25
+# Väntetid efter en händelse så att flera ändringar i följd ger en genomgång
+RECONCILE_DEBOUNCE = 0.5
+# Docker-händelser som håller inventariet aktuellt
+WATCHED_EVENTS = ['create', 'start', 'die', 'stop', 'destroy']
+WORKER_IMAGE = 'monitor_service_image'
+
 def signal_handler(signum, frame):
     """Hantera shutdown signaler"""
     global running
@@ -22,131 +37,239 @@ def signal_handler(signum, frame):
 
 class MonitorManager:
     def __init__(self):
-        self.docker_client = docker.from_env()
         self.database_url = os.getenv('DATABASE_SERVICE_URL')
         self.docker_network = os.getenv('DOCKER_NETWORK')
-        self.active_containers: Dict[int, str] = {}
+        self.channels_per_worker = int(os.getenv('CHANNELS_PER_WORKER', 500))
+        self.fixed_workers = int(os.getenv('MONITOR_WORKERS', 0)) or None
+        # Full genomgång även utan händelser, som skydd mot missade events
+        self.resync_interval = float(os.getenv('RESYNC_INTERVAL', 60))
+        # Timeout per Docker-anrop, så att en hängande operation inte låser sin worker för evigt
+        self.docker_client = docker.from_env(timeout=int(os.getenv('DOCKER_OP_TIMEOUT', 60)))
+        self.operations = OperationPool(int(os.getenv('DOCKER_CONCURRENCY', 8)))
+        self.wakeup = threading.Event()
+        self.inventory = Inventory()
+        self.session = requests.Session()
+        self.channels = []
+        self.channels_etag = None
+        self.channels_version = 0
+        self.published_assignment = None
+
+    def _store_channels(self, response, channels):
+        self.channels = channels
+        self.channels_etag = response.headers.get('ETag')
+        self.channels_version = int(response.headers.get('X-Config-Version', 0))
 
     def get_channels(self):
-        """Hämta kanaler från databasen"""
+        """Hämta kanaler från databasen. Oförändrad lista (304) och fel ger den senast kända."""
         try:
-            response = requests.get(f"{self.database_url}/channels")
+            headers = {'If-None-Match': self.channels_etag} if self.channels_etag else {}
+            response = self.session.get(f"{self.database_url}/channels", headers=headers, timeout=10)
+            if response.status_code == 304:
+                return self.channels
             response.raise_for_status()
-            return response.json()['channels']
+            self._store_channels(response, response.json()['channels'])
         except Exception as e:
             logger.error(f"❌ Fel vid hämtning av kanaler: {e}")
-            return []
+        return self.channels
+
+    def wait_for_changes(self, timeout=CHANGES_TIMEOUT):
+        """Vänta (long-poll) tills kanallistan ändrats eller timeout passerat. Returnerar True vid ändring."""
+        try:
+            response = self.session.get(
+                f"{self.database_url}/channels/changes",
+                params={'since': self.channels_version, 'timeout': timeout},
+                timeout=timeout + 5
+            )
+            if response.status_code == 200:
+                data = response.json()
+                self._store_channels(response, data['channels'])
+                logger.info(f"📣 Kanallistan ändrad (version {data['version']})")
+                return True
+            if response.status_code == 204:
+                return False
+            response.raise_for_status()
+        except Exception as e:
+            logger.error(f"❌ Fel vid väntan på kanaländringar: {e}")
+        time.sleep(timeout)
+        return False
+
+    def watch_channel_changes(self):
+        """Tråd: väck reconcile-loopen när kanallistan ändras"""
+        while running:
+            if self.wait_for_changes():
+                self.wakeup.set()
+
+    def watch_docker_events(self):
+        """Tråd: väck reconcile-loopen när en worker-container startar, dör eller tas bort"""
+        while running:
+            try:
+                events = self.docker_client.events(
+                    decode=True,
+                    filters={'type': 'container', 'event': WATCHED_EVENTS, 'label': WORKER_FILTER}
+                )
+                for event in events:
+                    worker_id = self.inventory.apply_event(event)
+                    if worker_id is not None:
+                        logger.info(f"🐳 Worker {worker_id}: {event.get('Action') or event.get('status')}")
+                        self.wakeup.set()
+                    if not running:
+                        break
+            except Exception as e:
+                logger.error(f"❌ Tappade Docker-händelser: {e}")
+                time.sleep(5)
 
-    def update_containers(self):
-        """Uppdatera monitor_service containrar baserat på kanaldata från databasen"""
+    def publish_assignment(self, assignment):
+        """Spara kanaltilldelningen i databasen så att workers kan hämta sin egen shard"""
+        if assignment == self.published_assignment:
+            return
+        try:
+            response = self.session.put(
+                f"{self.database_url}/channels/assignments",
+                json={'assignments': assignment},
+                timeout=10
+            )
+            response.raise_for_status()
+            self.published_assignment = assignment
+            logger.info(f"📝 Publicerade kanaltilldelning ({response.json().get('updated', 0)} ändrade kanaler)")
+        except Exception as e:
+            logger.error(f"❌ Kunde inte publicera kanaltilldelning: {e}")
+
+    def worker_ids(self, channel_count):
+        """Worker-poolen, fast storlek via MONITOR_WORKERS eller elastisk efter antal kanaler"""
+        return worker_pool(channel_count, self.channels_per_worker, self.fixed_workers)
+
+    def worker_options(self):
+        """Inställningarna som ingår i en workers config-hash, ändras de startas workern om"""
+        return {
+            'image': WORKER_IMAGE,
+            'channels_per_worker': self.channels_per_worker,
+            'database_url': self.database_url,
+        }
+
+    def list_legacy_containers(self):
+        """
+        Gamla en-container-per-kanal monitorer och workers startade utan labels.
+        Namnfiltret körs i Docker och listan är sparse, så ingen inspect per container.
+        """
+        legacy = []
+        for prefix in (LEGACY_PREFIX, WORKER_PREFIX):
+            for c in self.docker_client.containers.list(all=True, sparse=True, filters={'name': prefix}):
+                names = [name.lstrip('/') for name in c.attrs.get('Names') or []]
+                if not any(name.startswith(prefix) for name in names):
+                    continue
+                if prefix == WORKER_PREFIX and LABEL_ROLE in (c.attrs.get('Labels') or {}):
+                    continue
+                legacy.append(c)
+        return legacy
+
+    def start_worker(self, worker_id, config):
+        """Starta en multi-kanal monitor worker. Den hämtar själv sina kanaler via /channels?worker_id="""
+        container_name = f'{WORKER_PREFIX}{worker_id}'
+        try:
+            container = self.docker_client.containers.run(
+                WORKER_IMAGE,
+                environment={
+                    'MONITOR_MODE': 'multi',
+                    'WORKER_ID': worker_id,
+                    'MAX_CHANNELS_PER_WORKER': str(self.channels_per_worker),
+                    'DATABASE_SERVICE_URL': self.database_url
+                },
+                labels=worker_labels(worker_id, config),
+                name=container_name,
+                detach=True,
+                network=self.docker_network
+            )
+            self.inventory.add(WorkerContainer(worker_id, container.id, container_name, 'running', config))
+            logger.info(f"✅ Startade worker {worker_id}")
+        except Exception as e:
+            logger.error(f"❌ Kunde inte starta worker {worker_id}: {e}")
+
+    def restart_worker(self, record, config):
+        """Ersätt en stoppad worker eller en vars konfiguration ändrats"""
+        reason = record.status if record.status != 'running' else 'konfigurationen ändrad'
+        if not self.remove_worker(record, f"för omstart ({reason})"):
+            return
+        self.start_worker(record.worker_id, config)
+
+    def remove_worker(self, record, reason):
+        try:
+            self.docker_client.api.remove_container(record.container_id, force=True)
+            self.inventory.discard(record.worker_id, record.container_id)
+            logger.info(f"🗑️ Tog bort worker {record.worker_id} {reason}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Kunde inte ta bort worker {record.worker_id}: {e}")
+            return False
+
+    def remove_legacy(self, container):
+        try:
+            self.docker_client.api.remove_container(container.id, force=True)
+            logger.info(f"🗑️ Tog bort gammal container: {container.id[:12]}")
+            # En worker med samma namn kan startas nu
+            self.wakeup.set()
+        except Exception as e:
+            logger.error(f"❌ Kunde inte ta bort container {container.id[:12]}: {e}")
+
+    def update_containers(self, resync=False):
+        """
+        Fördela kanaler över monitor workers och rätta skillnaderna mot containrarna.
+        Containrarna läses från inventariet, med resync=True laddas det om från Docker först.
+        Åtgärderna körs i bakgrunden i operationspoolen, så anropet väntar inte på Docker.
+        """
         try:
             channels = self.get_channels()
-            current_channel_ids = {channel['id'] for channel in channels}
-            
-            # Hämta ALLA containrar (både körande och stoppade)
-            all_containers = {
-                int(c.name.split('_')[-1]): c 
-                for c in self.docker_client.containers.list(all=True)  # Notera all=True här
-                if c.name.startswith('monitor_service_')
-            }
-
-            # Starta nya containrar för kanaler som saknar en
-            for channel in channels:
-                channel_id = channel['id']
-                container_name = f'monitor_service_{channel_id}'
-                
-                #ERSÄTTER STYCKET NEDANFÖR 
-                if channel_id in all_containers:
-                    container = all_containers[channel_id]
-                    
-                    #Kontrollera om containern körs, då ska vi inte göra något
-                    if container.status == "running":
-                        logger.info(f"✅ Container {container_name} körs redan, ingen åtgärd behövs.")
-                        continue  # Hoppa över denna kanal, containern körs redan
-
-                    # Om containern existerar men är stoppad, ta bort och starta om den
-                    try:
-                        container.remove(force=True)
-                        logger.info(f"🗑️ Tog bort stoppad container: {container_name}")
-                    except Exception as e:
-                        logger.error(f"❌ Kunde inte ta bort container {container_name}: {e}")
-
-
-                """# Om containern finns men inte kör, ta bort den först (ERSATT AV STYCKET OVANFÖR)
-                if channel_id in all_containers:
-                    try:
-                        all_containers[channel_id].remove(force=True)
-                        logger.info(f"🗑️ Tog bort gammal container: {container_name}")
-                    except Exception as e:
-                        logger.error(f"❌ Kunde inte ta bort gammal container {container_name}: {e}")"""
-
-
-
-                #ERSÄTTER STYCKET NEDANFÖR
-                if channel_id not in all_containers:
-                    try:
-                        container = self.docker_client.containers.run(
-                            'monitor_service_image',
-                            environment={
-                                'CHANNEL_ID': str(channel_id),
-                                'CHANNEL_URL': channel['url'],
-                                'DATABASE_SERVICE_URL': self.database_url
-                            },
-                            name=container_name,
-                            detach=True,
-                            network=self.docker_network
-                        )
-                        logger.info(f"✅ Startade ny övervakningscontainer för kanal {channel_id}")
-                    except Exception as e:
-                        logger.error(f"❌ Kunde inte starta övervakning av kanal {channel_id}: {e}")
-                else:
-                    logger.info(f"🔄 Container för kanal {channel_id} körs redan, hoppar över.")
-
-
-
-                """ERSATT AV STYCKET OVANFÖR
-                # Starta ny container
-                try:
-                    container = self.docker_client.containers.run(
-                        'monitor_service_image',
-                        environment={
-                            'CHANNEL_ID': str(channel_id),
-                            'CHANNEL_URL': channel['url'],
-                            'DATABASE_SERVICE_URL': self.database_url
-                        },
-                        name=container_name,
-                        detach=True,
-                        network=self.docker_network
-                    )
-                    logger.info(f"✅ Startade övervakning av kanal {channel_id}")
-                except Exception as e:
-                    logger.error(f"❌ Kunde inte starta övervakning av kanal {channel_id}: {e}")"""
+            worker_ids = self.worker_ids(len(channels))
+            assignment = assign_channels((c['id'] for c in channels), worker_ids, capacity=self.channels_per_worker)
+            self.publish_assignment(assignment)
+
+            if resync:
+                self.inventory.load(self.docker_client)
+                for container in self.list_legacy_containers():
+                    # Gamla workers tas bort under sitt worker-ID så att den nya inte startas innan namnet är ledigt
+                    name = container.attrs['Names'][0].lstrip('/')
+                    key = name[len(WORKER_PREFIX):] if name.startswith(WORKER_PREFIX) else container.id
+                    self.operations.submit(key, self.remove_legacy, container)
+
+            # Kanalbyten når workers via den publicerade tilldelningen, bara ändrade
+            # worker-inställningar (ny config-hash) kräver omstart
+            config = config_hash(self.worker_options())
+            wanted = {w: config for w in assignment if w not in self.operations}
 
-            # Ta bort containrar för borttagna kanaler
-            for container_id in all_containers:
-                if container_id not in current_channel_ids:
-                    try:
-                        all_containers[container_id].remove(force=True)
-                        logger.info(f"✅ Stoppade övervakning av borttagen kanal {container_id}")
-                    except Exception as e:
-                        logger.error(f"❌ Kunde inte stoppa övervakning av kanal {container_id}: {e}")
+            # Workers med en pågående operation lämnas tills den är klar
+            containers = self.inventory.snapshot()
+            current = {w: (r.status, r.config_hash) for w, r in containers.items() if w not in self.operations}
+            actions = plan_actions(wanted, current)
+            for action, worker_id in actions:
+                if action == START:
+                    self.operations.submit(worker_id, self.start_worker, worker_id, wanted[worker_id])
+                elif action == RESTART:
+                    self.operations.submit(worker_id, self.restart_worker, containers[worker_id], wanted[worker_id])
+                elif action == REMOVE:
+                    self.operations.submit(worker_id, self.remove_worker, containers[worker_id], "(överflödig)")
+            if actions:
+                logger.info(f"🔧 {len(actions)} åtgärder schemalagda, {self.operations.pending()} pågår")
 
         except Exception as e:
             logger.error(f"❌ Fel vid uppdatering av containrar: {e}")
 
     def cleanup(self):
-        """Städa upp alla monitor_service containrar vid shutdown"""
+        """Städa upp alla monitor containrar vid shutdown"""
         try:
-            containers = self.docker_client.containers.list(
-                filters={"name": "monitor_service_"}
-            )
-            for container in containers:
+            containers = self.docker_client.containers.list(all=True, sparse=True, filters={'label': WORKER_FILTER})
+            containers += self.list_legacy_containers()
+
+            def stop(container):
                 try:
-                    container.stop(timeout=5)
-                    container.remove()
-                    logger.info(f"✅ Städade upp container: {container.name}")
+                    self.docker_client.api.stop(container.id, timeout=5)
+                    self.docker_client.api.remove_container(container.id)
+                    logger.info(f"✅ Städade upp container: {container.id[:12]}")
                 except Exception as e:
-                    logger.error(f"❌ Kunde inte städa upp container {container.name}: {e}")
+                    logger.error(f"❌ Kunde inte städa upp container {container.id[:12]}: {e}")
+
+            # Stoppa parallellt, väntande start-operationer avbryts
+            self.operations.shutdown(wait=False)
+            with ThreadPoolExecutor(max_workers=self.operations.max_workers) as executor:
+                list(executor.map(stop, containers))
         except Exception as e:
             logger.error(f"❌ Fel vid cleanup: {e}")
 
@@ -157,11 +280,23 @@ class MonitorManager:
         
         logger.info("🚀 Monitor Manager startar...")
         
+        # Händelser från kanallistan och Docker väcker loopen, annars full genomgång var resync_interval
+        for target in (self.watch_channel_changes, self.watch_docker_events):
+            threading.Thread(target=target, name=target.__name__, daemon=True).start()
+
         try:
+            next_resync = 0.0
             while running:
                 try:
-                    self.update_containers()
-                    time.sleep(10)
+                    woken = self.wakeup.wait(timeout=1.0)
+                    resync = time.monotonic() >= next_resync
+                    if not woken and not resync:
+                        continue
+                    time.sleep(RECONCILE_DEBOUNCE)
+                    self.wakeup.clear()
+                    self.update_containers(resync=resync)
+                    if resync:
+                        next_resync = time.monotonic() + self.resync_interval
                 except Exception as e:
                     logger.error(f"❌ Fel i Monitor Manager: {e}")
                     time.sleep(1)
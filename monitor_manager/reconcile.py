@@ -0,0 +1,73 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+START = 'start'
+RESTART = 'restart'
+REMOVE = 'remove'
+
+
+def plan_actions(wanted: Dict[str, str], containers: Dict[str, Tuple[str, Optional[str]]]) -> List[Tuple[str, str]]:
+    """
+    Jämför önskade workers med befintliga containrar och returnerar
+    de åtgärder som behövs som (åtgärd, worker_id).
+
+    wanted är {worker_id: config-hash} och containers {worker_id: (status, config-hash)}.
+    Workers som kör med rätt konfiguration lämnas orörda.
+    """
+    actions = []
+    for worker_id, config in wanted.items():
+        current = containers.get(worker_id)
+        if current is None:
+            actions.append((START, worker_id))
+        elif current[0] != 'running' or current[1] != config:
+            actions.append((RESTART, worker_id))
+    for worker_id in containers:
+        if worker_id not in wanted:
+            actions.append((REMOVE, worker_id))
+    return actions
+
+
+class OperationPool:
+    """
+    Kör Docker-operationer parallellt i en begränsad trådpool.
+
+    Högst en operation per nyckel (t.ex. worker-ID) är igång åt gången, så en
+    långsam containers.run blockerar varken loopen eller andra workers och
+    startas inte om en gång till medan den pågår.
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='docker-op')
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._in_flight
+
+    def submit(self, key, fn, *args):
+        """Schemalägg fn(*args) för key. Returnerar None om en operation för key redan pågår."""
+        with self._lock:
+            if key in self._in_flight:
+                return None
+            future = self._in_flight[key] = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def _done(self, key, future):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"❌ Docker-operation för {key} misslyckades: {future.exception()}")
+
+    def pending(self):
+        with self._lock:
+            return len(self._in_flight)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
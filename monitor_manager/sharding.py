@@ -0,0 +1,43 @@
+import hashlib
+import math
+from typing import Dict, Iterable, List, Optional
+
+
+def rendezvous_score(worker_id: str, channel_id: int) -> int:
+    """Vikt för paret (worker, kanal). Högst vikt vinner kanalen."""
+    digest = hashlib.sha1(f"{worker_id}:{channel_id}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def worker_pool(channel_count: int, channels_per_worker: int, fixed_workers: Optional[int] = None) -> List[str]:
+    """
+    Returnerar worker-ID:n för poolen.
+    Med fixed_workers används ett fast antal, annars skalas poolen efter antalet kanaler.
+    """
+    if fixed_workers:
+        count = fixed_workers
+    else:
+        count = max(1, math.ceil(channel_count / channels_per_worker))
+    return [str(i) for i in range(count)]
+
+
+def assign_channels(channel_ids: Iterable[int], worker_ids: List[str], capacity: Optional[int] = None) -> Dict[str, List[int]]:
+    """
+    Fördelar kanaler över workers med rendezvous hashing.
+
+    När en kanal eller worker läggs till/tas bort flyttas bara de kanaler som
+    berörs. Om capacity anges får kanalen nästa bästa worker när den bästa är full.
+    """
+    assignment: Dict[str, List[int]] = {worker_id: [] for worker_id in worker_ids}
+    if not worker_ids:
+        return assignment
+
+    for channel_id in sorted(channel_ids):
+        ranked = sorted(worker_ids, key=lambda w: rendezvous_score(w, channel_id), reverse=True)
+        target = ranked[0]
+        if capacity is not None:
+            # Fallback till den minst belastade om alla är fulla
+            target = next((w for w in ranked if len(assignment[w]) < capacity),
+                          min(ranked, key=lambda w: len(assignment[w])))
+        assignment[target].append(channel_id)
+    return assignment
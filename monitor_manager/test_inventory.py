@@ -0,0 +1,47 @@
+import os
+import sys
+import types
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_manager.inventory import Inventory, config_hash, worker_labels
+
+
+def _event(action, container_id, worker_id, config='abc'):
+    attributes = dict(worker_labels(worker_id, config), name=f'monitor_worker_{worker_id}')
+    return {'Type': 'container', 'Action': action, 'Actor': {'ID': container_id, 'Attributes': attributes}}
+
+# ✅ Inventariet laddas från label-filtrerad sparse lista och följer sedan Docker-händelser
+def test_inventory_tracks_docker_events():
+    listed = [types.SimpleNamespace(id='c1', attrs={
+        'Names': ['/monitor_worker_0'], 'State': 'running', 'Labels': worker_labels('0', 'abc'),
+    })]
+    calls = []
+
+    def list_containers(**kwargs):
+        calls.append(kwargs)
+        return listed
+
+    inventory = Inventory()
+    inventory.load(types.SimpleNamespace(containers=types.SimpleNamespace(list=list_containers)))
+    assert calls[0]['filters'] == {'label': 'ott-monitor.role=worker'} and calls[0]['sparse']
+    assert inventory.snapshot()['0'].status == 'running'
+
+    assert inventory.apply_event(_event('die', 'c1', '0')) == '0'
+    assert inventory.snapshot()['0'].status == 'exited'
+
+    # En ny container för samma worker ska inte tas bort av destroy för den gamla
+    inventory.apply_event(_event('create', 'c2', '0', config='def'))
+    inventory.apply_event(_event('destroy', 'c1', '0'))
+    assert inventory.snapshot()['0'].container_id == 'c2'
+    assert inventory.snapshot()['0'].config_hash == 'def'
+
+    # Containrar utan worker-label ignoreras
+    assert inventory.apply_event({'Action': 'die', 'Actor': {'ID': 'x', 'Attributes': {'name': 'postgres'}}}) is None
+
+# ✅ Config-hashen beror bara på worker-inställningarna, inte på nyckelordningen
+def test_config_hash_follows_worker_options():
+    options = {'image': 'monitor_service_image', 'channels_per_worker': 500}
+    assert config_hash(options) == config_hash(dict(reversed(list(options.items()))))
+    assert config_hash(options) != config_hash(dict(options, channels_per_worker=250))
@@ -0,0 +1,37 @@
+import os
+import sys
+import threading
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_manager.reconcile import REMOVE, RESTART, START, OperationPool, plan_actions
+
+
+# ✅ Bara workers som skiljer sig från önskat läge får en åtgärd
+def test_plan_actions_is_diff_based():
+    wanted = {'0': 'aaa', '1': 'bbb', '2': 'ccc', '3': 'ddd'}
+    containers = {
+        '0': ('running', 'aaa'),
+        '1': ('exited', 'bbb'),
+        '2': ('running', 'gammal'),
+        '9': ('running', 'eee'),
+    }
+    actions = plan_actions(wanted, containers)
+    assert sorted(actions) == sorted([(RESTART, '1'), (RESTART, '2'), (START, '3'), (REMOVE, '9')])
+
+# ✅ En pågående operation för samma worker startas inte en gång till
+def test_operation_pool_runs_one_operation_per_key():
+    pool = OperationPool(max_workers=4)
+    release = threading.Event()
+    first = pool.submit('0', release.wait, 5)
+
+    assert pool.submit('0', release.wait, 5) is None
+    assert '0' in pool
+    other = pool.submit('1', lambda: 'klar')
+    assert other.result(timeout=1) == 'klar'
+
+    release.set()
+    first.result(timeout=1)
+    pool.shutdown()
+    assert pool.pending() == 0
@@ -0,0 +1,39 @@
+import os
+import sys
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_manager.sharding import assign_channels, worker_pool
+
+
+def _owner(assignment):
+    return {channel_id: worker for worker, ids in assignment.items() for channel_id in ids}
+
+# ✅ Alla kanaler tilldelas exakt en worker
+def test_every_channel_assigned_once():
+    assignment = assign_channels(range(1, 1001), worker_pool(1000, 250))
+    owners = _owner(assignment)
+    assert len(owners) == 1000
+    assert sum(len(ids) for ids in assignment.values()) == 1000
+
+# ✅ En ny worker tar bara över en liten andel av kanalerna
+def test_adding_worker_moves_few_channels():
+    channels = range(1, 2001)
+    before = _owner(assign_channels(channels, worker_pool(0, 1, fixed_workers=4)))
+    after = _owner(assign_channels(channels, worker_pool(0, 1, fixed_workers=5)))
+    moved = [c for c in channels if before[c] != after[c]]
+    assert all(after[c] == '4' for c in moved)
+    assert len(moved) < 2000 * 0.3
+
+# ✅ En ny kanal flyttar inga befintliga kanaler
+def test_adding_channel_is_stable():
+    workers = worker_pool(0, 1, fixed_workers=3)
+    before = _owner(assign_channels(range(1, 301), workers))
+    after = _owner(assign_channels(range(1, 302), workers))
+    assert all(before[c] == after[c] for c in before)
+
+# ✅ Kapacitet per worker respekteras
+def test_capacity_is_respected():
+    assignment = assign_channels(range(1, 101), worker_pool(100, 25), capacity=25)
+    assert all(len(ids) <= 25 for ids in assignment.values())
@@ -0,0 +1,307 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+
+from .resilience import failure_class, origin_of
+from .status import RED
+
+logger = logging.getLogger(__name__)
+
+FIRING = 'firing'
+RESOLVED = 'resolved'
+FLAPPING = 'flapping'
+STABLE = 'stable'
+
+DEFAULT_ALERT_THRESHOLD = 5
+DEFAULT_RECOVERY_CHECKS = 2
+DEFAULT_BATCH_INTERVAL = 10.0
+# Så många kanaler på samma origin som larmar samtidigt ger ett origin-larm istället
+DEFAULT_GROUP_MIN = 3
+# Flappning: varje larm/återställning ger en poäng som halveras på FLAP_HALF_LIFE sekunder
+DEFAULT_FLAP_THRESHOLD = 4.0
+DEFAULT_FLAP_HALF_LIFE = 600.0
+DEFAULT_MAX_PENDING = 10000
+MAX_LISTED_CHANNELS = 50
+
+
+class _ChannelState:
+    """Larmstatus för en kanal, samma storlek oavsett hur många resultat som kommit"""
+    __slots__ = ('origin', 'failures', 'successes', 'firing', 'since', 'flap_score', 'flap_at', 'flapping')
+
+    def __init__(self, origin):
+        self.origin = origin
+        self.failures = 0
+        self.successes = 0
+        self.firing = False
+        self.since = None
+        self.flap_score = 0.0
+        self.flap_at = 0.0
+        self.flapping = False
+
+
+class _OriginState:
+    __slots__ = ('firing', 'alerted', 'since')
+
+    def __init__(self):
+        self.firing = set()
+        self.alerted = False
+        self.since = None
+
+
+class AlertEvaluator:
+    """
+    Larmregler för kontrollresultaten i workern, utan databasanrop per resultat.
+    En kanal larmar efter threshold röda kontroller i rad och återställs efter
+    recovery_checks godkända i rad. Kanaler som växlar ofta markeras som flappande
+    och larmar inte förrän de lugnat sig. Larm samlas i batchar, och när minst
+    group_min kanaler på samma origin larmar blir det ett larm för hela origin.
+    """
+
+    def __init__(self, threshold=DEFAULT_ALERT_THRESHOLD, recovery_checks=DEFAULT_RECOVERY_CHECKS,
+                 group_min=DEFAULT_GROUP_MIN, flap_threshold=DEFAULT_FLAP_THRESHOLD,
+                 flap_half_life=DEFAULT_FLAP_HALF_LIFE, max_pending=DEFAULT_MAX_PENDING, worker_id=None,
+                 clock=time.time):
+        self.threshold = threshold
+        self.recovery_checks = recovery_checks
+        self.group_min = group_min
+        self.flap_threshold = flap_threshold
+        self.flap_half_life = flap_half_life
+        self.worker_id = worker_id
+        self.clock = clock
+        self.channels = {}
+        self.origins = {}
+        self.pending = deque(maxlen=max_pending)
+        self.dropped = 0
+
+    @classmethod
+    def from_env(cls, worker_id=None):
+        return cls(
+            recovery_checks=int(os.getenv('ALERT_RECOVERY_CHECKS', DEFAULT_RECOVERY_CHECKS)),
+            group_min=int(os.getenv('ALERT_GROUP_MIN', DEFAULT_GROUP_MIN)),
+            flap_threshold=float(os.getenv('ALERT_FLAP_THRESHOLD', DEFAULT_FLAP_THRESHOLD)),
+            flap_half_life=float(os.getenv('ALERT_FLAP_HALF_LIFE', DEFAULT_FLAP_HALF_LIFE)),
+            worker_id=worker_id,
+        )
+
+    def observe(self, result):
+        """Ett slutligt kontrollresultat (ChannelStatus) för en kanal"""
+        state = self.channels.get(result.channel_id)
+        origin = origin_of(result.url)
+        if state is None:
+            state = self.channels[result.channel_id] = _ChannelState(origin)
+        elif state.origin != origin:
+            # URL:en har bytts till en annan origin
+            self._leave_origin(result.channel_id, state)
+            state.origin = origin
+            if state.firing:
+                self._origin(origin).firing.add(result.channel_id)
+
+        if result.status == RED:
+            state.failures += 1
+            state.successes = 0
+        else:
+            state.successes += 1
+            state.failures = 0
+
+        now = self.clock()
+        if not state.firing and state.failures >= self.threshold:
+            state.firing, state.since = True, now
+            self._origin(state.origin).firing.add(result.channel_id)
+            self._transition(result, state, FIRING, now)
+        elif state.firing and state.successes >= self.recovery_checks:
+            state.firing, state.since = False, now
+            self._origin(state.origin).firing.discard(result.channel_id)
+            self._transition(result, state, RESOLVED, now)
+        elif state.flapping and self._flap_score(state, now) < self.flap_threshold / 2:
+            state.flapping = False
+            self._emit(self._channel_alert(result, state, STABLE, now))
+
+    def forget(self, channel_id):
+        """Kanalen övervakas inte längre av workern"""
+        state = self.channels.pop(channel_id, None)
+        if state is not None:
+            self._leave_origin(channel_id, state)
+
+    def _leave_origin(self, channel_id, state):
+        origin = self.origins.get(state.origin)
+        if origin is not None:
+            origin.firing.discard(channel_id)
+
+    def _origin(self, origin):
+        state = self.origins.get(origin)
+        if state is None:
+            state = self.origins[origin] = _OriginState()
+        return state
+
+    def _flap_score(self, state, now):
+        return state.flap_score * 0.5 ** ((now - state.flap_at) / self.flap_half_life)
+
+    def _transition(self, result, state, kind, now):
+        state.flap_score = self._flap_score(state, now) + 1
+        state.flap_at = now
+        if state.flapping:
+            return
+        if state.flap_score >= self.flap_threshold:
+            state.flapping = True
+            kind = FLAPPING
+        self._emit(self._channel_alert(result, state, kind, now))
+
+    def _channel_alert(self, result, state, kind, now):
+        return {
+            'key': f"channel:{result.channel_id}",
+            'scope': 'channel',
+            'state': kind,
+            'firing': state.firing,
+            'channel_id': result.channel_id,
+            'origin': state.origin,
+            'url': result.url,
+            'message': result.message,
+            'error': failure_class(result),
+            'since': state.since,
+            'at': now,
+            'worker_id': self.worker_id,
+        }
+
+    def _emit(self, alert):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(alert)
+
+    def _origin_alert(self, origin, state, kind, now):
+        channels = sorted(state.firing)
+        return {
+            'key': f"origin:{origin}",
+            'scope': 'origin',
+            'state': kind,
+            'firing': kind == FIRING,
+            'origin': origin,
+            'channel_count': len(channels),
+            'channels': channels[:MAX_LISTED_CHANNELS],
+            'since': state.since,
+            'at': now,
+            'worker_id': self.worker_id,
+        }
+
+    def take(self):
+        """
+        Larmen sedan förra anropet, med kanallarm på samma origin ihopslagna till ett
+        origin-larm. Medan origin-larmet är aktivt skickas inga larm för kanalerna bakom.
+        """
+        pending = list(self.pending)
+        self.pending.clear()
+        now = self.clock()
+        # Aktiva origin-larm gås alltid igenom, kanalerna bakom kan ha tagits bort utan nya larm
+        touched = {alert['origin'] for alert in pending}
+        touched.update(origin for origin, state in self.origins.items() if state.alerted)
+        grouped = set()
+        alerts = []
+        for origin in sorted(touched):
+            state = self.origins.get(origin)
+            if state is None:
+                continue
+            if not state.alerted and len(state.firing) >= self.group_min:
+                state.alerted, state.since = True, now
+                alerts.append(self._origin_alert(origin, state, FIRING, now))
+            elif state.alerted and not state.firing:
+                state.alerted, state.since = False, now
+                alerts.append(self._origin_alert(origin, state, RESOLVED, now))
+            elif not state.alerted:
+                if not state.firing:
+                    del self.origins[origin]
+                continue
+            grouped.add(origin)
+        alerts.extend(alert for alert in pending if alert['origin'] not in grouped)
+        return alerts
+
+    def firing(self):
+        return sum(1 for state in self.channels.values() if state.firing)
+
+    async def run(self, sinks, stop_event, interval=DEFAULT_BATCH_INTERVAL):
+        """Skicka larmen i batchar till alla sinks var interval:e sekund tills stop_event sätts, och en sista gång"""
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush(sinks)
+        await self.flush(sinks)
+
+    async def flush(self, sinks):
+        alerts = self.take()
+        if alerts:
+            await asyncio.gather(*(sink.send(alerts) for sink in sinks))
+
+
+class StdoutSink:
+    """En JSON-rad per larm på stdout, för lokal testning"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    async def send(self, alerts):
+        self.stream.write(''.join(json.dumps(alert) + '\n' for alert in alerts))
+        self.stream.flush()
+
+
+class FileSink:
+    """Lägger till en JSON-rad per larm i en fil"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _write(self, lines):
+        with open(self.path, 'a') as f:
+            f.write(lines)
+
+    async def send(self, alerts):
+        try:
+            await asyncio.to_thread(self._write, ''.join(json.dumps(alert) + '\n' for alert in alerts))
+        except OSError as e:
+            logger.error(f"❌ Kunde inte skriva {len(alerts)} larm till {self.path}: {e}")
+
+
+class WebhookSink:
+    """POST {"alerts": [...]} till en URL. Batchar som inte gick fram skickas med nästa gång."""
+
+    def __init__(self, url, client, max_pending=DEFAULT_MAX_PENDING):
+        self.url = url
+        self.client = client
+        self.max_pending = max_pending
+        self.unsent = []
+
+    async def send(self, alerts):
+        batch = (self.unsent + alerts)[-self.max_pending:]
+        try:
+            response = await self.client.post(self.url, json={'alerts': batch})
+            response.raise_for_status()
+        except Exception as e:
+            self.unsent = batch
+            logger.error(f"❌ Kunde inte skicka {len(batch)} larm till {self.url}: {e}")
+            return
+        self.unsent = []
+
+
+# ALERT_SINKS-namn -> fabrik(argument, http-klient). Nya sinks registreras här.
+SINKS = {
+    'stdout': lambda arg, client: StdoutSink(),
+    'file': lambda arg, client: FileSink(arg),
+    'webhook': lambda arg, client: WebhookSink(arg, client),
+}
+
+
+def sinks_from_env(value, client):
+    """Tolka ALERT_SINKS, t.ex. "stdout,file:/var/log/alerts.jsonl,webhook:https://hooks.example/x" """
+    sinks = []
+    for spec in (part.strip() for part in value.split(',')):
+        if not spec:
+            continue
+        name, _, arg = spec.partition(':')
+        factory = SINKS.get(name)
+        if factory is None:
+            raise ValueError(f"Unknown alert sink: {name}")
+        sinks.append(factory(arg, client))
+    return sinks
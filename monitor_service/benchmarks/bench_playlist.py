@@ -0,0 +1,79 @@
+"""
+Jämför den strömmande PlaylistParser mot m3u8.loads på långa DVR-playlists.
+
+Kör: python -m monitor_service.benchmarks.bench_playlist [--segments 7200] [--repeat 5]
+Resultatet skrivs som JSON till stdout.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import m3u8
+
+from monitor_service.playlist import PlaylistParser
+
+CHUNK_SIZE = 64 * 1024
+
+
+def build_playlist(segments, target_duration=2):
+    """Syntetisk live-playlist med ett DVR-fönster på segments segment"""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{target_duration}", "#EXT-X-MEDIA-SEQUENCE:100000"]
+    for i in range(segments):
+        lines.append(f"#EXT-X-PROGRAM-DATE-TIME:2025-01-01T00:{(i // 30) % 60:02d}:{(i * 2) % 60:02d}.000Z")
+        lines.append(f"#EXTINF:{target_duration}.000,")
+        lines.append(f"video/1080p/segment_{100000 + i}.ts")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def parse_m3u8(body):
+    playlist = m3u8.loads(body.decode())
+    return len(playlist.segments)
+
+
+def parse_streaming(body):
+    parser = PlaylistParser()
+    for start in range(0, len(body), CHUNK_SIZE):
+        parser.feed(body[start:start + CHUNK_SIZE])
+    return parser.close().segment_count
+
+
+def measure(func, body, repeat):
+    """Bästa tiden av repeat körningar samt högsta minnesallokering"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(body)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': round(best, 6), 'peak_bytes': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--segments', type=int, nargs='+', default=[300, 1800, 7200])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for segments in args.segments:
+        body = build_playlist(segments)
+        assert parse_m3u8(body) == parse_streaming(body) == segments
+        m3u8_result = measure(parse_m3u8, body, args.repeat)
+        streaming_result = measure(parse_streaming, body, args.repeat)
+        results.append({
+            'segments': segments,
+            'body_bytes': len(body),
+            'm3u8_loads': m3u8_result,
+            'streaming_parser': streaming_result,
+            'speedup': round(m3u8_result['seconds'] / streaming_result['seconds'], 2),
+        })
+    print(json.dumps({'benchmark': 'playlist_parse', 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
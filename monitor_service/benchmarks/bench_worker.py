@@ -0,0 +1,261 @@
+"""
+Kör en MonitorWorker mot en lokal syntetisk HLS-origin (origin.py) vid olika antal kanaler
+och mäter kontroller per sekund, CPU-tid per kontroll, RSS per kanal, schemaläggarens
+fördröjning och hur lång tid det tar innan injicerade stopp upptäcks.
+
+Origin körs i en egen process så att workerns CPU-tid inte blandas ihop med serverns, och
+varje kanalantal körs i en ny process så att RSS mäts från en ren start.
+
+Kör: python -m monitor_service.benchmarks.bench_worker [--channels 10 100 1000 5000] [--duration 30]
+     [--ladder 3] [--latency 0.02] [--error-rate 0.01] [--baseline tidigare.json]
+Resultatet skrivs som JSON till stdout. Med --baseline jämförs varje körning mot en tidigare
+och processen avslutas med 1 om checks/s sjunkit eller CPU per kontroll ökat mer än --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from monitor_service.benchmarks.origin import add_arguments, from_arguments
+from monitor_service.monitor import CheckOptions, MonitorWorker
+from monitor_service.resilience import FailurePolicy
+from monitor_service.stall import STALLED
+
+# Första delen av körningen räknas inte, kanalernas första kontroller sprids ut över ett intervall
+DEFAULT_WARMUP = 10.0
+
+
+def percentiles(values, scale=1.0, digits=1):
+    values = sorted(values)
+    if not values:
+        return None
+
+    def at(p):
+        return round(values[min(len(values) - 1, int(p * len(values)))] * scale, digits)
+
+    return {'p50': at(0.50), 'p95': at(0.95), 'p99': at(0.99), 'max': round(values[-1] * scale, digits)}
+
+
+def rss_bytes():
+    """Processens RSS från /proc (Linux), None annars"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class BenchRecorder:
+    """
+    Tar emot samma anrop från workern som MonitorMetrics och räknar det benchmarken
+    behöver: kontroller, statusar, fördröjningar och när stoppade kanaler upptäcks.
+    """
+
+    def __init__(self, stalled, stall_at):
+        self.stalled = stalled
+        self.stall_at = stall_at
+        self.measuring = False
+        self.checks = 0
+        self.retries = 0
+        self.statuses = {}
+        self.lateness = []
+        self.detected = {}
+        self.false_stalls = set()
+
+    def track_worker(self, worker):
+        pass
+
+    def observe_lag(self, lateness):
+        if self.measuring:
+            self.lateness.append(lateness)
+
+    def observe_retry(self):
+        if self.measuring:
+            self.retries += 1
+
+    def observe(self, result):
+        now = time.time()
+        if self.measuring:
+            self.checks += 1
+            self.statuses[result.status] = self.statuses.get(result.status, 0) + 1
+        if not any(r.stall_verdict == STALLED for r in result.renditions):
+            return
+        if result.channel_id in self.stalled and now >= self.stall_at:
+            self.detected.setdefault(result.channel_id, now - self.stall_at)
+        elif result.channel_id not in self.stalled:
+            self.false_stalls.add(result.channel_id)
+
+    def forget(self, channel_id):
+        pass
+
+
+async def run_scale(args, channels):
+    """En körning med channels kanaler, returnerar resultatet som dict"""
+    port = args.port
+    stall_at = time.time() + args.warmup + args.duration / 3 if args.stall_every else None
+    origin = subprocess.Popen(
+        [sys.executable, '-m', 'monitor_service.benchmarks.origin', '--channels', str(channels), '--port', str(port)]
+        + (['--stall-at', str(stall_at)] if stall_at else []) + origin_arguments(args),
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        if origin.stdout.readline().strip() != f"ready {port}":
+            raise RuntimeError("Synthetic origin did not start")
+        model = from_arguments(args, channels, port)
+        stalled = {i for i in range(channels) if model.stalled(i)}
+        recorder = BenchRecorder(stalled, stall_at or float('inf'))
+        worker = MonitorWorker(
+            f"http://127.0.0.1:{port}",
+            max_channels=channels,
+            max_concurrent_checks=args.max_concurrent_checks,
+            check_options=CheckOptions(probe_range_bytes=args.probe_range_bytes or None),
+            report_options={'batch_size': 500, 'flush_interval': 5.0} if args.report else None,
+            config_poll_interval=0,
+            metrics=recorder,
+            failure_policy=FailurePolicy(),
+        )
+        stop_event = asyncio.Event()
+        worker_task = asyncio.create_task(worker.run(stop_event))
+
+        rss_before = rss_bytes()
+        await asyncio.sleep(args.warmup)
+        recorder.measuring = True
+        cpu_start, started = time.process_time(), time.monotonic()
+        await asyncio.sleep(args.duration)
+        recorder.measuring = False
+        cpu = time.process_time() - cpu_start
+        elapsed = time.monotonic() - started
+        rss_after = rss_bytes()
+
+        stop_event.set()
+        await worker_task
+        async with httpx.AsyncClient() as client:
+            origin_stats = (await client.get(f"http://127.0.0.1:{port}/_bench/stats")).json()
+    finally:
+        origin.terminate()
+        origin.wait(timeout=10)
+
+    checks = recorder.checks
+    detection = list(recorder.detected.values())
+    return {
+        'channels': channels,
+        'checks': checks,
+        'checks_per_second': round(checks / elapsed, 1),
+        # Playlists som går framåt pollas en gång per target duration
+        'expected_checks_per_second': round(channels / args.target_duration, 1),
+        'retries': recorder.retries,
+        'statuses': dict(sorted(recorder.statuses.items())),
+        'cpu_seconds': round(cpu, 2),
+        'cpu_utilization': round(cpu / elapsed, 3),
+        'cpu_ms_per_check': round(cpu / checks * 1000, 3) if checks else None,
+        'rss_mb': round(rss_after / 2 ** 20, 1) if rss_after else None,
+        'rss_kb_per_channel': round((rss_after - rss_before) / channels / 1024, 1) if rss_after and rss_before else None,
+        'lateness_ms': percentiles(recorder.lateness, 1000),
+        'stalls': {
+            'injected': len(recorder.stalled),
+            'detected': len(detection),
+            'false_positives': len(recorder.false_stalls),
+            # Tidigast möjliga är STALL_FACTOR target durations efter stoppet
+            'detection_latency_s': percentiles(detection, digits=2),
+        },
+        'origin': origin_stats,
+    }
+
+
+def origin_arguments(args):
+    return ['--ladder', str(args.ladder), '--playlist-length', str(args.playlist_length),
+            '--target-duration', str(args.target_duration), '--segment-kb', str(args.segment_kb),
+            '--latency', str(args.latency), '--jitter', str(args.jitter), '--error-rate', str(args.error_rate),
+            '--stall-every', str(args.stall_every), '--origins', str(args.origins)]
+
+
+def without_option(argv, option):
+    """argv utan option och dess värden"""
+    kept, skipping = [], False
+    for arg in argv:
+        if arg.startswith(option + '='):
+            continue
+        if arg == option:
+            skipping = True
+        elif skipping and not arg.startswith('--'):
+            continue
+        else:
+            skipping = False
+            kept.append(arg)
+    return kept
+
+
+def regressions(runs, baseline, tolerance):
+    """Körningar som är sämre än baseline med mer än tolerance (andel)"""
+    previous = {run['channels']: run for run in baseline.get('runs', [])}
+    found = []
+    for run in runs:
+        before = previous.get(run['channels'])
+        if before is None:
+            continue
+        if before['checks_per_second'] and run['checks_per_second'] < before['checks_per_second'] * (1 - tolerance):
+            found.append(f"{run['channels']} kanaler: checks/s {before['checks_per_second']} -> {run['checks_per_second']}")
+        if before.get('cpu_ms_per_check') and run['cpu_ms_per_check'] \
+                and run['cpu_ms_per_check'] > before['cpu_ms_per_check'] * (1 + tolerance):
+            found.append(f"{run['channels']} kanaler: CPU/kontroll {before['cpu_ms_per_check']} ms -> "
+                         f"{run['cpu_ms_per_check']} ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--channels', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--duration', type=float, default=30, help="mätperiod i sekunder efter uppvärmningen")
+    parser.add_argument('--warmup', type=float, default=DEFAULT_WARMUP)
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--max-concurrent-checks', type=int, default=100)
+    parser.add_argument('--probe-range-bytes', type=int, default=0)
+    parser.add_argument('--no-report', dest='report', action='store_false', help="posta inte resultat till /results")
+    parser.add_argument('--baseline', help="JSON från en tidigare körning att jämföra med")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    add_arguments(parser)
+    args = parser.parse_args()
+    # Workern loggar varje kontroll, och varningar för varje gul kanal, det blir för mycket vid tusentals kanaler
+    logging.getLogger('monitor_service').setLevel(logging.ERROR)
+
+    if len(args.channels) == 1:
+        runs = [asyncio.run(run_scale(args, args.channels[0]))]
+    else:
+        # Ny process per kanalantal så att RSS inte påverkas av tidigare körningar. Jämförelsen
+        # mot baseline görs bara här, en delprocess med regression skulle annars avsluta med 1.
+        child_argv = sys.argv[1:]
+        for option in ('--channels', '--baseline', '--tolerance'):
+            child_argv = without_option(child_argv, option)
+        runs = []
+        for channels in args.channels:
+            command = [sys.executable, '-m', 'monitor_service.benchmarks.bench_worker', '--channels', str(channels)]
+            command += child_argv
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            runs.extend(json.loads(output)['runs'])
+
+    report = {
+        'benchmark': 'monitor_worker',
+        'duration': args.duration,
+        'warmup': args.warmup,
+        'cpu_count': os.cpu_count(),
+        'origin': {name: getattr(args, name) for name in (
+            'ladder', 'playlist_length', 'target_duration', 'segment_kb', 'latency', 'jitter', 'error_rate',
+            'stall_every', 'origins')},
+        'runs': runs,
+    }
+    failed = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            failed = regressions(runs, json.load(f), args.tolerance)
+        report['regressions'] = failed
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Syntetisk HLS-origin för benchmarks och lokal testning. Serverar live-kanaler där
+media sequence går framåt i realtid, med valfri latens, 5xx-fel och stoppade kanaler.
+Kanalerna sprids över flera loopback-adresser (127.0.0.2, 127.0.0.3, ...) så att de
+ser ut som olika CDN-origins för workerns anslutningspool.
+
+Servern svarar också på det lilla av databastjänstens API som en worker använder
+(/channels, /settings och POST /results), så en MonitorWorker kan köras mot den utan
+Postgres. /_bench/stats visar antal anrop, injicerade fel och mottagna resultatrader.
+
+Kör: python -m monitor_service.benchmarks.origin [--channels 100] [--ladder 3] [--port 8900]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+MAX_HEADER_LINES = 100
+
+
+class SyntheticOrigin:
+    """Innehållet i origin: master playlists, media playlists och segment för channels kanaler"""
+
+    def __init__(self, channels=100, ladder=3, playlist_length=10, target_duration=2, segment_bytes=200_000,
+                 latency=0.0, jitter=0.0, error_rate=0.0, stall_every=0, stall_at=None, origins=1, port=8900,
+                 clock=time.time):
+        self.channels = channels
+        self.ladder = ladder
+        self.playlist_length = playlist_length
+        self.target_duration = target_duration
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stall_every = stall_every
+        self.stall_at = stall_at
+        self.origins = origins
+        self.port = port
+        self.clock = clock
+        # Lägre kvaliteter har hälften så stora segment som nivån över
+        self.segments = [b'\x47' * max(188, segment_bytes >> rung) for rung in range(ladder)]
+        # Kanalerna startar på olika ställen i sekvensen, så att de inte uppdateras i takt
+        self.offsets = [random.Random(i).uniform(0, target_duration) for i in range(channels)]
+        self.requests = 0
+        self.errors = 0
+        self.result_rows = 0
+        self._master_etag = f'"master-{ladder}"'
+
+    def host(self, channel_id):
+        return f"127.0.0.{2 + channel_id % self.origins}"
+
+    def hosts(self):
+        return [f"127.0.0.{2 + i}" for i in range(min(self.origins, self.channels))]
+
+    def channel_url(self, channel_id):
+        return f"http://{self.host(channel_id)}:{self.port}/ch/{channel_id}/master.m3u8"
+
+    def stalled(self, channel_id):
+        return self.stall_every > 0 and channel_id % self.stall_every == 0
+
+    def media_sequence(self, channel_id):
+        now = self.clock()
+        if self.stall_at is not None and now >= self.stall_at and self.stalled(channel_id):
+            now = self.stall_at
+        return int((now + self.offsets[channel_id]) // self.target_duration)
+
+    def master(self):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        for rung in range(self.ladder):
+            bandwidth = 6_000_000 >> rung
+            lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={1920 >> rung}x{1080 >> rung}")
+            lines.append(f"v{rung}/index.m3u8")
+        return ("\n".join(lines) + "\n").encode()
+
+    def media(self, channel_id):
+        last = self.media_sequence(channel_id)
+        first = max(0, last - self.playlist_length + 1)
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{self.target_duration}",
+                 f"#EXT-X-MEDIA-SEQUENCE:{first}"]
+        for sequence in range(first, last + 1):
+            lines.append(f"#EXTINF:{self.target_duration}.000,")
+            lines.append(f"seg{sequence}.ts")
+        return ("\n".join(lines) + "\n").encode(), f'"{channel_id}-{last}"'
+
+    def stats(self):
+        return {'requests': self.requests, 'errors_injected': self.errors, 'result_rows': self.result_rows}
+
+    def respond(self, method, path, headers, body):
+        """Returnerar (status, headers, body) för ett anrop"""
+        self.requests += 1
+        path, _, _ = path.partition('?')
+        if path == '/channels':
+            channels = [{'id': i, 'name': f"Kanal {i}", 'url': self.channel_url(i)} for i in range(self.channels)]
+            return 200, {'Content-Type': 'application/json'}, json.dumps({'channels': channels}).encode()
+        if path == '/settings':
+            settings = {'monitor_interval': self.target_duration, 'alert_threshold': 5, 'stream_timeout': 10}
+            return 200, {'Content-Type': 'application/json'}, json.dumps(settings).encode()
+        if path == '/results' and method == 'POST':
+            self.result_rows += len(json.loads(body).get('results', []))
+            return 201, {'Content-Type': 'application/json'}, b'{}'
+        if path == '/_bench/stats':
+            return 200, {'Content-Type': 'application/json'}, json.dumps(self.stats()).encode()
+
+        parts = path.strip('/').split('/')
+        if len(parts) < 3 or parts[0] != 'ch' or not parts[1].isdigit() or int(parts[1]) >= self.channels:
+            return 404, {}, b''
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            return 503, {}, b''
+        channel_id = int(parts[1])
+        if parts[2] == 'master.m3u8':
+            if headers.get('if-none-match') == self._master_etag:
+                return 304, {'ETag': self._master_etag}, b''
+            return 200, {'Content-Type': 'application/vnd.apple.mpegurl', 'Cache-Control': 'max-age=60',
+                         'ETag': self._master_etag}, self.master()
+        if len(parts) != 4 or not parts[2].startswith('v') or not parts[2][1:].isdigit():
+            return 404, {}, b''
+        rung = int(parts[2][1:])
+        if rung >= self.ladder:
+            return 404, {}, b''
+        if parts[3] == 'index.m3u8':
+            playlist, etag = self.media(channel_id)
+            if headers.get('if-none-match') == etag:
+                return 304, {'ETag': etag}, b''
+            return 200, {'Content-Type': 'application/vnd.apple.mpegurl', 'Cache-Control': 'no-cache',
+                         'ETag': etag}, playlist
+        if parts[3].startswith('seg') and parts[3].endswith('.ts'):
+            return self.segment(rung, headers.get('range'))
+        return 404, {}, b''
+
+    def segment(self, rung, range_header):
+        data = self.segments[rung]
+        if range_header and range_header.startswith('bytes='):
+            start, _, end = range_header[6:].partition('-')
+            try:
+                start, end = int(start or 0), min(int(end) if end else len(data) - 1, len(data) - 1)
+            except ValueError:
+                return 416, {}, b''
+            return 206, {'Content-Type': 'video/mp2t', 'Content-Range': f"bytes {start}-{end}/{len(data)}"}, \
+                data[start:end + 1]
+        return 200, {'Content-Type': 'video/mp2t'}, data
+
+    async def delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+    async def handle(self, reader, writer):
+        """En HTTP/1.1-anslutning med keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                for _ in range(MAX_HEADER_LINES):
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                body = await reader.readexactly(length) if length else b''
+
+                status, response_headers, payload = self.respond(method, path, headers, body)
+                await self.delay()
+                head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'OK')}", f"Content-Length: {len(payload)}"]
+                head += [f"{name}: {value}" for name, value in response_headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1'))
+                if method != 'HEAD':
+                    writer.write(payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, stop_event=None):
+        server = await asyncio.start_server(self.handle, host=self.hosts() + ['127.0.0.1'], port=self.port,
+                                            backlog=4096)
+        async with server:
+            print(f"ready {self.port}", flush=True)
+            if stop_event is None:
+                await server.serve_forever()
+            else:
+                await stop_event.wait()
+
+
+STATUS_TEXT = {200: 'OK', 201: 'Created', 206: 'Partial Content', 304: 'Not Modified', 404: 'Not Found',
+               416: 'Range Not Satisfiable', 503: 'Service Unavailable'}
+
+
+def add_arguments(parser):
+    """Origin-parametrarna, delas med bench_worker"""
+    parser.add_argument('--ladder', type=int, default=3, help="renditioner per kanal")
+    parser.add_argument('--playlist-length', type=int, default=10, help="segment per media playlist")
+    parser.add_argument('--target-duration', type=int, default=2)
+    parser.add_argument('--segment-kb', type=int, default=200, help="segmentstorlek för högsta kvaliteten")
+    parser.add_argument('--latency', type=float, default=0.0, help="sekunder innan varje svar")
+    parser.add_argument('--jitter', type=float, default=0.0, help="slumpmässig extra latens upp till så här mycket")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="andel anrop mot kanalerna som får 503")
+    parser.add_argument('--stall-every', type=int, default=20, help="var N:e kanal stoppar vid --stall-at (0 = ingen)")
+    parser.add_argument('--origins', type=int, default=10, help="antal loopback-adresser kanalerna sprids över")
+
+
+def from_arguments(args, channels, port, stall_at=None):
+    return SyntheticOrigin(
+        channels=channels, ladder=args.ladder, playlist_length=args.playlist_length,
+        target_duration=args.target_duration, segment_bytes=args.segment_kb * 1000, latency=args.latency,
+        jitter=args.jitter, error_rate=args.error_rate, stall_every=args.stall_every, stall_at=stall_at,
+        origins=args.origins, port=port,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--channels', type=int, default=100)
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--stall-at', type=float, default=None, help="epoch-tid då kanalerna i --stall-every stoppar")
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(from_arguments(args, args.channels, args.port, args.stall_at).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
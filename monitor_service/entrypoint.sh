@@ -7,4 +7,4 @@ until curl -s http://database_service:5000/health | grep "ok" > /dev/null; do
 done
 
 echo "Database API is ready, starting monitor service..."
-exec python monitor.py
+exec python -m monitor_service.monitor
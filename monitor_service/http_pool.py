@@ -0,0 +1,120 @@
+import asyncio
+import contextlib
+import importlib.util
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from .tracing import trace_response
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM_TIMEOUT = 30
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_MAX_CONNECTIONS = 200
+DEFAULT_MAX_CONNECTIONS_PER_ORIGIN = 20
+DEFAULT_KEEPALIVE_EXPIRY = 60
+
+_session = None
+
+
+def origin_of(url):
+    """Origin (schema + host + port) för en URL, används som nyckel per CDN"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def http2_available():
+    """HTTP/2 kräver paketet h2 (httpx[http2])"""
+    return importlib.util.find_spec('h2') is not None
+
+
+def build_timeout(stream_timeout=DEFAULT_STREAM_TIMEOUT, connect_timeout=DEFAULT_CONNECT_TIMEOUT):
+    """httpx-timeout med separat connect-timeout, övriga faser styrs av stream_timeout"""
+    return httpx.Timeout(stream_timeout, connect=min(connect_timeout, stream_timeout))
+
+
+class HttpPool:
+    """
+    Delad asynkron anslutningspool för alla kanaler i en worker.
+
+    Anslutningar återanvänds (keep-alive, valfritt HTTP/2) mellan kontroller och
+    mellan kanaler på samma CDN. Antalet samtidiga anrop per origin begränsas
+    så att en enskild CDN inte kan ta alla anslutningar i poolen.
+    """
+
+    def __init__(self, stream_timeout=DEFAULT_STREAM_TIMEOUT, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, max_connections_per_origin=DEFAULT_MAX_CONNECTIONS_PER_ORIGIN,
+                 keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY, http2=False):
+        if http2 and not http2_available():
+            logger.warning("⚠️ HTTP/2 begärt men paketet h2 saknas, använder HTTP/1.1")
+            http2 = False
+        self.max_connections_per_origin = max_connections_per_origin
+        self.connect_timeout = connect_timeout
+        self.client = httpx.AsyncClient(
+            timeout=build_timeout(stream_timeout, connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            http2=http2,
+            follow_redirects=True,
+        )
+        self._origin_slots = {}
+
+    def set_stream_timeout(self, stream_timeout):
+        """Byt read-timeout för kommande anrop utan att stänga poolen"""
+        self.client.timeout = build_timeout(stream_timeout, self.connect_timeout)
+
+    def origin_slot(self, url):
+        """Semafor som begränsar samtidiga anrop mot urls origin"""
+        origin = origin_of(url)
+        slot = self._origin_slots.get(origin)
+        if slot is None:
+            slot = self._origin_slots[origin] = asyncio.Semaphore(self.max_connections_per_origin)
+        return slot
+
+    async def get(self, url, **kwargs):
+        async with self.origin_slot(url):
+            return await self.client.get(url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        async with self.origin_slot(url):
+            return await self.client.post(url, **kwargs)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        """Strömmande anrop, origin-platsen hålls tills body lästs klart"""
+        async with self.origin_slot(url):
+            async with self.client.stream(method, url, **kwargs) as response:
+                yield response
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+def request_timeout(stream_timeout=DEFAULT_STREAM_TIMEOUT, connect_timeout=DEFAULT_CONNECT_TIMEOUT):
+    """(connect, read) timeout för requests"""
+    return (min(connect_timeout, stream_timeout), stream_timeout)
+
+
+def get_session():
+    """Delad requests.Session med keep-alive för det synkrona single-läget"""
+    global _session
+    if _session is None:
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=DEFAULT_MAX_CONNECTIONS_PER_ORIGIN)
+        _session = requests.Session()
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+        _session.hooks['response'].append(trace_response)
+    return _session
@@ -0,0 +1,154 @@
+import hashlib
+import re
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from .playlist import PlaylistSummary
+
+_MAX_AGE_RE = re.compile(r'max-age\s*=\s*(\d+)')
+
+
+def cache_lifetime(headers):
+    """Antal sekunder ett svar är färskt enligt Cache-Control/Age, 0 om det måste valideras"""
+    cache_control = (headers.get('cache-control') or '').lower()
+    if 'no-cache' in cache_control or 'no-store' in cache_control:
+        return 0
+    match = _MAX_AGE_RE.search(cache_control)
+    if not match:
+        return 0
+    try:
+        age = int(headers.get('age') or 0)
+    except ValueError:
+        age = 0
+    return max(0, int(match.group(1)) - age)
+
+
+def with_query(url, params):
+    """Lägg till query-parametrar i en URL (ersätter befintliga med samma namn)"""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in params]
+    query.extend(params.items())
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def skipped_segments(playlist):
+    """Antal segment som utelämnats i en LL-HLS delta playlist (EXT-X-SKIP)"""
+    return getattr(playlist.skip, 'skipped_segments', None) or 0
+
+
+def segment_count(playlist):
+    """Totalt antal segment i playlisten, inklusive de som utelämnats i en delta playlist"""
+    return skipped_segments(playlist) + len(playlist.segments)
+
+
+class CachedManifest:
+    """Senast kända version av ett manifest"""
+    __slots__ = ('etag', 'last_modified', 'expires_at', 'body_hash', 'parsed',
+                 'can_skip_until', 'can_block_reload', 'next_msn', 'fetched_at')
+
+    def __init__(self):
+        self.etag = None
+        self.last_modified = None
+        self.expires_at = 0.0
+        self.body_hash = None
+        self.parsed = None
+        self.can_skip_until = None
+        self.can_block_reload = False
+        self.next_msn = None
+        self.fetched_at = 0.0
+
+
+class ManifestCache:
+    """
+    Cache av manifest per URL för en kanal.
+
+    Gör villkorliga anrop (If-None-Match/If-Modified-Since), hoppar över anrop
+    medan Cache-Control max-age gäller, parsar inte om oförändrade svar och
+    begär LL-HLS delta playlists (_HLS_skip, valfritt _HLS_msn) när origin
+    annonserar stöd via EXT-X-SERVER-CONTROL.
+    """
+
+    def __init__(self, block_reload=False, clock=time.monotonic):
+        self.block_reload = block_reload
+        self.clock = clock
+        self.entries = {}
+
+    def fresh(self, url):
+        """Returnera cachat manifest om det fortfarande är färskt, annars None"""
+        entry = self.entries.get(url)
+        if entry is not None and entry.parsed is not None and self.clock() < entry.expires_at:
+            return entry.parsed
+        return None
+
+    def prepare(self, url):
+        """Returnera (request_url, headers) för nästa hämtning av url"""
+        entry = self.entries.get(url)
+        if entry is None:
+            return url, {}
+
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+
+        params = {}
+        # Delta playlist är bara tillåten om vår kopia är yngre än halva CAN-SKIP-UNTIL (RFC 8216bis 6.2.5.1)
+        if entry.can_skip_until and self.clock() - entry.fetched_at < entry.can_skip_until / 2:
+            params['_HLS_skip'] = 'YES'
+        if self.block_reload and entry.can_block_reload and entry.next_msn is not None:
+            params['_HLS_msn'] = str(entry.next_msn)
+        return (with_query(url, params) if params else url), headers
+
+    def not_modified(self, url, response):
+        """Hantera 304 Not Modified, returnerar det cachade manifestet"""
+        entry = self.entries[url]
+        self._update_validators(entry, response.headers)
+        return entry.parsed
+
+    def store(self, url, response, parse):
+        """Spara ett 200-svar. Oförändrad body återanvänder tidigare parsning."""
+        body_hash = hashlib.sha1(response.content).digest()
+        entry = self.entries.get(url)
+        if entry is not None and entry.body_hash == body_hash and entry.parsed is not None:
+            self._update_validators(entry, response.headers)
+            return entry.parsed
+        return self.store_parsed(url, response.headers, body_hash, parse(response.text))
+
+    def store_parsed(self, url, headers, body_hash, parsed):
+        """
+        Spara ett redan parsat svar (t.ex. från den strömmande parsern).
+        Om body är oförändrad behålls det tidigare objektet.
+        """
+        entry = self.entries.get(url)
+        if entry is None:
+            entry = self.entries[url] = CachedManifest()
+
+        if entry.body_hash != body_hash or entry.parsed is None:
+            entry.parsed = parsed
+            entry.body_hash = body_hash
+            self._update_server_control(entry, parsed)
+
+        self._update_validators(entry, headers)
+        return entry.parsed
+
+    def _update_validators(self, entry, headers):
+        entry.etag = headers.get('etag') or entry.etag
+        entry.last_modified = headers.get('last-modified') or entry.last_modified
+        entry.fetched_at = self.clock()
+        entry.expires_at = entry.fetched_at + cache_lifetime(headers)
+
+    @staticmethod
+    def _update_server_control(entry, parsed):
+        if isinstance(parsed, PlaylistSummary):
+            entry.can_skip_until = parsed.can_skip_until
+            entry.can_block_reload = parsed.can_block_reload
+            entry.next_msn = parsed.next_msn
+            return
+        server_control = getattr(parsed, 'server_control', None)
+        entry.can_skip_until = getattr(server_control, 'can_skip_until', None)
+        entry.can_block_reload = getattr(server_control, 'can_block_reload', None) == 'YES'
+        if parsed.segments:
+            entry.next_msn = (parsed.media_sequence or 0) + segment_count(parsed)
+        else:
+            entry.next_msn = None
@@ -0,0 +1,165 @@
+import logging
+from urllib.parse import urlsplit
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram, start_http_server
+
+from .status import GREEN, RED, YELLOW
+
+logger = logging.getLogger(__name__)
+
+# Detaljnivå för labels: inga kanal-labels, per kanal eller per kanal och rendition
+DETAIL_NONE = 'none'
+DETAIL_CHANNEL = 'channel'
+DETAIL_RENDITION = 'rendition'
+DEFAULT_DETAIL = DETAIL_CHANNEL
+# Kanaler utöver så här många samlas under channel="other"
+DEFAULT_MAX_LABELED_CHANNELS = 500
+DEFAULT_METRICS_PORT = 9100
+OTHER = 'other'
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+THROUGHPUT_BUCKETS = (1e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 1e9)
+
+_STATUS_VALUE = {GREEN: 0, YELLOW: 1, RED: 2}
+
+
+def rendition_label(rendition):
+    """Kort namn på en rendition: NAME om den finns, annars playlistens filnamn"""
+    if rendition.name:
+        return rendition.name
+    return urlsplit(rendition.uri).path.rsplit('/', 1)[-1] or rendition.uri
+
+
+class MonitorMetrics:
+    """
+    Prometheus-mått för en monitor worker.
+
+    Kardinaliteten styrs av detail och max_channels: bara de första max_channels
+    kanalerna får egna serier, övriga räknas in under channel="other" (histogram och
+    räknare) eller hoppas över (gauges). Serier för borttagna kanaler tas bort med
+    forget(), så registret och varje scrape växer bara med aktiva serier.
+    """
+
+    def __init__(self, detail=DEFAULT_DETAIL, max_channels=DEFAULT_MAX_LABELED_CHANNELS, registry=REGISTRY):
+        if detail not in (DETAIL_NONE, DETAIL_CHANNEL, DETAIL_RENDITION):
+            raise ValueError(f"Unknown metrics detail: {detail}")
+        self.detail = detail
+        self.max_channels = max_channels
+        self._labeled = set()
+        # Alla barnserier per kanal, så att de kan tas bort när kanalen försvinner
+        self._series = {}
+
+        channel = ('channel',) if detail != DETAIL_NONE else ()
+        rendition = channel + ('rendition',) if detail == DETAIL_RENDITION else channel
+
+        self.checks = Counter('monitor_checks_total', 'Channel checks by resulting status', ['status'],
+                              registry=registry)
+        self.check_duration = Histogram('monitor_check_duration_seconds', 'Duration of a full channel check',
+                                        channel, buckets=LATENCY_BUCKETS, registry=registry)
+        self.manifest_latency = Histogram('monitor_manifest_fetch_seconds', 'Playlist fetch latency',
+                                          rendition + ('kind',), buckets=LATENCY_BUCKETS, registry=registry)
+        self.ttfb = Histogram('monitor_segment_ttfb_seconds', 'Segment time to first byte',
+                              rendition, buckets=LATENCY_BUCKETS, registry=registry)
+        self.throughput = Histogram('monitor_segment_throughput_bps', 'Segment download throughput in bit/s',
+                                    rendition, buckets=THROUGHPUT_BUCKETS, registry=registry)
+        self.errors = Counter('monitor_check_errors_total', 'Failed checks by error class',
+                              channel + ('error',), registry=registry)
+        self.scheduler_lag = Histogram('monitor_scheduler_lag_seconds', 'How late a scheduled check started',
+                                       buckets=LATENCY_BUCKETS, registry=registry)
+        self.channels = Gauge('monitor_channels', 'Channels monitored by this worker', registry=registry)
+        self.in_flight = Gauge('monitor_checks_in_flight', 'Channel checks currently running', registry=registry)
+        self.retries = Counter('monitor_check_retries_total', 'Failed checks rescheduled as a retry', registry=registry)
+        self.open_circuits = Gauge('monitor_open_circuits', 'Origin and channel circuit breakers not closed',
+                                   registry=registry)
+
+        # Gauges är bara meningsfulla per kanal
+        self.status = self.stall_seconds = self.sequence_lag = None
+        if channel:
+            self.status = Gauge('monitor_channel_status', 'Latest channel status (0 green, 1 yellow, 2 red)',
+                                channel, registry=registry)
+            self.stall_seconds = Gauge('monitor_stall_seconds', 'Seconds since the playlist last advanced',
+                                       rendition, registry=registry)
+            self.sequence_lag = Gauge('monitor_media_sequence_lag_segments',
+                                      'Target durations since the media sequence last advanced',
+                                      rendition, registry=registry)
+
+    def track_worker(self, worker):
+        """Läs antal kanaler och pågående kontroller direkt från workern vid scrape"""
+        self.channels.set_function(lambda: len(worker.monitors))
+        self.in_flight.set_function(lambda: len(worker.tasks))
+        self.open_circuits.set_function(worker.failure_policy.open_circuits)
+
+    def _channel_label(self, channel_id):
+        if self.detail == DETAIL_NONE:
+            return None
+        if channel_id in self._labeled:
+            return str(channel_id)
+        if len(self._labeled) < self.max_channels:
+            self._labeled.add(channel_id)
+            return str(channel_id)
+        return OTHER
+
+    def _child(self, metric, owner, *values):
+        """metric.labels(*values) och kom ihåg serien för kanalen owner (None för delade serier)"""
+        if not values:
+            return metric
+        if owner is not None:
+            self._series.setdefault(owner, set()).add((metric, values))
+        return metric.labels(*values)
+
+    def observe_lag(self, lateness):
+        self.scheduler_lag.observe(lateness)
+
+    def observe_retry(self):
+        self.retries.inc()
+
+    def observe(self, result):
+        """Registrera en ChannelStatus"""
+        channel = self._channel_label(result.channel_id)
+        base = (channel,) if channel is not None else ()
+        # Serierna under "other" delas av många kanaler och tas aldrig bort
+        channel_id = result.channel_id if channel not in (None, OTHER) else None
+        gauges = self.status is not None and channel_id is not None
+
+        self.checks.labels(result.status).inc()
+        if result.duration is not None:
+            self._child(self.check_duration, channel_id, *base).observe(result.duration)
+        if result.manifest_time is not None:
+            kind_base = base + (('',) if self.detail == DETAIL_RENDITION else ())
+            self._child(self.manifest_latency, channel_id, *kind_base, 'master').observe(result.manifest_time)
+        if result.error:
+            self._child(self.errors, channel_id, *base, result.error).inc()
+        if gauges:
+            self._child(self.status, channel_id, channel).set(_STATUS_VALUE[result.status])
+
+        for rendition in result.renditions:
+            labels = base + ((rendition_label(rendition),) if self.detail == DETAIL_RENDITION else ())
+            if rendition.manifest_time is not None:
+                self._child(self.manifest_latency, channel_id, *labels, 'media').observe(rendition.manifest_time)
+            if rendition.ttfb is not None:
+                self._child(self.ttfb, channel_id, *labels).observe(rendition.ttfb)
+            if rendition.throughput is not None:
+                self._child(self.throughput, channel_id, *labels).observe(rendition.throughput)
+            if rendition.error:
+                self._child(self.errors, channel_id, *base, rendition.error).inc()
+            if gauges and rendition.stall_seconds is not None:
+                self._child(self.stall_seconds, channel_id, *labels).set(rendition.stall_seconds)
+                if rendition.target_duration:
+                    lag = rendition.stall_seconds / rendition.target_duration
+                    self._child(self.sequence_lag, channel_id, *labels).set(lag)
+
+    def forget(self, channel_id):
+        """Ta bort alla serier för en kanal som inte längre övervakas"""
+        for metric, values in self._series.pop(channel_id, ()):
+            try:
+                metric.remove(*values)
+            except KeyError:
+                pass
+        if channel_id in self._labeled:
+            self._labeled.discard(channel_id)
+
+
+def start_metrics_server(port=DEFAULT_METRICS_PORT, registry=REGISTRY):
+    """Servera /metrics från en egen tråd, så att en scrape inte stoppar event-loopen"""
+    start_http_server(port, registry=registry)
+    logger.info(f"📈 Metrics på port {port}")
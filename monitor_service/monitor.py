@@ -2,48 +2,91 @@ import os
 import sys
 import logging
 import time
-import requests
 import m3u8
 from urllib.parse import urljoin
 import signal
-import structlog
-from tenacity import retry, stop_after_attempt, wait_exponential
-from circuitbreaker import circuit
+import random
+import asyncio
+import contextlib
+import functools
+import hashlib
+import httpx
+
+from .alerts import AlertEvaluator, sinks_from_env, DEFAULT_BATCH_INTERVAL as DEFAULT_ALERT_INTERVAL
+from .http_pool import HttpPool, build_timeout, get_session, request_timeout, DEFAULT_STREAM_TIMEOUT
+from .manifest_cache import ManifestCache
+from .metrics import (MonitorMetrics, start_metrics_server, DEFAULT_DETAIL, DEFAULT_MAX_LABELED_CHANNELS,
+                      DEFAULT_METRICS_PORT)
+from .playlist import PlaylistParser, as_summary, DEFAULT_RECENT_SEGMENTS
+from .probe import probe_segment, DEFAULT_MIN_REALTIME_FACTOR
+from .stall import ChannelState, STALLED, DEFAULT_STALL_FACTOR
+from .resilience import CircuitBreaker, FailurePolicy, failure_class, DEFAULT_CHANNEL_FAILURE_THRESHOLD
+from .reporter import ResultBuffer, DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL
+from .scheduler import PollScheduler, jittered, poll_interval, DEFAULT_MIN_INTERVAL
+from .tracing import configure_tracing, start_trace, DEFAULT_SAMPLE_RATE
+from .profiling import DebugServer
+from .status import (ChannelStatus, RenditionStatus, GREEN, YELLOW, RED, ERROR_CIRCUIT_OPEN, ERROR_CONNECT,
+                     ERROR_MANIFEST, ERROR_NO_SEGMENTS, ERROR_SEGMENT, ERROR_SLOW, ERROR_STALLED, ERROR_TIMEOUT)
 
 # Konfigurera loggning
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)-8s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 logger = logging.getLogger(__name__)
+# httpx loggar varje anrop på INFO, för mycket när tusentals kanaler pollas
+logging.getLogger('httpx').setLevel(logging.WARNING)
 
 # Global flagga för att kontrollera om vi ska fortsätta köra
 running = True
 
+# Standardvärden för async-läget (MONITOR_MODE=multi)
+DEFAULT_MONITOR_INTERVAL = 10
+DEFAULT_MAX_CHANNELS_PER_WORKER = 500
+DEFAULT_MAX_CONCURRENT_CHECKS = 100
+DEFAULT_RENDITION_CONCURRENCY = 4
+DEFAULT_PROBE_SEGMENTS = 1
+# Hur ofta en worker frågar efter ändrade inställningar (villkorliga GET), och väntan efter fel mot kanalflödet
+DEFAULT_CONFIG_POLL_INTERVAL = 10
+# Long-poll mot /channels/changes, databastjänsten svarar senast efter så här många sekunder
+CHANGES_TIMEOUT = 25
+
+DEFAULT_SETTINGS = {'monitor_interval': 10, 'alert_threshold': 5, 'stream_timeout': DEFAULT_STREAM_TIMEOUT}
+
+# Senast hämtade inställningar per databas-URL som (ETag, inställningar)
+_settings_cache = {}
+
+def parse_settings(raw):
+    """Inställningarna monitorn använder, som heltal med standardvärden"""
+    return {key: int(raw.get(key, default)) for key, default in DEFAULT_SETTINGS.items()}
+
 def get_settings(database_url):
-    """Hämta inställningar från databasen"""
+    """Hämta inställningar från databasen, oförändrade (304) tas från förra hämtningen"""
     try:
-        response = requests.get(f"{database_url}/settings")
+        cached = _settings_cache.get(database_url)
+        headers = {'If-None-Match': cached[0]} if cached and cached[0] else {}
+        response = get_session().get(f"{database_url}/settings", headers=headers, timeout=request_timeout())
+        if response.status_code == 304 and cached:
+            return dict(cached[1])
         if response.status_code == 200:
-            settings = response.json()
-            return {
-                'monitor_interval': int(settings.get('monitor_interval', 10)),
-                'alert_threshold': int(settings.get('alert_threshold', 5))
-            }
+            settings = parse_settings(response.json())
+            _settings_cache[database_url] = (response.headers.get('ETag'), settings)
+            return dict(settings)
         else:
             logger.error(f"❌ Kunde inte hämta inställningar. Status: {response.status_code}")
-            return {'monitor_interval': 10, 'alert_threshold': 5}  # Default värden
+            return dict(DEFAULT_SETTINGS)  # Default värden
     except Exception as e:
         logger.error(f"❌ Fel vid hämtning av inställningar: {str(e)}")
-        return {'monitor_interval': 10, 'alert_threshold': 5}  # Default värden
-
-@circuit(failure_threshold=5, recovery_timeout=60)
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=4, max=10)
-)
-def check_stream_status(url):
+        return dict(DEFAULT_SETTINGS)  # Default värden
+
+def check_stream_status(url, stream_timeout=DEFAULT_STREAM_TIMEOUT):
+    """
+    Kontrollera en ström i single-läget. Returnerar (status, meddelande) där RED betyder
+    att strömmen inte gick att hämta och YELLOW att den svarade men saknar segment.
+    """
+    session = get_session()
+    timeout = request_timeout(stream_timeout)
     try:
         # Hämta HLS manifest
         logger.info(f"🔍 Hämtar HLS manifest från: {url}")
-        response = requests.get(url)
+        response = session.get(url, timeout=timeout)
         response.raise_for_status()
         
         # Parsa M3U8
@@ -59,42 +102,697 @@ def check_stream_status(url):
                 variant_url = url.rsplit('/', 1)[0] + '/' + variant_url
             
             logger.info(f"Kontrollerar variant-ström: {variant_url}")
-            variant_response = requests.get(variant_url)
+            variant_response = session.get(variant_url, timeout=timeout)
             variant_response.raise_for_status()
             variant_m3u8 = m3u8.loads(variant_response.text)
             
             if hasattr(variant_m3u8, 'segments') and variant_m3u8.segments:
                 logger.info(f"✅ Strömmen är aktiv med {len(variant_m3u8.segments)} segment")
-                return f"Strömmen är aktiv med {len(variant_m3u8.segments)} segment"
+                return GREEN, f"Strömmen är aktiv med {len(variant_m3u8.segments)} segment"
             else:
                 logger.warning("⚠️ Inga segment hittades i strömmen")
-                return "Inga segment hittades"
+                return YELLOW, "Inga segment hittades"
         else:
             # Det är en media playlist
             if hasattr(m3u8_obj, 'segments') and m3u8_obj.segments:
                 logger.info(f"✅ Strömmen är aktiv med {len(m3u8_obj.segments)} segment")
-                return f"Strömmen är aktiv med {len(m3u8_obj.segments)} segment"
+                return GREEN, f"Strömmen är aktiv med {len(m3u8_obj.segments)} segment"
             else:
                 logger.warning("⚠️ Inga segment hittades i strömmen")
-                return "Inga segment hittades"
+                return YELLOW, "Inga segment hittades"
                 
     except Exception as e:
         logger.error(f"❌ Fel vid kontroll av ström: {e}")
-        return f"Fel vid kontroll: {str(e)}"
+        return RED, f"Fel vid kontroll: {str(e)}"
 
-def monitor_stream(channel_url):
+def monitor_stream(channel_url, interval=DEFAULT_MONITOR_INTERVAL):
     """
     Övervakar en HLS-ström kontinuerligt.
     """
     while True:
         try:
-            status = check_stream_status(channel_url)
-            if status != "Strömmen är aktiv med segment":
-                logger.warning(f"⚠️ Problem: {status}")
-            time.sleep(5)  # Vänta 5 sekunder mellan kontroller
+            status, message = check_stream_status(channel_url)
+            if status != GREEN:
+                logger.warning(f"⚠️ Problem: {message}")
+            time.sleep(interval)  # Vänta monitor_interval sekunder mellan kontroller
         except Exception as e:
             logger.error(f"❌ Oväntat fel vid övervakning av {channel_url}: {str(e)}")
-            time.sleep(5)
+            time.sleep(interval)
+
+@contextlib.asynccontextmanager
+async def _http_client(client=None):
+    """Använd en befintlig AsyncClient eller skapa en tillfällig"""
+    if client is not None:
+        yield client
+    else:
+        async with httpx.AsyncClient(timeout=build_timeout()) as own_client:
+            yield own_client
+
+async def _stream_playlist(http, url, request_url, headers, cache):
+    """Läs playlisten i bitar genom PlaylistParser istället för att bygga hela texten"""
+    trace = start_trace('manifest', request_url)
+    kwargs = {'extensions': trace.extensions()} if trace is not None else {}
+    try:
+        async with http.stream('GET', request_url, headers=headers, **kwargs) as response:
+            if trace is not None:
+                trace.fields['status'] = response.status_code
+            if cache is not None and response.status_code == 304:
+                return cache.not_modified(url, response)
+            response.raise_for_status()
+            parser = PlaylistParser()
+            digest = hashlib.sha1()
+            async for chunk in response.aiter_bytes():
+                if trace is None:
+                    parser.feed(chunk)
+                else:
+                    started = time.perf_counter()
+                    parser.feed(chunk)
+                    trace.add('parse', time.perf_counter() - started)
+                digest.update(chunk)
+            summary = parser.close()
+    except Exception as e:
+        if trace is not None:
+            trace.fields['error'] = type(e).__name__
+        raise
+    finally:
+        if trace is not None:
+            trace.emit()
+    if cache is not None:
+        return cache.store_parsed(url, response.headers, digest.digest(), summary)
+    return summary
+
+async def fetch_manifest(url, client=None, cache=None, streaming=False):
+    """
+    Hämta och parsa ett M3U8-manifest asynkront. Returnerar None vid fel.
+    Med en ManifestCache görs villkorliga anrop och oförändrade manifest parsas inte om.
+    Med streaming=True returneras en PlaylistSummary från den strömmande parsern
+    istället för ett m3u8.M3U8-objekt.
+    """
+    try:
+        request_url, headers = url, {}
+        if cache is not None:
+            cached = cache.fresh(url)
+            if cached is not None:
+                return cached
+            request_url, headers = cache.prepare(url)
+
+        async with _http_client(client) as http:
+            if streaming:
+                return await _stream_playlist(http, url, request_url, headers, cache)
+            response = await http.get(request_url, headers=headers)
+
+        if cache is not None and response.status_code == 304:
+            return cache.not_modified(url, response)
+        response.raise_for_status()
+        logger.debug(f"📄 Manifest hämtat från {url} på {response.elapsed.total_seconds():.3f}s")
+        if cache is not None:
+            return cache.store(url, response, m3u8.loads)
+        return m3u8.loads(response.text)
+    except Exception as e:
+        logger.error(f"❌ Kunde inte hämta manifest från {url}: {e}")
+        return None
+
+async def fetch_segment(url, client=None):
+    """Hämta ett segment och returnera svarstiden i sekunder, eller None vid fel."""
+    try:
+        async with _http_client(client) as http:
+            response = await http.get(url)
+        response.raise_for_status()
+        return response.elapsed.total_seconds()
+    except httpx.TimeoutException:
+        logger.warning(f"⏱️ Timeout vid hämtning av segment: {url}")
+        return None
+    except Exception as e:
+        logger.error(f"❌ Kunde inte hämta segment {url}: {e}")
+        return None
+
+class CheckOptions:
+    """Inställningar för hur en kanal kontrolleras"""
+    __slots__ = ('rendition_concurrency', 'probe_segments', 'probe_range_bytes', 'min_realtime_factor', 'stall_factor',
+                 'block_reload')
+
+    def __init__(self, rendition_concurrency=DEFAULT_RENDITION_CONCURRENCY, probe_segments=DEFAULT_PROBE_SEGMENTS,
+                 probe_range_bytes=None, min_realtime_factor=DEFAULT_MIN_REALTIME_FACTOR,
+                 stall_factor=DEFAULT_STALL_FACTOR, block_reload=False):
+        # recent_segments[-0:] skulle ge alla segment, och utan segment finns inget att mäta
+        if not 1 <= probe_segments <= DEFAULT_RECENT_SEGMENTS:
+            raise ValueError(f"probe_segments must be between 1 and {DEFAULT_RECENT_SEGMENTS}: {probe_segments}")
+        self.rendition_concurrency = rendition_concurrency
+        self.probe_segments = probe_segments
+        self.probe_range_bytes = probe_range_bytes
+        self.min_realtime_factor = min_realtime_factor
+        self.stall_factor = stall_factor
+        # LL-HLS blocking reload (_HLS_msn) mot origins som annonserar CAN-BLOCK-RELOAD
+        self.block_reload = block_reload
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            rendition_concurrency=int(os.getenv('MAX_RENDITION_CONCURRENCY', DEFAULT_RENDITION_CONCURRENCY)),
+            probe_segments=int(os.getenv('PROBE_SEGMENTS', DEFAULT_PROBE_SEGMENTS)),
+            probe_range_bytes=int(os.getenv('PROBE_RANGE_BYTES', 0)) or None,
+            min_realtime_factor=float(os.getenv('MIN_REALTIME_FACTOR', DEFAULT_MIN_REALTIME_FACTOR)),
+            stall_factor=float(os.getenv('STALL_FACTOR', DEFAULT_STALL_FACTOR)),
+            block_reload=os.getenv('LLHLS_BLOCKING_RELOAD', '0') == '1',
+        )
+
+DEFAULT_CHECK_OPTIONS = CheckOptions()
+
+def list_renditions(channel_url, manifest):
+    """Alla renditioner (varianter och EXT-X-MEDIA med URI) i en master playlist"""
+    renditions, seen = [], set()
+    for variant in manifest.variants:
+        uri = urljoin(channel_url, variant.uri)
+        if uri not in seen:
+            seen.add(uri)
+            renditions.append(RenditionStatus('variant', uri, name=variant.resolution, bandwidth=variant.bandwidth))
+    for media in manifest.media:
+        if not media.uri:
+            continue
+        uri = urljoin(channel_url, media.uri)
+        if uri not in seen:
+            seen.add(uri)
+            renditions.append(RenditionStatus((media.type or 'media').lower(), uri, name=media.name))
+    return renditions
+
+async def probe_rendition(rendition, playlist, client, options):
+    """Ladda ned de senaste segmenten och jämför nedladdningstiden mot realtid"""
+    probe = None
+    async with _http_client(client) as http:
+        for uri, duration in playlist.recent_segments[-options.probe_segments:]:
+            result = await probe_segment(http, urljoin(rendition.uri, uri), duration, options.probe_range_bytes)
+            probe = result if probe is None else probe.add(result)
+
+    rendition.response_time = probe.ttfb
+    rendition.ttfb = probe.ttfb
+    rendition.download_time = probe.download_time
+    rendition.bytes = probe.bytes
+    rendition.throughput = probe.throughput
+    rendition.realtime_factor = probe.realtime_factor(rendition.bandwidth)
+    if rendition.realtime_factor is not None and rendition.realtime_factor < options.min_realtime_factor:
+        rendition.fail(YELLOW, f"Segment laddas ned långsammare än realtid ({rendition.realtime_factor:.2f}x)", ERROR_SLOW)
+    return rendition
+
+async def check_rendition(rendition, client=None, cache=None, playlist=None, options=DEFAULT_CHECK_OPTIONS, state=None):
+    """Kontrollera en rendition: hämta dess playlist och ladda ned senaste segmenten"""
+    if playlist is None:
+        started = time.perf_counter()
+        playlist = as_summary(await fetch_manifest(rendition.uri, client, cache, streaming=True))
+        rendition.manifest_time = time.perf_counter() - started
+    if playlist is None:
+        return rendition.fail(RED, "Kunde inte hämta playlist", ERROR_MANIFEST)
+
+    rendition.segment_count = playlist.total_segments
+    rendition.media_sequence = playlist.media_sequence
+    rendition.target_duration = playlist.target_duration
+
+    if state is not None:
+        observed = state.observe(rendition.uri, playlist)
+        rendition.stall_verdict = observed.verdict
+        rendition.stall_seconds = observed.stall_seconds
+        if observed.verdict == STALLED:
+            rendition.fail(RED, f"Playlisten har inte uppdaterats på {observed.stall_seconds:.0f}s", ERROR_STALLED)
+
+    if not playlist.segment_count:
+        # Utan segment mäts bara svarstiden mot själva playlisten
+        rendition.response_time = await fetch_segment(rendition.uri, client)
+        if rendition.response_time is None:
+            return rendition.fail(RED, "Playlist svarar inte", ERROR_MANIFEST)
+        return rendition.fail(YELLOW, "Inga segment hittades", ERROR_NO_SEGMENTS)
+
+    try:
+        return await probe_rendition(rendition, playlist, client, options)
+    except httpx.TimeoutException:
+        return rendition.fail(RED, "Timeout vid hämtning av segment", ERROR_TIMEOUT)
+    except httpx.HTTPStatusError as e:
+        return rendition.fail(RED, f"Segment svarar inte: {e}", f"http_{e.response.status_code // 100}xx")
+    except httpx.TransportError as e:
+        return rendition.fail(RED, f"Segment svarar inte: {e}", ERROR_CONNECT)
+    except Exception as e:
+        return rendition.fail(RED, f"Segment svarar inte: {e}", ERROR_SEGMENT)
+
+async def check_channel(channel_url, client=None, cache=None, channel_id=None,
+                        options=DEFAULT_CHECK_OPTIONS, state=None):
+    """
+    Kontrollera alla renditioner i en kanal samtidigt och returnera en ChannelStatus.
+    Antalet samtidiga anrop per kanal begränsas av options.rendition_concurrency.
+    """
+    started = time.perf_counter()
+    result = ChannelStatus(channel_id, channel_url)
+    manifest = as_summary(await fetch_manifest(channel_url, client, cache, streaming=True))
+    result.manifest_time = time.perf_counter() - started
+    if manifest is None:
+        result.status, result.message, result.error = RED, "Kunde inte hämta manifest", ERROR_MANIFEST
+        return result.finish(started)
+
+    if not manifest.is_master:
+        # Kanal-URL:en är själv en media playlist
+        rendition = RenditionStatus('media', channel_url)
+        result.renditions.append(await check_rendition(rendition, client, cache, manifest, options, state))
+        return result.finish(started)
+
+    semaphore = asyncio.Semaphore(options.rendition_concurrency)
+
+    async def limited(rendition):
+        async with semaphore:
+            return await check_rendition(rendition, client, cache, options=options, state=state)
+
+    result.renditions = list(await asyncio.gather(*(limited(r) for r in list_renditions(channel_url, manifest))))
+    if state is not None:
+        state.retain(r.uri for r in result.renditions)
+    return result.finish(started)
+
+def log_channel_status(label, result):
+    """Logga resultatet av en kanalkontroll"""
+    if result.status == GREEN:
+        logger.info(f"✅ {label}: {result.message} ({result.duration:.3f}s)")
+        return
+    logger.warning(f"⚠️ Problem för {label}: {result.message}")
+    for rendition in result.renditions:
+        if rendition.status != GREEN:
+            logger.warning(f"   {rendition.kind} {rendition.name or rendition.uri}: {rendition.message}")
+
+class ChannelMonitor:
+    """Tillstånd för en övervakad kanal som behålls mellan kontroller"""
+    __slots__ = ('channel_id', 'url', 'label', 'cache', 'state', 'last_result', 'attempt')
+
+    def __init__(self, channel_id, url, options=DEFAULT_CHECK_OPTIONS):
+        self.channel_id = channel_id
+        self.url = url
+        self.label = f"kanal {channel_id}" if channel_id is not None else url
+        self.cache = ManifestCache(block_reload=options.block_reload)
+        self.state = ChannelState(stall_factor=options.stall_factor)
+        self.last_result = None
+        # Antal omförsök i rad efter en misslyckad kontroll
+        self.attempt = 0
+
+    async def check(self, client, options=DEFAULT_CHECK_OPTIONS):
+        """Kör en kontroll av kanalen och logga resultatet"""
+        self.last_result = await check_channel(self.url, client, self.cache, self.channel_id, options, self.state)
+        log_channel_status(self.label, self.last_result)
+        return self.last_result
+
+def circuit_open_result(monitor, wait):
+    """Rött resultat för en kanal som inte kontrolleras för att en brytare är öppen"""
+    result = ChannelStatus(monitor.channel_id, monitor.url)
+    result.status = RED
+    result.message = f"Kontrolleras inte efter upprepade fel, nytt försök om {wait:.0f}s"
+    result.error = ERROR_CIRCUIT_OPEN
+    return result
+
+async def monitor_hls_channel(channel_url=None, client=None, interval=DEFAULT_MONITOR_INTERVAL, channel_id=None, semaphore=None,
+                              options=DEFAULT_CHECK_OPTIONS):
+    """
+    Övervakar en HLS-kanal kontinuerligt på event-loopen.
+    Väntetiden mellan kontroller följer playlistens target duration, interval
+    används tills den är känd.
+    """
+    monitor = ChannelMonitor(channel_id, channel_url or os.getenv('CHANNEL_URL'), options)
+    async with _http_client(client) as http:
+        while running:
+            try:
+                if semaphore is not None:
+                    async with semaphore:
+                        await monitor.check(http, options)
+                else:
+                    await monitor.check(http, options)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Oväntat fel vid övervakning av {monitor.label}: {e}")
+            await asyncio.sleep(jittered(poll_interval(monitor.last_result, interval)))
+
+class MonitorWorker:
+    """
+    Övervakar många kanaler i en och samma process med asyncio.
+    Alla kanaler delar en HTTP-klient, ett tak för samtidiga kontroller och
+    en heap-baserad schemaläggare som styr när varje kanal kontrolleras.
+    Kanaler och inställningar laddas om medan workern kör, utan omstart.
+    """
+
+    def __init__(self, database_url, max_channels=DEFAULT_MAX_CHANNELS_PER_WORKER,
+                 max_concurrent_checks=DEFAULT_MAX_CONCURRENT_CHECKS, channel_ids=None, pool_options=None,
+                 check_options=DEFAULT_CHECK_OPTIONS, min_interval=DEFAULT_MIN_INTERVAL, report_options=None,
+                 worker_id=None, config_poll_interval=DEFAULT_CONFIG_POLL_INTERVAL, metrics=None, failure_policy=None,
+                 alerts=None, alert_options=None):
+        self.database_url = database_url
+        # Utan CHANNEL_IDS hämtar workern bara sin egen shard (/channels?worker_id=)
+        self.worker_id = worker_id
+        self.max_channels = max_channels
+        self.max_concurrent_checks = max_concurrent_checks
+        self.check_options = check_options
+        self.channel_ids = channel_ids
+        self.pool_options = pool_options or {}
+        self.min_interval = min_interval
+        # Resultat skickas till databastjänsten om report_options anges
+        self.report_options = report_options
+        self.reporter = None
+        # Larm utvärderas om alerts (AlertEvaluator) anges och skickas till alert_options['sinks']
+        self.alerts = alerts
+        self.alert_options = alert_options or {}
+        self.monitors = {}
+        self.tasks = {}
+        self.scheduler = None
+        self.max_lateness = 0.0
+        self.config_poll_interval = config_poll_interval
+        self.metrics = metrics
+        self.failure_policy = failure_policy or FailurePolicy()
+        if metrics is not None:
+            metrics.track_worker(self)
+        self.interval = DEFAULT_MONITOR_INTERVAL
+        self.stream_timeout = DEFAULT_STREAM_TIMEOUT
+        self.channels_etag = None
+        self.channels_version = 0
+        self.settings_etag = None
+
+    async def load_channels(self, client):
+        """
+        Hämta kanaler för denna worker från databastjänsten med If-None-Match.
+        Returnerar None om listan inte ändrats eller inte kunde hämtas.
+        """
+        params = {'worker_id': self.worker_id} if self.worker_id and self.channel_ids is None else None
+        headers = {'If-None-Match': self.channels_etag} if self.channels_etag else None
+        try:
+            response = await client.get(f"{self.database_url}/channels", params=params, headers=headers)
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            channels = response.json()['channels']
+        except Exception as e:
+            logger.error(f"❌ Fel vid hämtning av kanaler: {e}")
+            return None
+        if response.status_code == 200:
+            self.channels_etag = response.headers.get('ETag')
+            # Versionen som long-pollen mot /channels/changes väntar förbi
+            self.channels_version = int(response.headers.get('X-Config-Version', self.channels_version))
+        return self.select_channels(channels)
+
+    def select_channels(self, channels):
+        """Kanalerna ur CHANNEL_IDS i ID-ordning, högst max_channels"""
+        if self.channel_ids is not None:
+            channels = [c for c in channels if c['id'] in self.channel_ids]
+        channels.sort(key=lambda c: c['id'])
+
+        if len(channels) > self.max_channels:
+            logger.warning(f"⚠️ {len(channels)} kanaler överskrider gränsen {self.max_channels} per worker, "
+                           f"övervakar de första {self.max_channels}")
+            channels = channels[:self.max_channels]
+        return channels
+
+    async def load_settings(self, client):
+        """Hämta inställningar med If-None-Match. Returnerar None om de inte ändrats eller inte kunde hämtas."""
+        headers = {'If-None-Match': self.settings_etag} if self.settings_etag else None
+        try:
+            response = await client.get(f"{self.database_url}/settings", headers=headers)
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            settings = parse_settings(response.json())
+        except Exception as e:
+            logger.error(f"❌ Fel vid hämtning av inställningar: {e}")
+            return None
+        self.settings_etag = response.headers.get('ETag')
+        return settings
+
+    def apply_settings(self, settings, client=None):
+        """Använd nya inställningar från nästa kontroll"""
+        if settings['monitor_interval'] != self.interval:
+            logger.info(f"🔧 Kontrollintervall {self.interval}s -> {settings['monitor_interval']}s")
+            self.interval = settings['monitor_interval']
+        if settings['stream_timeout'] != self.stream_timeout:
+            logger.info(f"🔧 Stream timeout {self.stream_timeout}s -> {settings['stream_timeout']}s")
+            self.stream_timeout = settings['stream_timeout']
+            if client is not None:
+                client.set_stream_timeout(self.stream_timeout)
+        if self.alerts is not None and settings['alert_threshold'] != self.alerts.threshold:
+            logger.info(f"🔧 Larmtröskel {self.alerts.threshold} -> {settings['alert_threshold']} fel i rad")
+            self.alerts.threshold = settings['alert_threshold']
+
+    def apply_channels(self, channels):
+        """
+        Byt kanaluppsättning på plats. Nya kanaler schemaläggs utspritt över ett intervall,
+        kanaler med ändrad URL får ny monitor och kontrolleras direkt. Borttagna kanaler
+        avplaneras, en pågående kontroll får köra klart men planeras inte om.
+        Inget await sker här, så bytet är atomärt för övriga kontroller på event-loopen.
+        """
+        wanted = {c['id']: c['url'] for c in channels}
+        removed = [channel_id for channel_id in self.monitors if channel_id not in wanted]
+        for channel_id in removed:
+            del self.monitors[channel_id]
+            self.scheduler.remove(channel_id)
+            self.failure_policy.forget(channel_id)
+            if self.metrics is not None:
+                self.metrics.forget(channel_id)
+            if self.alerts is not None:
+                self.alerts.forget(channel_id)
+
+        added = changed = 0
+        for channel_id, url in wanted.items():
+            current = self.monitors.get(channel_id)
+            if current is not None and current.url == url:
+                continue
+            self.monitors[channel_id] = ChannelMonitor(channel_id, url, self.check_options)
+            if current is None:
+                added += 1
+                # Sprid ut första kontrollen över ett intervall så att kanalerna inte pollar i takt
+                delay = random.uniform(0, self.interval)
+            else:
+                changed += 1
+                delay = 0
+            # En pågående kontroll planerar själv in nästa när den är klar
+            if channel_id not in self.tasks:
+                self.scheduler.schedule(channel_id, delay)
+
+        if added or changed or removed:
+            logger.info(f"🔄 Kanaler uppdaterade: {added} nya, {changed} ändrade, {len(removed)} borttagna "
+                        f"({len(self.monitors)} totalt)")
+
+    async def wait_for_channels(self, client, timeout=CHANGES_TIMEOUT):
+        """
+        Vänta (long-poll) tills kanalversionen är nyare än den senast hämtade. Returnerar
+        kanalerna vid ändring, annars None. Flödet innehåller alla kanaler, så en worker
+        med egen shard hämtar bara sin del med load_channels när versionen ändrats.
+        """
+        started = time.monotonic()
+        try:
+            response = await client.get(f"{self.database_url}/channels/changes",
+                                        params={'since': self.channels_version, 'timeout': timeout},
+                                        timeout=build_timeout(timeout + 5))
+            if response.status_code == 200:
+                data = response.json()
+                self.channels_version = data['version']
+                logger.info(f"📣 Kanallistan ändrad (version {data['version']})")
+                if self.worker_id and self.channel_ids is None:
+                    return await self.load_channels(client)
+                return self.select_channels(data['channels'])
+            # Databastjänsten svarar direkt utan att vänta när alla long-poll platser är upptagna
+            if response.status_code == 204 and time.monotonic() - started >= timeout / 2:
+                return None
+            response.raise_for_status()
+        except Exception as e:
+            logger.error(f"❌ Fel vid väntan på kanaländringar: {e}")
+        await asyncio.sleep(self.config_poll_interval)
+        return None
+
+    async def watch_channels(self, client, stop_event):
+        """Byt kanaluppsättning när databastjänsten meddelar att kanalerna ändrats"""
+        while not stop_event.is_set():
+            channels = await self.wait_for_channels(client)
+            if channels is not None:
+                self.apply_channels(channels)
+
+    async def watch_settings(self, client, stop_event):
+        """Fråga efter ändrade inställningar var config_poll_interval sekund"""
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.config_poll_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            settings = await self.load_settings(client)
+            if settings is not None:
+                self.apply_settings(settings, client)
+
+    async def watch_config(self, client, stop_event):
+        """Följ kanaländringar med long-poll och inställningarna med villkorliga GET"""
+        await asyncio.gather(self.watch_channels(client, stop_event), self.watch_settings(client, stop_event))
+
+    async def run_check(self, client, monitor, semaphore, interval):
+        """
+        Kontrollera en kanal och planera nästa kontroll när den är klar. Ett misslyckat
+        försök som ska göras om planeras in igen och rapporteras inte, bara slutresultatet.
+        """
+        retry_delay = None
+        try:
+            async with semaphore:
+                result = await monitor.check(client, self.check_options)
+            # En kanal som tagits bort eller fått ny URL under kontrollen räknas inte. Dess brytare,
+            # serier och larm är redan glömda och skulle annars skapas igen
+            if self.monitors.get(monitor.channel_id) is monitor:
+                retry_delay = self.failure_policy.after_check(monitor.channel_id, monitor.url, result,
+                                                              monitor.attempt)
+                if retry_delay is not None:
+                    monitor.attempt += 1
+                    logger.info(f"🔁 {monitor.label}: {failure_class(result)}, försök {monitor.attempt + 1} "
+                                f"om {retry_delay:.1f}s")
+                    if self.metrics is not None:
+                        self.metrics.observe_retry()
+                else:
+                    monitor.attempt = 0
+                    self.report(result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Oväntat fel vid övervakning av {monitor.label}: {e}")
+        finally:
+            self.tasks.pop(monitor.channel_id, None)
+        current = self.monitors.get(monitor.channel_id)
+        if current is monitor:
+            if retry_delay is not None:
+                self.scheduler.schedule(monitor.channel_id, retry_delay)
+            else:
+                delay = poll_interval(monitor.last_result, interval, self.min_interval)
+                self.scheduler.schedule(monitor.channel_id, jittered(delay))
+        elif current is not None:
+            # URL:en ändrades under kontrollen, kontrollera den nya direkt
+            self.scheduler.schedule(monitor.channel_id, 0)
+
+    def report(self, result):
+        """Ett slutgiltigt resultat till databasen, måtten och larmen"""
+        if self.reporter is not None:
+            self.reporter.add(result)
+        if self.metrics is not None:
+            self.metrics.observe(result)
+        if self.alerts is not None:
+            self.alerts.observe(result)
+
+    def dispatch(self, client, semaphore, channel_id, lateness):
+        """
+        Starta kontrollen av en kanal som schemaläggaren lämnat över. En kanal bakom en öppen
+        brytare kontrolleras inte men rapporteras röd varje intervall, så att status och larm
+        följer med även när origin är nere.
+        """
+        self.max_lateness = max(self.max_lateness, lateness)
+        if self.metrics is not None:
+            self.metrics.observe_lag(lateness)
+        if lateness > self.interval:
+            logger.warning(f"⏰ Kontroll av kanal {channel_id} startade {lateness:.1f}s sent")
+        monitor = self.monitors.get(channel_id)
+        if monitor is None or channel_id in self.tasks:
+            return
+        blocked = self.failure_policy.before_check(channel_id, monitor.url)
+        if blocked is not None:
+            monitor.attempt = 0
+            logger.info(f"⛔ {monitor.label}: brytaren är öppen, nytt försök om {blocked:.0f}s")
+            self.report(circuit_open_result(monitor, blocked))
+            # Sprid ut kanalerna efter att brytaren släpper, men rapportera minst varje intervall
+            self.scheduler.schedule(channel_id, min(self.interval, blocked + random.uniform(0, self.interval)))
+            return
+        self.tasks[channel_id] = asyncio.create_task(self.run_check(client, monitor, semaphore, self.interval))
+
+    async def run(self, stop_event):
+        """Schemalägg alla kanaler och kör tills stop_event sätts"""
+        settings = get_settings(self.database_url)
+        self.interval = settings['monitor_interval']
+        self.stream_timeout = settings['stream_timeout']
+        if self.alerts is not None:
+            self.alerts.threshold = settings['alert_threshold']
+        semaphore = asyncio.Semaphore(self.max_concurrent_checks)
+        self.scheduler = PollScheduler()
+
+        async with HttpPool(stream_timeout=self.stream_timeout, **self.pool_options) as client:
+            reporter_task = None
+            if self.report_options is not None:
+                self.reporter = ResultBuffer(self.database_url, client, **self.report_options)
+                reporter_task = asyncio.create_task(self.reporter.run(stop_event))
+            alerts_task = None
+            if self.alerts is not None:
+                sinks = sinks_from_env(self.alert_options.get('sinks', 'stdout'), client)
+                alerts_task = asyncio.create_task(self.alerts.run(
+                    sinks, stop_event, self.alert_options.get('interval', DEFAULT_ALERT_INTERVAL)))
+
+            self.apply_channels(await self.load_channels(client) or [])
+            logger.info(f"🚀 Worker övervakar {len(self.monitors)} kanaler (intervall {self.interval}s)")
+            config_task = None
+            if self.config_poll_interval > 0:
+                config_task = asyncio.create_task(self.watch_config(client, stop_event))
+
+            await self.scheduler.run(functools.partial(self.dispatch, client, semaphore), stop_event)
+
+            if config_task is not None:
+                # En pågående long-poll mot /channels/changes väntas inte ut vid stopp
+                config_task.cancel()
+                await asyncio.gather(config_task, return_exceptions=True)
+            for task in self.tasks.values():
+                task.cancel()
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+            self.tasks.clear()
+            if reporter_task is not None:
+                await reporter_task
+            if alerts_task is not None:
+                await alerts_task
+
+def parse_channel_ids(value):
+    """Tolka en kommaseparerad lista med kanal-ID:n, None om den saknas"""
+    if not value:
+        return None
+    return {int(part) for part in value.split(',') if part.strip()}
+
+async def run_worker():
+    """Kör MonitorWorker tills SIGTERM/SIGINT tas emot"""
+    stop_event = asyncio.Event()
+
+    def request_stop():
+        global running
+        logger.info("📥 Tar emot shutdown signal...")
+        running = False
+        stop_event.set()
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, request_stop)
+
+    configure_tracing(float(os.getenv('TRACE_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)))
+    debug_port = int(os.getenv('DEBUG_PORT', 0))
+    if debug_port > 0:
+        DebugServer(loop, os.getenv('DEBUG_HOST', '127.0.0.1'), debug_port).start()
+
+    metrics = None
+    metrics_port = int(os.getenv('METRICS_PORT', DEFAULT_METRICS_PORT))
+    if metrics_port > 0:
+        metrics = MonitorMetrics(
+            detail=os.getenv('METRICS_DETAIL', DEFAULT_DETAIL),
+            max_channels=int(os.getenv('METRICS_MAX_CHANNELS', DEFAULT_MAX_LABELED_CHANNELS)),
+        )
+        start_metrics_server(metrics_port)
+
+    worker = MonitorWorker(
+        os.getenv('DATABASE_SERVICE_URL'),
+        max_channels=int(os.getenv('MAX_CHANNELS_PER_WORKER', DEFAULT_MAX_CHANNELS_PER_WORKER)),
+        max_concurrent_checks=int(os.getenv('MAX_CONCURRENT_CHECKS', DEFAULT_MAX_CONCURRENT_CHECKS)),
+        check_options=CheckOptions.from_env(),
+        min_interval=float(os.getenv('MIN_POLL_INTERVAL', DEFAULT_MIN_INTERVAL)),
+        report_options={
+            'batch_size': int(os.getenv('RESULT_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+            'flush_interval': float(os.getenv('RESULT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)),
+        } if os.getenv('REPORT_RESULTS', '1') == '1' else None,
+        channel_ids=parse_channel_ids(os.getenv('CHANNEL_IDS')),
+        failure_policy=FailurePolicy.from_env(),
+        worker_id=os.getenv('WORKER_ID'),
+        config_poll_interval=float(os.getenv('CONFIG_POLL_INTERVAL', DEFAULT_CONFIG_POLL_INTERVAL)),
+        metrics=metrics,
+        alerts=AlertEvaluator.from_env(worker_id=os.getenv('WORKER_ID')) if os.getenv('ALERT_SINKS') else None,
+        alert_options={
+            'sinks': os.getenv('ALERT_SINKS', ''),
+            'interval': float(os.getenv('ALERT_BATCH_INTERVAL', DEFAULT_ALERT_INTERVAL)),
+        },
+        pool_options={
+            'connect_timeout': float(os.getenv('CONNECT_TIMEOUT', 5)),
+            'max_connections_per_origin': int(os.getenv('MAX_CONNECTIONS_PER_ORIGIN', 20)),
+            'http2': os.getenv('HTTP2', '0') == '1',
+        },
+    )
+    await worker.run(stop_event)
 
 def signal_handler(signum, frame):
     """Hantera shutdown signaler"""
@@ -103,34 +801,59 @@ def signal_handler(signum, frame):
     running = False
 
 def main():
+    # MONITOR_MODE=multi kör många kanaler i samma process
+    if os.getenv('MONITOR_MODE', 'single') == 'multi':
+        logger.info("🚀 Monitor service startar i multi-läge...")
+        asyncio.run(run_worker())
+        logger.info("👋 Monitor service avslutas...")
+        sys.exit(0)
+
     # Registrera signal handlers
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
     
     logger.info("🚀 Monitor service startar...")
+    configure_tracing(float(os.getenv('TRACE_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)))
     
     # Hämta miljövariabler
     channel_url = os.getenv('CHANNEL_URL')
     if not channel_url:
         logger.error("❌ Ingen CHANNEL_URL angiven i miljövariabler")
         exit(1)
+
+    settings = get_settings(os.getenv('DATABASE_SERVICE_URL')) if os.getenv('DATABASE_SERVICE_URL') else dict(DEFAULT_SETTINGS)
         
+    interval = settings['monitor_interval']
+    # Kontroller hoppas över en tid efter upprepade fel istället för att vänta ut retries
+    breaker = CircuitBreaker(int(os.getenv('CHANNEL_FAILURE_THRESHOLD', DEFAULT_CHANNEL_FAILURE_THRESHOLD)))
     while running:  # Använd running flaggan istället för True
+        # Läs om inställningarna varje varv, oförändrade kostar bara ett 304
+        if os.getenv('DATABASE_SERVICE_URL'):
+            settings = get_settings(os.getenv('DATABASE_SERVICE_URL'))
+            interval = settings['monitor_interval']
         try:
             logger.info("\n=== Stream Status Kontroll ===")
             logger.info(f"URL: {channel_url}")
-            logger.info("Kontrollintervall: 10 sekunder")
+            logger.info(f"Kontrollintervall: {interval} sekunder")
             
-            status = check_stream_status(channel_url)
-            logger.info(f"✅ Status: {status}")
-            logger.info("⏳ Väntar 10 sekunder till nästa kontroll...")
+            if not breaker.allow():
+                logger.warning(f"⛔ Hoppar över kontrollen efter upprepade fel, nytt försök om "
+                               f"{breaker.blocked_for():.0f}s")
+            else:
+                status, message = check_stream_status(channel_url, settings['stream_timeout'])
+                if status == RED:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                logger.info(f"✅ Status: {message}")
+            logger.info(f"⏳ Väntar {interval} sekunder till nästa kontroll...")
             logger.info("================================\n")
                 
         except Exception as e:
             logger.error(f"❌ Fel vid kontroll av ström: {e}")
         
         # Använd kortare sleep-intervaller för snabbare shutdown
-        for _ in range(10):
+        for _ in range(interval):
             if not running:
                 break
             time.sleep(1)
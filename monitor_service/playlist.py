@@ -0,0 +1,227 @@
+import re
+from collections import deque
+
+# Antal senaste segment (URI + längd) som sparas per playlist
+DEFAULT_RECENT_SEGMENTS = 3
+
+_ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def parse_attributes(value):
+    """Tolka en HLS attributlista (NAMN=värde,NAMN="värde") till en dict"""
+    return {key: val.strip('"') for key, val in _ATTR_RE.findall(value)}
+
+
+class Variant:
+    """En kvalitetsnivå (EXT-X-STREAM-INF) i en master playlist"""
+    __slots__ = ('uri', 'bandwidth', 'resolution', 'codecs', 'audio', 'subtitles')
+
+    def __init__(self, uri=None, bandwidth=None, resolution=None, codecs=None, audio=None, subtitles=None):
+        self.uri = uri
+        self.bandwidth = bandwidth
+        self.resolution = resolution
+        self.codecs = codecs
+        self.audio = audio
+        self.subtitles = subtitles
+
+    @classmethod
+    def from_attributes(cls, attrs):
+        bandwidth = attrs.get('BANDWIDTH')
+        return cls(
+            bandwidth=int(bandwidth) if bandwidth else None,
+            resolution=attrs.get('RESOLUTION'),
+            codecs=attrs.get('CODECS'),
+            audio=attrs.get('AUDIO'),
+            subtitles=attrs.get('SUBTITLES'),
+        )
+
+
+class MediaRendition:
+    """En alternativ rendition (EXT-X-MEDIA), t.ex. ljud eller undertexter"""
+    __slots__ = ('type', 'group_id', 'name', 'language', 'uri')
+
+    def __init__(self, type=None, group_id=None, name=None, language=None, uri=None):
+        self.type = type
+        self.group_id = group_id
+        self.name = name
+        self.language = language
+        self.uri = uri
+
+
+class PlaylistSummary:
+    """
+    Kompakt sammanfattning av en playlist med bara de fält monitorn använder.
+    Endast de senaste segmenten sparas, oavsett hur lång playlisten är.
+    """
+    __slots__ = ('is_master', 'media_sequence', 'target_duration', 'segment_count', 'skipped_segments',
+                 'discontinuities', 'endlist', 'playlist_type', 'can_skip_until', 'can_block_reload',
+                 'recent_uris', 'recent_durations', 'variants', 'media')
+
+    def __init__(self, recent=DEFAULT_RECENT_SEGMENTS):
+        self.is_master = False
+        self.media_sequence = 0
+        self.target_duration = None
+        self.segment_count = 0
+        self.skipped_segments = 0
+        self.discontinuities = 0
+        self.endlist = False
+        self.playlist_type = None
+        self.can_skip_until = None
+        self.can_block_reload = False
+        self.recent_uris = deque(maxlen=recent)
+        self.recent_durations = deque(maxlen=recent)
+        self.variants = []
+        self.media = []
+
+    @property
+    def total_segments(self):
+        """Antal segment inklusive de som utelämnats i en delta playlist"""
+        return self.skipped_segments + self.segment_count
+
+    @property
+    def next_msn(self):
+        """Media sequence för nästa segment som ännu inte publicerats"""
+        if not self.segment_count:
+            return None
+        return self.media_sequence + self.total_segments
+
+    @property
+    def last_uri(self):
+        return self.recent_uris[-1] if self.recent_uris else None
+
+    @property
+    def recent_segments(self):
+        """De senaste segmenten som (uri, längd), äldst först"""
+        return list(zip(self.recent_uris, self.recent_durations))
+
+    def as_dict(self):
+        return {
+            'is_master': self.is_master,
+            'media_sequence': self.media_sequence,
+            'target_duration': self.target_duration,
+            'segment_count': self.segment_count,
+            'skipped_segments': self.skipped_segments,
+            'discontinuities': self.discontinuities,
+            'endlist': self.endlist,
+            'playlist_type': self.playlist_type,
+            'can_skip_until': self.can_skip_until,
+            'can_block_reload': self.can_block_reload,
+            'recent_segments': self.recent_segments,
+            'variants': [(v.uri, v.bandwidth, v.resolution) for v in self.variants],
+            'media': [(m.type, m.group_id, m.uri) for m in self.media],
+        }
+
+
+class PlaylistParser:
+    """
+    Inkrementell M3U8-parser. Matas med bytes i godtyckliga bitar via feed()
+    och bygger en PlaylistSummary utan att hålla hela texten i minnet.
+    """
+
+    def __init__(self, recent=DEFAULT_RECENT_SEGMENTS):
+        self.summary = PlaylistSummary(recent)
+        self._buffer = b''
+        self._duration = None
+        self._variant = None
+
+    def feed(self, chunk):
+        lines = (self._buffer + chunk).split(b'\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            self._line(line)
+
+    def close(self):
+        if self._buffer:
+            self._line(self._buffer)
+            self._buffer = b''
+        return self.summary
+
+    def _line(self, raw):
+        line = raw.strip()
+        if not line:
+            return
+        summary = self.summary
+
+        if not line.startswith(b'#'):
+            uri = line.decode()
+            if self._variant is not None:
+                self._variant.uri = uri
+                summary.variants.append(self._variant)
+                self._variant = None
+            else:
+                summary.segment_count += 1
+                summary.recent_uris.append(uri)
+                summary.recent_durations.append(self._duration or 0.0)
+                self._duration = None
+            return
+
+        if line.startswith(b'#EXTINF:'):
+            self._duration = float(line[8:].split(b',', 1)[0])
+        elif line == b'#EXT-X-DISCONTINUITY':
+            summary.discontinuities += 1
+        elif line.startswith(b'#EXT-X-MEDIA-SEQUENCE:'):
+            summary.media_sequence = int(line[22:])
+        elif line.startswith(b'#EXT-X-TARGETDURATION:'):
+            summary.target_duration = int(float(line[22:]))
+        elif line == b'#EXT-X-ENDLIST':
+            summary.endlist = True
+        elif line.startswith(b'#EXT-X-PLAYLIST-TYPE:'):
+            summary.playlist_type = line[21:].decode().lower()
+        elif line.startswith(b'#EXT-X-SKIP:'):
+            attrs = parse_attributes(line[12:].decode())
+            summary.skipped_segments = int(attrs.get('SKIPPED-SEGMENTS', 0))
+        elif line.startswith(b'#EXT-X-SERVER-CONTROL:'):
+            attrs = parse_attributes(line[22:].decode())
+            if 'CAN-SKIP-UNTIL' in attrs:
+                summary.can_skip_until = float(attrs['CAN-SKIP-UNTIL'])
+            summary.can_block_reload = attrs.get('CAN-BLOCK-RELOAD') == 'YES'
+        elif line.startswith(b'#EXT-X-STREAM-INF:'):
+            summary.is_master = True
+            self._variant = Variant.from_attributes(parse_attributes(line[18:].decode()))
+        elif line.startswith(b'#EXT-X-MEDIA:'):
+            summary.is_master = True
+            attrs = parse_attributes(line[13:].decode())
+            summary.media.append(MediaRendition(
+                type=attrs.get('TYPE'),
+                group_id=attrs.get('GROUP-ID'),
+                name=attrs.get('NAME'),
+                language=attrs.get('LANGUAGE'),
+                uri=attrs.get('URI'),
+            ))
+
+
+def parse_playlist(data, recent=DEFAULT_RECENT_SEGMENTS):
+    """Parsa en hel playlist (str eller bytes) till en PlaylistSummary"""
+    parser = PlaylistParser(recent)
+    parser.feed(data.encode() if isinstance(data, str) else data)
+    return parser.close()
+
+
+def as_summary(playlist, recent=DEFAULT_RECENT_SEGMENTS):
+    """Gör om ett m3u8.M3U8-objekt till en PlaylistSummary (returnerar summaries oförändrade)"""
+    if playlist is None or isinstance(playlist, PlaylistSummary):
+        return playlist
+
+    summary = PlaylistSummary(recent)
+    summary.is_master = bool(playlist.playlists or playlist.media)
+    summary.media_sequence = playlist.media_sequence or 0
+    summary.target_duration = playlist.target_duration
+    summary.segment_count = len(playlist.segments)
+    summary.skipped_segments = getattr(playlist.skip, 'skipped_segments', None) or 0
+    summary.discontinuities = sum(1 for segment in playlist.segments if segment.discontinuity)
+    summary.endlist = bool(playlist.is_endlist)
+    summary.playlist_type = playlist.playlist_type
+    server_control = playlist.server_control
+    if server_control is not None:
+        summary.can_skip_until = server_control.can_skip_until
+        summary.can_block_reload = server_control.can_block_reload == 'YES'
+    for segment in playlist.segments[-summary.recent_uris.maxlen:]:
+        summary.recent_uris.append(segment.uri)
+        summary.recent_durations.append(segment.duration or 0.0)
+    for variant in playlist.playlists:
+        info = variant.stream_info
+        resolution = f"{info.resolution[0]}x{info.resolution[1]}" if info.resolution else None
+        summary.variants.append(Variant(variant.uri, info.bandwidth, resolution, info.codecs, info.audio, info.subtitles))
+    for media in playlist.media:
+        summary.media.append(MediaRendition(media.type, media.group_id, media.name, media.language, media.uri))
+    return summary
@@ -0,0 +1,83 @@
+import time
+
+from .tracing import start_trace
+
+# Långsammare än så här jämfört med realtid flaggas renditionen
+DEFAULT_MIN_REALTIME_FACTOR = 1.0
+
+
+class SegmentProbe:
+    """Mätvärden från nedladdning av ett eller flera segment"""
+    __slots__ = ('url', 'status_code', 'ttfb', 'download_time', 'bytes', 'media_duration', 'partial')
+
+    def __init__(self, url):
+        self.url = url
+        self.status_code = None
+        self.ttfb = None
+        self.download_time = 0.0
+        self.bytes = 0
+        self.media_duration = 0.0
+        self.partial = False
+
+    @property
+    def throughput(self):
+        """Effektiv genomströmning i bit/s"""
+        if not self.download_time:
+            return None
+        return self.bytes * 8 / self.download_time
+
+    def realtime_factor(self, bandwidth=None):
+        """
+        Hur många gånger snabbare än realtid segmentet laddades ned (<1 = långsammare).
+        Hela segment jämförs mot segmentlängden, delvisa (Range) mot BANDWIDTH.
+        """
+        if not self.partial and self.media_duration and self.download_time:
+            return self.media_duration / self.download_time
+        throughput = self.throughput
+        if bandwidth and throughput:
+            return throughput / bandwidth
+        return None
+
+    def add(self, other):
+        """Slå ihop med mätningen av ytterligare ett segment"""
+        self.ttfb = other.ttfb if self.ttfb is None else max(self.ttfb, other.ttfb)
+        self.status_code = other.status_code
+        self.download_time += other.download_time
+        self.bytes += other.bytes
+        self.media_duration += other.media_duration
+        self.partial = self.partial or other.partial
+        return self
+
+
+async def probe_segment(client, url, media_duration=None, range_bytes=None):
+    """
+    Ladda ned ett segment strömmande utan att buffra det i minnet och mät
+    time-to-first-byte, total nedladdningstid och antal bytes.
+    Med range_bytes hämtas bara början av segmentet (HTTP Range).
+    """
+    probe = SegmentProbe(url)
+    probe.media_duration = media_duration or 0.0
+    headers = {'Range': f'bytes=0-{range_bytes - 1}'} if range_bytes else {}
+
+    trace = start_trace('segment', url)
+    kwargs = {'extensions': trace.extensions()} if trace is not None else {}
+    started = time.perf_counter()
+    try:
+        async with client.stream('GET', url, headers=headers, **kwargs) as response:
+            response.raise_for_status()
+            probe.status_code = response.status_code
+            async for chunk in response.aiter_raw():
+                if probe.ttfb is None:
+                    probe.ttfb = time.perf_counter() - started
+                probe.bytes += len(chunk)
+                # Servrar som ignorerar Range ger 200, sluta läsa efter range_bytes ändå
+                if range_bytes and probe.bytes >= range_bytes:
+                    break
+    finally:
+        if trace is not None:
+            trace.emit(status=probe.status_code, bytes=probe.bytes)
+    probe.download_time = time.perf_counter() - started
+    if probe.ttfb is None:
+        probe.ttfb = probe.download_time
+    probe.partial = bool(range_bytes) and (response.status_code == 206 or probe.bytes >= range_bytes)
+    return probe
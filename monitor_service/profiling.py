@@ -0,0 +1,137 @@
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBUG_HOST = '127.0.0.1'
+MAX_PROFILE_SECONDS = 60
+LOOP_TIMEOUT = 5
+
+
+def thread_stacks():
+    """Aktuell stack för alla trådar i processen"""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    out = []
+    for ident, frame in sys._current_frames().items():
+        out.append(f"--- tråd {names.get(ident, '?')} ({ident})\n")
+        out.extend(traceback.format_stack(frame))
+    return ''.join(out)
+
+
+def task_stacks():
+    """Stack för alla asyncio-tasks, körs på event-loopen"""
+    out = []
+    for task in asyncio.all_tasks():
+        out.append(f"--- task {task.get_name()} ({task.get_coro().__qualname__})\n")
+        buffer = io.StringIO()
+        task.print_stack(limit=20, file=buffer)
+        out.append(buffer.getvalue())
+    return ''.join(out)
+
+
+class DebugServer:
+    """
+    Felsökning av en körande worker över HTTP, i en egen tråd.
+
+    /debug/stacks            stackar för alla trådar
+    /debug/tasks             stackar för alla asyncio-tasks
+    /debug/profile?seconds=N cProfile av event-loopen i N sekunder (sort=cumulative|tottime)
+
+    Inget körs förrän en endpoint anropas, profilering startas och stoppas på loopens tråd.
+    """
+
+    def __init__(self, loop, host=DEFAULT_DEBUG_HOST, port=0):
+        self.loop = loop
+        self.host = host
+        self.port = port
+        self._profile_lock = threading.Lock()
+        self.server = None
+
+    def start(self):
+        debug = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                status, body = debug.handle(url.path, parse_qs(url.query))
+                data = body.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/plain; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name='debug-server', daemon=True).start()
+        logger.info(f"🔍 Debug-endpoints på {self.host}:{self.port}")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def handle(self, path, query):
+        if path == '/debug/stacks':
+            return 200, thread_stacks()
+        if path == '/debug/tasks':
+            return self.tasks()
+        if path == '/debug/profile':
+            try:
+                seconds = min(float(query.get('seconds', ['10'])[0]), MAX_PROFILE_SECONDS)
+            except ValueError:
+                return 400, "seconds must be a number\n"
+            return self.profile(seconds, query.get('sort', ['cumulative'])[0])
+        return 404, "Not found\n"
+
+    def _on_loop(self, fn):
+        """Kör fn på event-loopen och vänta på resultatet, None om loopen inte svarar"""
+        done = threading.Event()
+        result = []
+
+        def call():
+            try:
+                result.append(fn())
+            finally:
+                done.set()
+
+        self.loop.call_soon_threadsafe(call)
+        if not done.wait(LOOP_TIMEOUT):
+            return None
+        return result[0] if result else None
+
+    def tasks(self):
+        body = self._on_loop(task_stacks)
+        if body is None:
+            return 503, "Event-loopen svarar inte, se /debug/stacks\n" + thread_stacks()
+        return 200, body
+
+    def profile(self, seconds, sort):
+        if sort not in ('cumulative', 'tottime', 'calls'):
+            return 400, "sort must be cumulative, tottime or calls\n"
+        if not self._profile_lock.acquire(blocking=False):
+            return 409, "A profile is already running\n"
+        try:
+            profiler = cProfile.Profile()
+            if self._on_loop(lambda: profiler.enable() or True) is None:
+                return 503, "Event-loopen svarar inte, se /debug/stacks\n"
+            time.sleep(seconds)
+            self._on_loop(profiler.disable)
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats(sort).print_stats(40)
+            return 200, buffer.getvalue()
+        finally:
+            self._profile_lock.release()
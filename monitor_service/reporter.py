@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_MAX_BUFFERED = 50000
+
+
+def result_rows(result):
+    """Gör om en ChannelStatus till rader för /results: en för kanalen och en per rendition"""
+    rows = [{
+        'channel_id': result.channel_id,
+        'rendition': '',
+        'checked_at': result.checked_at,
+        'status': result.status,
+        'message': result.message,
+        'check_duration': result.duration,
+    }]
+    for rendition in result.renditions:
+        rows.append({
+            'channel_id': result.channel_id,
+            'rendition': rendition.uri,
+            'checked_at': result.checked_at,
+            'status': rendition.status,
+            'message': rendition.message,
+            'segment_count': rendition.segment_count,
+            'media_sequence': rendition.media_sequence,
+            'response_time': rendition.response_time,
+            'ttfb': rendition.ttfb,
+            'download_time': rendition.download_time,
+            'throughput': rendition.throughput,
+            'realtime_factor': rendition.realtime_factor,
+            'stall_seconds': rendition.stall_seconds,
+        })
+    return rows
+
+
+class ResultBuffer:
+    """
+    Buffrar kontrollresultat och skickar dem i batchar till databastjänstens /results.
+    Töms när batch_size rader samlats eller efter flush_interval sekunder.
+    Bufferten är begränsad till max_buffered rader, de äldsta släpps om databasen inte svarar.
+    """
+
+    def __init__(self, database_url, client, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_buffered=DEFAULT_MAX_BUFFERED):
+        self.url = f"{database_url}/results"
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows = deque(maxlen=max_buffered)
+        self.dropped = 0
+        self.sent = 0
+        self._full = asyncio.Event()
+
+    def add(self, result):
+        for row in result_rows(result):
+            if len(self.rows) == self.rows.maxlen:
+                self.dropped += 1
+            self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self._full.set()
+
+    async def flush(self):
+        """Skicka allt som buffrats. Returnerar False om databastjänsten inte tog emot."""
+        while self.rows:
+            batch = [self.rows.popleft() for _ in range(min(self.batch_size, len(self.rows)))]
+            try:
+                response = await self.client.post(self.url, json={'results': batch})
+                response.raise_for_status()
+            except Exception as e:
+                # Lägg tillbaka batchen först i kön och försök igen vid nästa flush. Har nya rader
+                # fyllt bufferten under tiden släpps batchens äldsta rader, inte de nyaste.
+                overflow = len(self.rows) + len(batch) - self.rows.maxlen
+                if overflow > 0:
+                    self.dropped += overflow
+                    batch = batch[overflow:]
+                self.rows.extendleft(reversed(batch))
+                logger.error(f"❌ Kunde inte skicka {len(batch)} resultat till databasen: {e}")
+                return False
+            self.sent += len(batch)
+        return True
+
+    async def run(self, stop_event):
+        """Töm bufferten periodiskt tills stop_event sätts, och en sista gång därefter"""
+        while not stop_event.is_set():
+            waiters = [asyncio.ensure_future(self._full.wait()), asyncio.ensure_future(stop_event.wait())]
+            try:
+                await asyncio.wait(waiters, timeout=self.flush_interval, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+            self._full.clear()
+            await self.flush()
+        await self.flush()
@@ -0,0 +1,247 @@
+import os
+import random
+import time
+from urllib.parse import urlsplit
+
+from .status import RED, ERROR_CONNECT, ERROR_MANIFEST, ERROR_TIMEOUT
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_ORIGIN_FAILURE_THRESHOLD = 5
+DEFAULT_CHANNEL_FAILURE_THRESHOLD = 3
+DEFAULT_RECOVERY_TIMEOUT = 30.0
+DEFAULT_MAX_RECOVERY_TIMEOUT = 300.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BASE = 1.0
+# Retries per origin får högst vara så här stor andel av de ordinarie kontrollerna
+DEFAULT_RETRY_RATIO = 0.1
+# ... plus en liten grundnivå så att origins med få kanaler också kan göra om
+DEFAULT_RETRY_MIN_PER_SECOND = 0.2
+DEFAULT_RETRY_MAX_TOKENS = 10.0
+
+# Fel där origin inte svarade som den skulle, de räknas mot origin-brytaren och görs om
+ORIGIN_ERRORS = (ERROR_MANIFEST, ERROR_CONNECT, ERROR_TIMEOUT)
+
+
+def origin_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+def failure_class(result):
+    """Felklassen för en röd kontroll (kanalens eller första röda renditionens), annars None"""
+    if result is None or result.status != RED:
+        return None
+    if result.error:
+        return result.error
+    for rendition in result.renditions:
+        if rendition.status == RED and rendition.error:
+            return rendition.error
+    return None
+
+
+def is_origin_failure(error):
+    return error in ORIGIN_ERRORS or (error or '').startswith('http_5')
+
+
+def is_request_failure(error):
+    """Anropet misslyckades (till skillnad från t.ex. en stoppad men svarande playlist)"""
+    return is_origin_failure(error) or (error or '').startswith('http_')
+
+
+class CircuitBreaker:
+    """
+    Brytare med stängd, öppen och halvöppen status.
+
+    Efter failure_threshold fel i rad öppnas den och släpper inte igenom något på
+    recovery_timeout sekunder. Därefter släpps ett anrop igenom som prov: lyckas det
+    stängs brytaren, annars öppnas den igen med dubbel väntetid (högst max_recovery_timeout).
+    """
+    __slots__ = ('failure_threshold', 'recovery_timeout', 'max_recovery_timeout', 'clock',
+                 'state', 'failures', 'opened_at', 'open_for')
+
+    def __init__(self, failure_threshold, recovery_timeout=DEFAULT_RECOVERY_TIMEOUT,
+                 max_recovery_timeout=DEFAULT_MAX_RECOVERY_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.open_for = recovery_timeout
+
+    def blocked_for(self):
+        """Sekunder tills ett anrop släpps igenom, 0 om allow() skulle returnera True"""
+        if self.state == CLOSED:
+            return 0.0
+        # Ett prov som aldrig rapporterades räknas som förlorat efter recovery_timeout
+        wait = self.open_for if self.state == OPEN else self.recovery_timeout
+        return max(0.0, self.opened_at + wait - self.clock())
+
+    def allow(self):
+        """Släpp igenom ett anrop. En öppen brytare vars väntetid gått ut blir halvöppen."""
+        if self.blocked_for() > 0:
+            return False
+        if self.state != CLOSED:
+            self.state = HALF_OPEN
+            self.opened_at = self.clock()
+        return True
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.open_for = self.recovery_timeout
+
+    def record_failure(self):
+        if self.state == HALF_OPEN:
+            self.open_for = min(self.open_for * 2, self.max_recovery_timeout)
+            self._open()
+            return
+        self.failures += 1
+        if self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = self.clock()
+
+
+class RetryBudget:
+    """
+    Token bucket för retries mot en origin. Varje ordinarie kontroll sätter in ratio
+    token och tiden fyller på min_per_second, varje retry tar ett helt token.
+    Ett avbrott som slår ut många kanaler samtidigt ger därför bara några få retries.
+    """
+    __slots__ = ('ratio', 'min_per_second', 'max_tokens', 'clock', 'tokens', 'updated')
+
+    def __init__(self, ratio=DEFAULT_RETRY_RATIO, min_per_second=DEFAULT_RETRY_MIN_PER_SECOND,
+                 max_tokens=DEFAULT_RETRY_MAX_TOKENS, clock=time.monotonic):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.clock = clock
+        self.tokens = max_tokens
+        self.updated = clock()
+
+    def _refill(self, amount=0.0):
+        now = self.clock()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self.updated) * self.min_per_second + amount)
+        self.updated = now
+
+    def deposit(self):
+        self._refill(self.ratio)
+
+    def withdraw(self):
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class FailurePolicy:
+    """
+    Felhantering för en worker utan att blockera event-loopen: brytare per origin och
+    per kanal, samt retries som planeras in på schemaläggaren inom en budget per origin.
+    """
+
+    def __init__(self, origin_failure_threshold=DEFAULT_ORIGIN_FAILURE_THRESHOLD,
+                 channel_failure_threshold=DEFAULT_CHANNEL_FAILURE_THRESHOLD,
+                 recovery_timeout=DEFAULT_RECOVERY_TIMEOUT, max_recovery_timeout=DEFAULT_MAX_RECOVERY_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, retry_base=DEFAULT_RETRY_BASE, retry_ratio=DEFAULT_RETRY_RATIO,
+                 clock=time.monotonic, rng=random):
+        self.origin_failure_threshold = origin_failure_threshold
+        self.channel_failure_threshold = channel_failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_ratio = retry_ratio
+        self.clock = clock
+        self.rng = rng
+        self.origins = {}
+        self.channels = {}
+        self.budgets = {}
+        self.retries_denied = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            origin_failure_threshold=int(os.getenv('ORIGIN_FAILURE_THRESHOLD', DEFAULT_ORIGIN_FAILURE_THRESHOLD)),
+            channel_failure_threshold=int(os.getenv('CHANNEL_FAILURE_THRESHOLD', DEFAULT_CHANNEL_FAILURE_THRESHOLD)),
+            recovery_timeout=float(os.getenv('CIRCUIT_RECOVERY_TIMEOUT', DEFAULT_RECOVERY_TIMEOUT)),
+            max_retries=int(os.getenv('MAX_RETRIES', DEFAULT_MAX_RETRIES)),
+            retry_ratio=float(os.getenv('RETRY_BUDGET_RATIO', DEFAULT_RETRY_RATIO)),
+        )
+
+    def _breaker(self, breakers, key, threshold):
+        breaker = breakers.get(key)
+        if breaker is None:
+            breaker = breakers[key] = CircuitBreaker(threshold, self.recovery_timeout, self.max_recovery_timeout,
+                                                     self.clock)
+        return breaker
+
+    def _origin(self, url):
+        return self._breaker(self.origins, origin_of(url), self.origin_failure_threshold)
+
+    def _channel(self, channel_id):
+        return self._breaker(self.channels, channel_id, self.channel_failure_threshold)
+
+    def _budget(self, url):
+        origin = origin_of(url)
+        budget = self.budgets.get(origin)
+        if budget is None:
+            budget = self.budgets[origin] = RetryBudget(self.retry_ratio, clock=self.clock)
+        return budget
+
+    def before_check(self, channel_id, url):
+        """None om kanalen får kontrolleras nu, annars sekunder tills brytarna släpper igenom den"""
+        origin, channel = self._origin(url), self._channel(channel_id)
+        wait = max(origin.blocked_for(), channel.blocked_for())
+        if wait > 0:
+            return wait
+        origin.allow()
+        channel.allow()
+        return None
+
+    def after_check(self, channel_id, url, result, attempt=0):
+        """
+        Uppdatera brytarna med resultatet. Returnerar väntetid till ett nytt försök om
+        kontrollen ska göras om, annars None (resultatet är då slutgiltigt).
+        """
+        origin, channel = self._origin(url), self._channel(channel_id)
+        budget = self._budget(url)
+        if attempt == 0:
+            budget.deposit()
+
+        error = failure_class(result)
+        if not is_request_failure(error):
+            # Origin svarade, även om playlisten t.ex. har stannat
+            origin.record_success()
+            channel.record_success()
+            return None
+
+        # Origin-brytaren räknar misslyckade anrop, så att ett avbrott stoppar omförsöken direkt
+        if is_origin_failure(error):
+            origin.record_failure()
+        else:
+            origin.record_success()
+
+        if (is_origin_failure(error) and attempt < self.max_retries
+                and origin.state == CLOSED and channel.state == CLOSED):
+            if budget.withdraw():
+                # Exponentiell backoff med jitter så att kanalerna inte försöker igen i takt
+                return self.retry_base * (2 ** attempt) * self.rng.uniform(0.5, 1.0)
+            self.retries_denied += 1
+        # Kanalbrytaren räknar slutresultat, ett försök som görs om är ingen misslyckad kontroll
+        channel.record_failure()
+        return None
+
+    def forget(self, channel_id):
+        self.channels.pop(channel_id, None)
+
+    def open_circuits(self):
+        return sum(1 for breaker in self.origins.values() if breaker.state != CLOSED) + \
+            sum(1 for breaker in self.channels.values() if breaker.state != CLOSED)
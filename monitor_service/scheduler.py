@@ -0,0 +1,102 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+from .stall import ADVANCING, RESET
+
+DEFAULT_JITTER = 0.1
+DEFAULT_MIN_INTERVAL = 1.0
+
+
+def jittered(delay, fraction=DEFAULT_JITTER, rng=random):
+    """Sprid ut en väntetid med ±fraction så att kanaler inte pollar i takt"""
+    if fraction <= 0:
+        return delay
+    return delay * rng.uniform(1 - fraction, 1 + fraction)
+
+
+def poll_interval(result, default, min_interval=DEFAULT_MIN_INTERVAL):
+    """
+    Tid till nästa kontroll enligt HLS reload-reglerna: en target duration om
+    någon playlist uppdaterats sedan förra gången, annars en halv target duration.
+    Utan känd target duration används default (monitor_interval).
+    """
+    durations = [r.target_duration for r in result.renditions if r.target_duration] if result is not None else []
+    if not durations:
+        return max(default, min_interval)
+    target = min(durations)
+    changed = any(r.stall_verdict in (ADVANCING, RESET) for r in result.renditions)
+    return max(target if changed else target / 2, min_interval)
+
+
+class PollScheduler:
+    """
+    Heap-baserad schemaläggare för många kanaler i en worker.
+
+    Varje nyckel har högst en giltig tidpunkt. Omplanering lägger till en ny
+    post och markerar den gamla som inaktuell, så både schedule och remove
+    är O(log n) och inaktuella poster hoppas över när de når toppen.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._heap = []
+        self._due = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, key):
+        return key in self._due
+
+    def schedule(self, key, delay):
+        """Planera key att köras om delay sekunder (ersätter tidigare planering)"""
+        due = self.clock() + max(0.0, delay)
+        token = next(self._counter)
+        self._due[key] = (due, token)
+        heapq.heappush(self._heap, (due, token, key))
+        if self._heap[0][1] == token:
+            self._wakeup.set()
+
+    def remove(self, key):
+        self._due.pop(key, None)
+
+    def pop_due(self):
+        """Plocka alla nycklar vars tid har passerat som (key, lateness)"""
+        now = self.clock()
+        due_keys = []
+        while self._heap and self._heap[0][0] <= now:
+            due, token, key = heapq.heappop(self._heap)
+            if self._due.get(key, (None, None))[1] != token:
+                continue
+            del self._due[key]
+            due_keys.append((key, now - due))
+        return due_keys
+
+    def next_delay(self):
+        """Sekunder till nästa giltiga post, None om inget är planerat"""
+        while self._heap:
+            due, token, key = self._heap[0]
+            if self._due.get(key, (None, None))[1] == token:
+                return max(0.0, due - self.clock())
+            heapq.heappop(self._heap)
+        return None
+
+    async def run(self, dispatch, stop_event):
+        """Anropa dispatch(key, lateness) för varje post när den förfaller tills stop_event sätts"""
+        while not stop_event.is_set():
+            for key, lateness in self.pop_due():
+                dispatch(key, lateness)
+
+            self._wakeup.clear()
+            delay = self.next_delay()
+            waiters = [asyncio.ensure_future(self._wakeup.wait()), asyncio.ensure_future(stop_event.wait())]
+            try:
+                await asyncio.wait(waiters, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
@@ -0,0 +1,110 @@
+import time
+from array import array
+
+# En playlist som inte rört sig på så här många target durations räknas som stoppad
+DEFAULT_STALL_FACTOR = 3.0
+# Antal observationer som sparas per rendition
+DEFAULT_HISTORY = 16
+# Target duration att räkna med om playlisten saknar EXT-X-TARGETDURATION
+FALLBACK_TARGET_DURATION = 10
+
+ADVANCING = 'advancing'
+WAITING = 'waiting'
+STALLED = 'stalled'
+ENDED = 'ended'
+RESET = 'reset'
+
+
+class RenditionState:
+    """
+    Tillstånd för en rendition mellan kontroller.
+    Historiken är en ringbuffert med fast storlek, så varje observation är O(1)
+    och minnet per rendition är konstant.
+    """
+    __slots__ = ('position', 'last_uri', 'last_advance', 'target_duration', 'verdict', 'stall_seconds',
+                 '_times', '_positions', '_index', '_size')
+
+    def __init__(self, history=DEFAULT_HISTORY):
+        self.position = None
+        self.last_uri = None
+        self.last_advance = None
+        self.target_duration = None
+        self.verdict = None
+        self.stall_seconds = 0.0
+        self._times = array('d', bytes(8 * history))
+        self._positions = array('q', bytes(8 * history))
+        self._index = 0
+        self._size = 0
+
+    def observe(self, summary, now, stall_factor=DEFAULT_STALL_FACTOR):
+        """Registrera en ny playlist och returnera en bedömning"""
+        # Nästa media sequence som inte publicerats än, ökar när nya segment tillkommer
+        position = summary.media_sequence + summary.total_segments
+        last_uri = summary.last_uri
+        self.target_duration = summary.target_duration or FALLBACK_TARGET_DURATION
+
+        if self.position is None:
+            self.verdict = ADVANCING
+            self.last_advance = now
+        elif position > self.position or (position == self.position and last_uri != self.last_uri):
+            self.verdict = ADVANCING
+            self.last_advance = now
+        elif position < self.position:
+            # Media sequence gick bakåt, t.ex. omstartad encoder
+            self.verdict = RESET
+            self.last_advance = now
+        elif summary.endlist:
+            self.verdict = ENDED
+        elif now - self.last_advance > stall_factor * self.target_duration:
+            self.verdict = STALLED
+        else:
+            self.verdict = WAITING
+
+        self.stall_seconds = now - self.last_advance
+        self.position = position
+        self.last_uri = last_uri
+        self._record(now, position)
+        return self
+
+    def _record(self, now, position):
+        capacity = len(self._times)
+        self._times[self._index] = now
+        self._positions[self._index] = position
+        self._index = (self._index + 1) % capacity
+        self._size = min(self._size + 1, capacity)
+
+    def history(self):
+        """Sparade observationer som (tid, position), äldst först"""
+        capacity = len(self._times)
+        start = (self._index - self._size) % capacity
+        return [(self._times[(start + i) % capacity], self._positions[(start + i) % capacity]) for i in range(self._size)]
+
+    def advance_rate(self):
+        """Nya segment per sekund över historiken, None om det saknas underlag"""
+        observations = self.history()
+        if len(observations) < 2 or observations[-1][0] == observations[0][0]:
+            return None
+        (t0, p0), (t1, p1) = observations[0], observations[-1]
+        return (p1 - p0) / (t1 - t0)
+
+
+class ChannelState:
+    """Stall-tillstånd för alla renditioner i en kanal"""
+    __slots__ = ('renditions', 'stall_factor', 'history', 'clock')
+
+    def __init__(self, stall_factor=DEFAULT_STALL_FACTOR, history=DEFAULT_HISTORY, clock=time.monotonic):
+        self.renditions = {}
+        self.stall_factor = stall_factor
+        self.history = history
+        self.clock = clock
+
+    def observe(self, uri, summary):
+        state = self.renditions.get(uri)
+        if state is None:
+            state = self.renditions[uri] = RenditionState(self.history)
+        return state.observe(summary, self.clock(), self.stall_factor)
+
+    def retain(self, uris):
+        """Släpp tillstånd för renditioner som inte längre finns i master playlisten"""
+        for uri in set(self.renditions) - set(uris):
+            del self.renditions[uri]
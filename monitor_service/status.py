@@ -0,0 +1,110 @@
+import time
+
+# Statusnivåer, motsvarar grön/gul/röd i dashboarden
+GREEN = 'green'
+YELLOW = 'yellow'
+RED = 'red'
+
+# Felklasser för metrics och felsökning
+ERROR_MANIFEST = 'manifest'
+ERROR_STALLED = 'stalled'
+ERROR_NO_SEGMENTS = 'no_segments'
+ERROR_TIMEOUT = 'timeout'
+ERROR_CONNECT = 'connect'
+ERROR_SEGMENT = 'segment'
+ERROR_SLOW = 'slow'
+# Kontrollen gjordes inte, en brytare för kanalen eller dess origin är öppen
+ERROR_CIRCUIT_OPEN = 'circuit_open'
+
+_SEVERITY = {GREEN: 0, YELLOW: 1, RED: 2}
+
+
+class RenditionStatus:
+    """Resultat av en kontroll av en rendition (variant, ljud eller undertexter)"""
+    __slots__ = ('kind', 'name', 'uri', 'bandwidth', 'status', 'message',
+                 'segment_count', 'media_sequence', 'target_duration', 'response_time',
+                 'manifest_time', 'ttfb', 'download_time', 'bytes', 'throughput', 'realtime_factor',
+                 'stall_verdict', 'stall_seconds', 'error')
+
+    def __init__(self, kind, uri, name=None, bandwidth=None):
+        self.kind = kind
+        self.name = name
+        self.uri = uri
+        self.bandwidth = bandwidth
+        self.status = GREEN
+        self.message = None
+        self.segment_count = None
+        self.media_sequence = None
+        self.target_duration = None
+        self.response_time = None
+        self.manifest_time = None
+        self.ttfb = None
+        self.download_time = None
+        self.bytes = None
+        self.throughput = None
+        self.realtime_factor = None
+        self.stall_verdict = None
+        self.stall_seconds = None
+        self.error = None
+
+    def fail(self, status, message, error=None):
+        """Sätt en sämre status (en bättre status skriver aldrig över en sämre)"""
+        if _SEVERITY[status] >= _SEVERITY[self.status]:
+            self.status = status
+            self.message = message
+            self.error = error
+        return self
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class ChannelStatus:
+    """Resultat av en kontroll av en hel kanal med alla dess renditioner"""
+    __slots__ = ('channel_id', 'url', 'checked_at', 'duration', 'manifest_time', 'status', 'message', 'error',
+                 'renditions')
+
+    def __init__(self, channel_id, url):
+        self.channel_id = channel_id
+        self.url = url
+        self.checked_at = time.time()
+        self.duration = None
+        self.manifest_time = None
+        self.status = GREEN
+        self.message = None
+        self.error = None
+        self.renditions = []
+
+    def finish(self, started):
+        """Sammanställ kanalens status utifrån renditionerna"""
+        self.duration = time.perf_counter() - started
+        if self.status == RED:
+            return self
+        if not self.renditions:
+            self.status, self.message = RED, "Inga renditioner hittades"
+            return self
+
+        # Alla renditioner röda ger röd kanal, enstaka problem ger gul
+        failed = [r for r in self.renditions if r.status != GREEN]
+        if all(r.status == RED for r in self.renditions):
+            self.status = RED
+        elif failed:
+            self.status = YELLOW
+        else:
+            self.status = GREEN
+        if failed:
+            self.message = f"{len(failed)} av {len(self.renditions)} renditioner har problem"
+        else:
+            self.message = f"Alla {len(self.renditions)} renditioner är aktiva"
+        return self
+
+    def as_dict(self):
+        return {
+            'channel_id': self.channel_id,
+            'url': self.url,
+            'checked_at': self.checked_at,
+            'duration': self.duration,
+            'status': self.status,
+            'message': self.message,
+            'renditions': [r.as_dict() for r in self.renditions],
+        }
@@ -0,0 +1,193 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+import pytest
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service.alerts import (AlertEvaluator, FileSink, StdoutSink, WebhookSink, sinks_from_env, FIRING,
+                                    FLAPPING, RESOLVED, STABLE)
+from monitor_service.status import ChannelStatus, GREEN, RED
+
+
+def result(channel_id, status, origin="cdn-a.example"):
+    r = ChannelStatus(channel_id, f"https://{origin}/{channel_id}/master.m3u8")
+    r.status = status
+    return r
+
+
+def feed(evaluator, channel_id, statuses, origin="cdn-a.example"):
+    for status in statuses:
+        evaluator.observe(result(channel_id, status, origin))
+
+
+# ✅ Larmar först efter threshold röda i rad och återställs efter recovery_checks gröna
+def test_threshold_and_hysteresis(clock):
+    evaluator = AlertEvaluator(threshold=3, recovery_checks=2, clock=clock)
+    feed(evaluator, 1, [RED, RED, GREEN, RED, RED])
+    assert evaluator.take() == []
+    feed(evaluator, 1, [RED, RED, RED])
+    alerts = evaluator.take()
+    assert [(a['key'], a['state']) for a in alerts] == [("channel:1", FIRING)]
+    feed(evaluator, 1, [GREEN, RED, GREEN])
+    assert evaluator.take() == []
+    feed(evaluator, 1, [GREEN])
+    assert [a['state'] for a in evaluator.take()] == [RESOLVED]
+
+
+# ✅ En kanal som växlar ofta larmar en gång som flappande och sedan inte förrän den lugnat sig
+def test_flapping_is_deduplicated(clock):
+    evaluator = AlertEvaluator(threshold=1, recovery_checks=1, flap_threshold=4, flap_half_life=60, clock=clock)
+    feed(evaluator, 1, [RED, GREEN, RED, GREEN, RED, GREEN, RED, GREEN])
+    assert [a['state'] for a in evaluator.take()] == [FIRING, RESOLVED, FIRING, FLAPPING]
+    clock.now += 600
+    feed(evaluator, 1, [GREEN])
+    stable = evaluator.take()
+    assert [(a['state'], a['firing']) for a in stable] == [(STABLE, False)]
+
+
+# ✅ Många kanaler på samma origin blir ett origin-larm, andra origins larmar som vanligt
+def test_failures_grouped_by_origin(clock):
+    evaluator = AlertEvaluator(threshold=1, recovery_checks=1, group_min=3, clock=clock)
+    for channel_id in range(400):
+        feed(evaluator, channel_id, [RED])
+    feed(evaluator, 1000, [RED], origin="cdn-b.example")
+    alerts = evaluator.take()
+    assert [(a['key'], a['state']) for a in alerts] == [("origin:cdn-a.example", FIRING), ("channel:1000", FIRING)]
+    assert alerts[0]['channel_count'] == 400 and len(alerts[0]['channels']) == 50
+
+    # Kanaler bakom ett aktivt origin-larm larmar inte var för sig
+    feed(evaluator, 400, [RED])
+    for channel_id in range(399):
+        feed(evaluator, channel_id, [GREEN])
+    assert evaluator.take() == []
+    evaluator.forget(399)
+    feed(evaluator, 400, [GREEN])
+    assert [(a['key'], a['state']) for a in evaluator.take()] == [("origin:cdn-a.example", RESOLVED)]
+
+
+# ✅ Utvärderingen klarar tusentals resultat per sekund
+def test_observe_throughput():
+    evaluator = AlertEvaluator(threshold=5)
+    results = [result(i % 5000, RED if i % 7 else GREEN, f"cdn-{i % 20}.example") for i in range(50000)]
+    started = time.perf_counter()
+    for r in results:
+        evaluator.observe(r)
+    assert len(results) / (time.perf_counter() - started) > 20000
+
+
+# ✅ Sinks tar emot hela batchen, webhook skickar om det som inte gick fram
+@pytest.mark.asyncio
+async def test_sinks(tmp_path):
+    alerts = [{'key': 'channel:1', 'state': FIRING}]
+    stream = io.StringIO()
+    await StdoutSink(stream).send(alerts)
+    assert json.loads(stream.getvalue()) == alerts[0]
+
+    path = tmp_path / "alerts.jsonl"
+    sink = FileSink(str(path))
+    await sink.send(alerts)
+    await sink.send(alerts)
+    assert len(path.read_text().splitlines()) == 2
+
+    class Client:
+        def __init__(self):
+            self.posts, self.fail = [], True
+
+        async def post(self, url, json):
+            self.posts.append(json)
+            if self.fail:
+                raise ConnectionError("nere")
+            return type("Response", (), {"raise_for_status": lambda self: None})()
+
+    client = Client()
+    webhook = WebhookSink("https://hooks.example/x", client)
+    await webhook.send(alerts)
+    client.fail = False
+    await webhook.send([{'key': 'channel:2', 'state': FIRING}])
+    assert [a['key'] for a in client.posts[-1]['alerts']] == ['channel:1', 'channel:2']
+    assert webhook.unsent == []
+
+    assert [type(s) for s in sinks_from_env(f"stdout, file:{path}", None)] == [StdoutSink, FileSink]
+    with pytest.raises(ValueError):
+        sinks_from_env("pager", None)
+
+
+# ✅ run skickar batchar och en sista gång vid stopp
+@pytest.mark.asyncio
+async def test_run_flushes_on_stop():
+    evaluator = AlertEvaluator(threshold=1)
+    stream = io.StringIO()
+    stop_event = asyncio.Event()
+    task = asyncio.create_task(evaluator.run([StdoutSink(stream)], stop_event, interval=60))
+    feed(evaluator, 1, [RED])
+    stop_event.set()
+    await task
+    assert json.loads(stream.getvalue())['state'] == FIRING
+
+
+# ✅ Ett origin-avbrott bakom en öppen brytare ger ett origin-larm genom workern
+@pytest.mark.asyncio
+async def test_origin_outage_alerts_through_worker(clock):
+    import httpx
+    from monitor_service.monitor import MonitorWorker
+    from monitor_service.resilience import FailurePolicy
+    from monitor_service.scheduler import PollScheduler
+
+    evaluator = AlertEvaluator(threshold=5, group_min=3, clock=clock)
+    worker = MonitorWorker("http://database_service:5000", alerts=evaluator,
+                           failure_policy=FailurePolicy(max_retries=0, clock=clock))
+    worker.scheduler = PollScheduler()
+    worker.apply_channels([{"id": i, "url": f"https://cdn-a.example/{i}/master.m3u8"} for i in range(10)])
+    semaphore = asyncio.Semaphore(1)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(503))) as client:
+        for _ in range(5):
+            for channel_id in range(10):
+                worker.dispatch(client, semaphore, channel_id, 0)
+                await asyncio.gather(*worker.tasks.values())
+            clock.now += 10
+
+    # Efter fem fel (ORIGIN_FAILURE_THRESHOLD) görs inga anrop, men kanalerna räknas ändå som röda
+    assert worker.failure_policy.origins["cdn-a.example"].state != "closed"
+    alerts = evaluator.take()
+    assert [(a['key'], a['state'], a['channel_count']) for a in alerts] == [("origin:cdn-a.example", FIRING, 10)]
+    assert evaluator.channels[9].failures == 5
+    assert evaluator.firing() == 10
+
+
+# ✅ En larmande kanal som tas bort medan den kontrolleras hålls inte kvar i kanal- eller origin-larmet
+@pytest.mark.asyncio
+async def test_removed_channel_resolves_alerts(clock):
+    from unittest.mock import patch
+    from monitor_service.monitor import ChannelMonitor, MonitorWorker
+    from monitor_service.scheduler import PollScheduler
+
+    evaluator = AlertEvaluator(threshold=1, recovery_checks=1, group_min=2, clock=clock)
+    worker = MonitorWorker("http://database_service:5000", alerts=evaluator)
+    worker.scheduler = PollScheduler()
+    worker.apply_channels([{"id": i, "url": f"https://cdn-a.example/{i}/master.m3u8"} for i in (1, 2)])
+    feed(evaluator, 1, [RED])
+    feed(evaluator, 2, [RED])
+    assert [(a['key'], a['state']) for a in evaluator.take()] == [("origin:cdn-a.example", FIRING)]
+    release = asyncio.Event()
+
+    async def check(self, client, options):
+        await release.wait()
+        self.last_result = result(self.channel_id, RED)
+        return self.last_result
+
+    with patch.object(ChannelMonitor, 'check', check):
+        task = asyncio.create_task(worker.run_check(None, worker.monitors[2], asyncio.Semaphore(1), 10))
+        await asyncio.sleep(0)
+        worker.apply_channels([{"id": 1, "url": "https://cdn-a.example/1/master.m3u8"}])
+        release.set()
+        await task
+    feed(evaluator, 1, [GREEN])
+
+    assert 2 not in evaluator.channels
+    assert [(a['key'], a['state']) for a in evaluator.take()] == [("origin:cdn-a.example", RESOLVED)]
+    assert "cdn-a.example" not in evaluator.origins or not evaluator.origins["cdn-a.example"].firing
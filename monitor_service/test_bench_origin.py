@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service.benchmarks.bench_worker import regressions, without_option
+from monitor_service.benchmarks.origin import SyntheticOrigin
+
+
+# ✅ Media playlists går framåt i realtid, utom för stoppade kanaler efter stall_at
+def test_origin_playlists_advance_and_stall(clock):
+    origin = SyntheticOrigin(channels=4, ladder=2, stall_every=2, stall_at=10.0, clock=clock)
+    status, headers, body = origin.respond('GET', '/ch/1/master.m3u8', {}, b'')
+    assert status == 200 and body.count(b'#EXT-X-STREAM-INF') == 2
+    assert origin.respond('GET', '/ch/1/master.m3u8', {'if-none-match': headers['ETag']}, b'')[0] == 304
+
+    before = {i: origin.media_sequence(i) for i in (1, 2)}
+    clock.now += 20
+    assert origin.media_sequence(1) == before[1] + 10
+    assert origin.media_sequence(2) == before[2] + 5
+    _, headers, _ = origin.respond('GET', '/ch/2/v0/index.m3u8', {}, b'')
+    clock.now += 20
+    assert origin.respond('GET', '/ch/2/v0/index.m3u8', {'if-none-match': headers['ETag']}, b'')[0] == 304
+    assert origin.respond('GET', '/ch/9/v0/index.m3u8', {}, b'')[0] == 404
+
+
+# ✅ Segment med Range, injicerade fel och fejkade databas-API:t
+def test_origin_segments_errors_and_api():
+    origin = SyntheticOrigin(channels=2, segment_bytes=1000)
+    status, headers, body = origin.respond('GET', '/ch/0/v0/seg5.ts', {'range': 'bytes=0-99'}, b'')
+    assert (status, len(body), headers['Content-Range']) == (206, 100, 'bytes 0-99/1000')
+
+    channels = json.loads(origin.respond('GET', '/channels', {}, b'')[2])['channels']
+    assert [c['url'] for c in channels] == ['http://127.0.0.2:8900/ch/0/master.m3u8',
+                                            'http://127.0.0.2:8900/ch/1/master.m3u8']
+    origin.respond('POST', '/results', {}, json.dumps({'results': [{}, {}]}).encode())
+    assert origin.stats()['result_rows'] == 2
+
+    origin.error_rate = 1.0
+    assert origin.respond('GET', '/ch/0/master.m3u8', {}, b'')[0] == 503
+    assert origin.stats()['errors_injected'] == 1
+
+
+# ✅ Regressioner mot baseline och argument till delprocesserna
+def test_regressions_and_arguments():
+    baseline = {'runs': [{'channels': 100, 'checks_per_second': 50.0, 'cpu_ms_per_check': 10.0}]}
+    same = [{'channels': 100, 'checks_per_second': 45.0, 'cpu_ms_per_check': 11.0}]
+    worse = [{'channels': 100, 'checks_per_second': 30.0, 'cpu_ms_per_check': 13.0},
+             {'channels': 1000, 'checks_per_second': 1.0, 'cpu_ms_per_check': 99.0}]
+    assert regressions(same, baseline, 0.2) == []
+    assert len(regressions(worse, baseline, 0.2)) == 2
+    assert without_option(['--channels', '10', '100', '--duration', '5'], '--channels') == ['--duration', '5']
+    assert without_option(['--baseline=old.json', '--no-report'], '--baseline') == ['--no-report']
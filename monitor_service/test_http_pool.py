@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock, patch
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service.http_pool import HttpPool, origin_of, request_timeout
+
+# ✅ Kanaler på samma CDN delar origin-semafor
+@pytest.mark.asyncio
+async def test_origin_slot_shared_per_origin():
+    async with HttpPool(max_connections_per_origin=2) as pool:
+        a = pool.origin_slot("https://cdn.example/a/master.m3u8")
+        b = pool.origin_slot("https://cdn.example/b/master.m3u8")
+        c = pool.origin_slot("https://other.example/a/master.m3u8")
+        assert a is b
+        assert a is not c
+        assert origin_of("https://cdn.example:8443/x.m3u8") == "https://cdn.example:8443"
+
+# ✅ Alla anrop går genom samma underliggande klient
+@pytest.mark.asyncio
+async def test_pool_reuses_client():
+    async with HttpPool(stream_timeout=7, connect_timeout=2) as pool:
+        assert pool.client.timeout.read == 7
+        assert pool.client.timeout.connect == 2
+        with patch("httpx.AsyncClient.get", new_callable=AsyncMock) as mock_get:
+            await pool.get("https://cdn.example/1.m3u8")
+            await pool.get("https://cdn.example/2.m3u8")
+            assert mock_get.call_count == 2
+
+# ✅ requests-timeout har separat connect och read
+def test_request_timeout():
+    assert request_timeout(30, 5) == (5, 30)
+    assert request_timeout(3, 5) == (3, 3)
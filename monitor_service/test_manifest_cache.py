@@ -0,0 +1,67 @@
+import os
+import sys
+import httpx
+import m3u8
+from unittest.mock import Mock
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service.manifest_cache import ManifestCache, cache_lifetime, segment_count
+
+MEDIA = """#EXTM3U
+#EXT-X-TARGETDURATION:4
+#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,CAN-SKIP-UNTIL=24
+#EXT-X-MEDIA-SEQUENCE:100
+#EXTINF:4.0,
+seg100.ts
+#EXTINF:4.0,
+seg101.ts
+"""
+
+URL = "https://cdn.example/live/720p.m3u8"
+
+
+# ✅ Oförändrad body parsas inte om och ETag skickas vid nästa anrop
+def test_unchanged_body_is_not_reparsed(clock):
+    cache = ManifestCache(clock=clock)
+    parse = Mock(side_effect=m3u8.loads)
+    response = httpx.Response(200, headers={"ETag": '"v1"'}, text=MEDIA)
+
+    first = cache.store(URL, response, parse)
+    second = cache.store(URL, response, parse)
+
+    assert first is second
+    assert parse.call_count == 1
+    _, headers = cache.prepare(URL)
+    assert headers["If-None-Match"] == '"v1"'
+
+# ✅ Cache-Control max-age gör att inget anrop behövs
+def test_max_age_is_honoured(clock):
+    cache = ManifestCache(clock=clock)
+    cache.store(URL, httpx.Response(200, headers={"Cache-Control": "max-age=10", "Age": "4"}, text=MEDIA), m3u8.loads)
+
+    assert cache.fresh(URL) is not None
+    clock.now += 7
+    assert cache.fresh(URL) is None
+    assert cache_lifetime({"cache-control": "no-cache, max-age=10"}) == 0
+
+# ✅ Delta playlist och blocking reload begärs när origin stödjer det
+def test_delta_request_parameters(clock):
+    cache = ManifestCache(block_reload=True, clock=clock)
+    cache.store(URL, httpx.Response(200, text=MEDIA), m3u8.loads)
+
+    request_url, _ = cache.prepare(URL)
+    assert "_HLS_skip=YES" in request_url
+    assert "_HLS_msn=102" in request_url
+
+    # Kopian måste vara yngre än halva CAN-SKIP-UNTIL (24s) för att få begära delta
+    clock.now = 11.9
+    assert "_HLS_skip=YES" in cache.prepare(URL)[0]
+    clock.now = 12.0
+    assert "_HLS_skip" not in cache.prepare(URL)[0]
+
+# ✅ Segment som utelämnats i en delta playlist räknas med
+def test_segment_count_includes_skipped():
+    delta = m3u8.loads(MEDIA.replace("#EXT-X-MEDIA-SEQUENCE:100\n", "#EXT-X-MEDIA-SEQUENCE:100\n#EXT-X-SKIP:SKIPPED-SEGMENTS=50\n"))
+    assert segment_count(delta) == 52
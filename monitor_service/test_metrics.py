@@ -0,0 +1,94 @@
+import os
+import sys
+
+from prometheus_client import CollectorRegistry
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service.metrics import DETAIL_NONE, DETAIL_RENDITION, MonitorMetrics
+from monitor_service.status import ChannelStatus, RenditionStatus, ERROR_TIMEOUT, RED, YELLOW
+
+
+def _result(channel_id):
+    result = ChannelStatus(channel_id, f"https://cdn.example/{channel_id}/master.m3u8")
+    result.duration = 0.2
+    result.manifest_time = 0.05
+    rendition = RenditionStatus('variant', f"https://cdn.example/{channel_id}/720p.m3u8")
+    rendition.manifest_time = 0.03
+    rendition.ttfb = 0.04
+    rendition.throughput = 8e6
+    rendition.stall_seconds = 12.0
+    rendition.target_duration = 6
+    rendition.fail(RED, "Timeout vid hämtning av segment", ERROR_TIMEOUT)
+    result.renditions.append(rendition)
+    result.status = YELLOW
+    return result
+
+
+def _series(registry, name):
+    return [s for metric in registry.collect() for s in metric.samples if s.name == name]
+
+# ✅ Kanaler över gränsen hamnar under "other" och borttagna kanalers serier försvinner
+def test_metrics_cap_channel_labels_and_forget():
+    registry = CollectorRegistry()
+    metrics = MonitorMetrics(detail=DETAIL_RENDITION, max_channels=2, registry=registry)
+    for channel_id in (1, 2, 3, 4):
+        metrics.observe(_result(channel_id))
+
+    channels = {s.labels['channel'] for s in _series(registry, 'monitor_segment_ttfb_seconds_count')}
+    assert channels == {'1', '2', 'other'}
+    lag = {s.labels['channel']: s.value for s in _series(registry, 'monitor_media_sequence_lag_segments')}
+    assert lag == {'1': 2.0, '2': 2.0}
+    errors = {(s.labels['channel'], s.labels['error']): s.value for s in _series(registry, 'monitor_check_errors_total')}
+    assert errors[('other', 'timeout')] == 2
+
+    metrics.forget(1)
+    metrics.observe(_result(5))
+    channels = {s.labels['channel'] for s in _series(registry, 'monitor_segment_ttfb_seconds_count')}
+    assert channels == {'2', '5', 'other'}
+
+# ✅ Utan kanal-labels finns bara aggregerade serier
+def test_metrics_without_channel_labels():
+    registry = CollectorRegistry()
+    metrics = MonitorMetrics(detail=DETAIL_NONE, registry=registry)
+    metrics.observe(_result(1))
+    metrics.observe_lag(0.3)
+
+    assert _series(registry, 'monitor_check_duration_seconds_count')[0].value == 1
+    assert _series(registry, 'monitor_scheduler_lag_seconds_count')[0].value == 1
+    assert _series(registry, 'monitor_stall_seconds') == []
+
+# ✅ En kanal som tas bort medan den kontrolleras får inte tillbaka sina serier när kontrollen blir klar
+def test_removed_channel_series_stay_gone():
+    import asyncio
+    from unittest.mock import patch
+    from monitor_service.monitor import ChannelMonitor, MonitorWorker
+    from monitor_service.scheduler import PollScheduler
+
+    registry = CollectorRegistry()
+    worker = MonitorWorker("http://database_service:5000",
+                           metrics=MonitorMetrics(detail=DETAIL_RENDITION, registry=registry))
+    worker.scheduler = PollScheduler()
+    worker.apply_channels([{"id": 1, "url": "https://cdn.example/1/master.m3u8"}])
+    worker.metrics.observe(_result(1))
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def check(self, client, options):
+            await release.wait()
+            self.last_result = _result(1)
+            return self.last_result
+
+        with patch.object(ChannelMonitor, 'check', check):
+            task = asyncio.create_task(worker.run_check(None, worker.monitors[1], asyncio.Semaphore(1), 10))
+            await asyncio.sleep(0)
+            worker.apply_channels([])
+            release.set()
+            await task
+
+    asyncio.run(scenario())
+    samples = [s for metric in registry.collect() for s in metric.samples]
+    assert not [s for s in samples if s.labels.get('channel') == '1']
+    assert 1 not in worker.scheduler
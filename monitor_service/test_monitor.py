@@ -9,7 +9,8 @@ import asyncio
 # Se till att Python hittar projektets rotmapp
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from monitor_service.monitor import fetch_manifest, fetch_segment, monitor_hls_channel
+from monitor_service.monitor import (fetch_manifest, fetch_segment, monitor_hls_channel, MonitorWorker, check_channel,
+                                    CheckOptions)
 
 # ✅ Test för att hämta M3U8-manifest
 @pytest.mark.asyncio
@@ -95,3 +96,161 @@ async def test_monitor_hls_channel():
 
         mock_fetch_manifest.assert_called()
         mock_fetch_segment.assert_called()
+
+# ✅ Test för att MonitorWorker filtrerar och begränsar antalet kanaler
+@pytest.mark.asyncio
+async def test_worker_load_channels_respects_limit():
+    fake_response = AsyncMock()
+    fake_response.raise_for_status = lambda: None
+    fake_response.json = lambda: {"channels": [
+        {"id": i, "name": f"Kanal {i}", "url": f"https://cdn.example/{i}.m3u8"} for i in range(10, 0, -1)
+    ]}
+
+    worker = MonitorWorker("http://database_service:5000", max_channels=3, channel_ids={2, 4, 6, 8, 10})
+    async with httpx.AsyncClient() as client:
+        with patch.object(client, "get", new_callable=AsyncMock) as mock_get:
+            mock_get.return_value = fake_response
+            channels = await worker.load_channels(client)
+
+    assert [c["id"] for c in channels] == [2, 4, 6]
+
+# ✅ Test för att alla renditioner kontrolleras samtidigt och får egen status
+@pytest.mark.asyncio
+async def test_check_channel_checks_all_renditions_concurrently():
+    master = """#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aac",NAME="Svenska",URI="audio.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=1280000,RESOLUTION=640x360,AUDIO="aac"
+360p.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080,AUDIO="aac"
+1080p.m3u8
+"""
+    media = "#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXT-X-MEDIA-SEQUENCE:10\n#EXTINF:6.0,\nseg10.ts\n"
+
+    async def handler(request):
+        path = request.url.path
+        if path == "/live/master.m3u8":
+            return httpx.Response(200, text=master)
+        await asyncio.sleep(0.2)
+        if path == "/live/1080p.m3u8":
+            return httpx.Response(500)
+        if path.endswith(".m3u8"):
+            return httpx.Response(200, text=media)
+        return httpx.Response(200, stream=httpx.ByteStream(b"\x47" * 188))
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await check_channel("https://cdn.example/live/master.m3u8", client, channel_id=1)
+
+    statuses = {r.uri.rsplit("/", 1)[-1]: r.status for r in result.renditions}
+    assert statuses == {"360p.m3u8": "green", "1080p.m3u8": "red", "audio.m3u8": "green"}
+    assert result.status == "yellow"
+    # Tre renditioner à 2 x 0.2s ska ta ungefär som den långsammaste, inte summan
+    assert result.duration < 0.9
+
+# ✅ Test för att en worker utan CHANNEL_IDS bara hämtar sin egen shard
+@pytest.mark.asyncio
+async def test_worker_load_channels_fetches_own_shard():
+    requested = []
+
+    async def handler(request):
+        requested.append(request.url)
+        return httpx.Response(200, json={"channels": [{"id": 7, "name": "Kanal 7", "url": "https://cdn.example/7.m3u8"}]})
+
+    worker = MonitorWorker("http://database_service:5000", worker_id="3")
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        channels = await worker.load_channels(client)
+
+    assert [c["id"] for c in channels] == [7]
+    assert requested[0].params["worker_id"] == "3"
+
+# ✅ Test för att workern väntar på kanaländringar med long-poll, en shard hämtas separat när versionen ändrats
+@pytest.mark.asyncio
+async def test_worker_waits_for_channel_changes():
+    import time
+    requested = []
+    channels = [{"id": i, "name": f"Kanal {i}", "url": f"https://cdn.example/{i}.m3u8"} for i in (1, 2)]
+
+    async def handler(request):
+        requested.append(request.url)
+        if request.url.path == "/channels/changes":
+            return httpx.Response(200, json={"version": 4, "channels": channels})
+        return httpx.Response(200, json={"channels": channels[1:]}, headers={"X-Config-Version": "5"})
+
+    worker = MonitorWorker("http://database_service:5000", channel_ids={1})
+    worker.channels_version = 3
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        assert [c["id"] for c in await worker.wait_for_channels(client)] == [1]
+        assert requested[0].params["since"] == "3" and worker.channels_version == 4
+
+        sharded = MonitorWorker("http://database_service:5000", worker_id="3")
+        assert [c["id"] for c in await sharded.wait_for_channels(client)] == [2]
+        assert requested[-1].path == "/channels" and requested[-1].params["worker_id"] == "3"
+        assert sharded.channels_version == 5
+
+    # Ett 204 utan väntan (alla long-poll platser upptagna) ger inte en ny fråga direkt
+    worker = MonitorWorker("http://database_service:5000", config_poll_interval=0.05)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(204))) as client:
+        started = time.monotonic()
+        assert await worker.wait_for_channels(client, timeout=10) is None
+    assert time.monotonic() - started >= 0.05
+
+# ✅ Test för att kanaler byts på plats: nya schemaläggs, ändrade får ny monitor och borttagna avplaneras
+def test_worker_apply_channels_swaps_in_place():
+    from monitor_service.scheduler import PollScheduler
+
+    worker = MonitorWorker("http://database_service:5000")
+    worker.scheduler = PollScheduler()
+    worker.apply_channels([{"id": 1, "url": "https://cdn.example/1.m3u8"}, {"id": 2, "url": "https://cdn.example/2.m3u8"}])
+    unchanged = worker.monitors[1]
+    # Kanal 2 har en kontroll igång och ska få köra klart
+    worker.tasks[2] = object()
+
+    worker.apply_channels([{"id": 1, "url": "https://cdn.example/1.m3u8"}, {"id": 3, "url": "https://cdn.example/3.m3u8"}])
+
+    assert set(worker.monitors) == {1, 3}
+    assert worker.monitors[1] is unchanged
+    assert 2 not in worker.scheduler and 3 in worker.scheduler
+
+    worker.apply_channels([{"id": 1, "url": "https://cdn2.example/1.m3u8"}, {"id": 3, "url": "https://cdn.example/3.m3u8"}])
+    assert worker.monitors[1] is not unchanged
+    assert worker.monitors[1].url == "https://cdn2.example/1.m3u8"
+
+# ✅ Test för att antal segment att ladda ned måste vara 1-3, 0 skulle annars ladda ned alla
+def test_check_options_validates_probe_segments():
+    assert CheckOptions(probe_segments=3).probe_segments == 3
+    for probe_segments in (0, -1, 4):
+        with pytest.raises(ValueError):
+            CheckOptions(probe_segments=probe_segments)
+
+# ✅ Test för att LLHLS_BLOCKING_RELOAD slår på blocking reload i kanalernas manifest-cache
+def test_blocking_reload_from_env(monkeypatch):
+    from monitor_service.monitor import ChannelMonitor
+    from monitor_service.scheduler import PollScheduler
+
+    assert not ChannelMonitor(1, "https://cdn.example/1.m3u8", CheckOptions.from_env()).cache.block_reload
+    monkeypatch.setenv("LLHLS_BLOCKING_RELOAD", "1")
+    worker = MonitorWorker("http://database_service:5000", check_options=CheckOptions.from_env())
+    worker.scheduler = PollScheduler()
+    worker.apply_channels([{"id": 1, "url": "https://cdn.example/1.m3u8"}])
+    assert worker.monitors[1].cache.block_reload
+
+# ✅ Test för att single-läget returnerar status som brytaren kan använda, inte bara en loggsträng
+def test_check_stream_status_returns_status():
+    import requests
+    from monitor_service.monitor import check_stream_status
+
+    class Session:
+        def __init__(self, text=None):
+            self.text = text
+
+        def get(self, url, timeout=None):
+            if self.text is None:
+                raise requests.ConnectionError("Connection refused")
+            response = requests.Response()
+            response.status_code, response._content = 200, self.text.encode()
+            return response
+
+    media = "#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXTINF:6.0,\nseg1.ts\n"
+    for session, expected in ((Session(media), "green"), (Session("#EXTM3U\n"), "yellow"), (Session(), "red")):
+        with patch("monitor_service.monitor.get_session", return_value=session):
+            status, message = check_stream_status("https://cdn.example/live.m3u8")
+        assert status == expected and message
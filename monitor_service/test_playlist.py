@@ -0,0 +1,86 @@
+import os
+import sys
+import httpx
+import m3u8
+import pytest
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service.playlist import PlaylistParser, PlaylistSummary, as_summary, parse_playlist
+from monitor_service.manifest_cache import ManifestCache
+from monitor_service.monitor import fetch_manifest
+
+MASTER = """#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aac",NAME="Svenska",LANGUAGE="sv",URI="audio/sv.m3u8"
+#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",NAME="Svenska",LANGUAGE="sv",URI="subs/sv.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=1280000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2",AUDIO="aac",SUBTITLES="subs"
+360p.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080,AUDIO="aac"
+1080p.m3u8
+"""
+
+MEDIA = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:6
+#EXT-X-MEDIA-SEQUENCE:2680
+#EXTINF:6.000,
+seg2680.ts
+#EXTINF:6.000,
+seg2681.ts
+#EXT-X-DISCONTINUITY
+#EXTINF:5.500,
+seg2682.ts
+#EXTINF:6.000,
+seg2683.ts
+#EXT-X-ENDLIST
+"""
+
+# ✅ Strömmande parser ger samma resultat som m3u8.loads
+@pytest.mark.parametrize("text", [MASTER, MEDIA])
+def test_parser_matches_m3u8(text):
+    assert parse_playlist(text).as_dict() == as_summary(m3u8.loads(text)).as_dict()
+
+# ✅ Godtyckliga chunk-gränser (även mitt i rader) ger samma resultat
+def test_parser_handles_split_chunks():
+    parser = PlaylistParser()
+    data = MEDIA.encode()
+    for i in range(len(data)):
+        parser.feed(data[i:i + 1])
+    summary = parser.close()
+
+    assert summary.as_dict() == parse_playlist(MEDIA).as_dict()
+    assert summary.media_sequence == 2680
+    assert summary.target_duration == 6
+    assert summary.segment_count == 4
+    assert summary.discontinuities == 1
+    assert summary.endlist
+    assert summary.recent_segments == [("seg2681.ts", 6.0), ("seg2682.ts", 5.5), ("seg2683.ts", 6.0)]
+
+# ✅ Master playlist ger varianter och alternativa renditioner
+def test_parser_master_playlist():
+    summary = parse_playlist(MASTER)
+    assert summary.is_master
+    assert [(v.uri, v.bandwidth, v.resolution) for v in summary.variants] == [
+        ("360p.m3u8", 1280000, "640x360"), ("1080p.m3u8", 5000000, "1920x1080")]
+    assert [(m.type, m.uri) for m in summary.media] == [("AUDIO", "audio/sv.m3u8"), ("SUBTITLES", "subs/sv.m3u8")]
+
+# ✅ fetch_manifest med streaming=True och villkorlig revalidering
+@pytest.mark.asyncio
+async def test_fetch_manifest_streaming_with_cache():
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request)
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, headers={"ETag": '"v1"'}, content=MEDIA.encode())
+
+    cache = ManifestCache()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        first = await fetch_manifest("https://cdn.example/live.m3u8", client, cache, streaming=True)
+        second = await fetch_manifest("https://cdn.example/live.m3u8", client, cache, streaming=True)
+
+    assert isinstance(first, PlaylistSummary)
+    assert first is second
+    assert len(requests_seen) == 2
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import sys
+import httpx
+import pytest
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service.probe import probe_segment
+
+
+class SlowStream(httpx.AsyncByteStream):
+    """Segment som levereras i bitar med fördröjning"""
+
+    def __init__(self, chunks, delay):
+        self.chunks = chunks
+        self.delay = delay
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+# ✅ TTFB, nedladdningstid och genomströmning mäts
+@pytest.mark.asyncio
+async def test_probe_measures_download():
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=SlowStream([b"x" * 1000] * 4, 0.05)))
+    async with httpx.AsyncClient(transport=transport) as client:
+        probe = await probe_segment(client, "https://cdn.example/seg1.ts", media_duration=0.1)
+
+    assert probe.bytes == 4000
+    assert 0.04 < probe.ttfb < probe.download_time
+    assert probe.throughput == pytest.approx(4000 * 8 / probe.download_time)
+    # 0.1s media på ~0.2s nedladdning är långsammare än realtid
+    assert probe.realtime_factor() < 1
+
+# ✅ Range-probe slutar läsa även om servern ignorerar Range och jämförs mot BANDWIDTH
+@pytest.mark.asyncio
+async def test_range_probe_stops_early():
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("range"))
+        return httpx.Response(200, stream=SlowStream([b"x" * 1024] * 100, 0))
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        probe = await probe_segment(client, "https://cdn.example/seg1.ts", media_duration=6.0, range_bytes=2048)
+
+    assert seen == ["bytes=0-2047"]
+    assert probe.bytes == 2048
+    assert probe.partial
+    assert probe.realtime_factor(bandwidth=1) > 1
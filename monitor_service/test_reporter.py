@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+import sys
+import httpx
+import pytest
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service.reporter import ResultBuffer, result_rows
+from monitor_service.status import ChannelStatus, RenditionStatus
+
+
+def channel_result(channel_id, renditions=2):
+    result = ChannelStatus(channel_id, f"https://cdn.example/{channel_id}/master.m3u8")
+    for i in range(renditions):
+        result.renditions.append(RenditionStatus("variant", f"https://cdn.example/{channel_id}/{i}.m3u8"))
+    return result
+
+# ✅ En rad för kanalen och en per rendition
+def test_result_rows():
+    rows = result_rows(channel_result(7))
+    assert [row["rendition"] for row in rows] == ["", "https://cdn.example/7/0.m3u8", "https://cdn.example/7/1.m3u8"]
+    assert all(row["channel_id"] == 7 for row in rows)
+
+# ✅ Bufferten skickas i batchar när batch_size nås
+@pytest.mark.asyncio
+async def test_flush_on_batch_size():
+    batches = []
+
+    def handler(request):
+        batches.append(len(json.loads(request.content)["results"]))
+        return httpx.Response(201)
+
+    stop_event = asyncio.Event()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        buffer = ResultBuffer("http://database_service:5000", client, batch_size=6, flush_interval=60)
+        task = asyncio.create_task(buffer.run(stop_event))
+        buffer.add(channel_result(1))
+        buffer.add(channel_result(2))
+        await asyncio.sleep(0.05)
+        assert batches == [6]
+        buffer.add(channel_result(3))
+        stop_event.set()
+        await task
+
+    assert batches == [6, 3]
+    assert buffer.sent == 9
+
+# ✅ Misslyckad flush behåller raderna och bufferten är begränsad
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_rows_bounded():
+    async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(503))) as client:
+        buffer = ResultBuffer("http://database_service:5000", client, batch_size=100, max_buffered=5)
+        buffer.add(channel_result(1))
+        buffer.add(channel_result(2))
+        assert await buffer.flush() is False
+
+    assert len(buffer.rows) == 5
+    assert buffer.dropped == 1
+    assert buffer.rows[0]["channel_id"] == 1
+
+# ✅ Rader som kommer in under en misslyckad flush tränger ut batchens äldsta rader och räknas som släppta
+@pytest.mark.asyncio
+async def test_failed_flush_counts_overflow():
+    def handler(request):
+        # Kanal 2 och 3 kontrolleras medan batchen med kanal 1 skickas
+        buffer.add(channel_result(2))
+        buffer.add(channel_result(3))
+        return httpx.Response(503)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        buffer = ResultBuffer("http://database_service:5000", client, batch_size=100, max_buffered=7)
+        buffer.add(channel_result(1))
+        assert await buffer.flush() is False
+
+    assert len(buffer.rows) == 7
+    assert buffer.dropped == 2
+    assert [row["channel_id"] for row in buffer.rows] == [1, 2, 2, 2, 3, 3, 3]
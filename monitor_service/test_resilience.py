@@ -0,0 +1,187 @@
+import os
+import sys
+import random
+import pytest
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service.resilience import CircuitBreaker, FailurePolicy, RetryBudget, CLOSED, OPEN, HALF_OPEN
+from monitor_service.status import ChannelStatus, RED, ERROR_CONNECT, ERROR_STALLED
+
+
+def failed(channel_id, url, error=ERROR_CONNECT):
+    result = ChannelStatus(channel_id, url)
+    result.status, result.error = RED, error
+    return result
+
+
+# ✅ Brytaren öppnas efter tröskeln, släpper igenom ett prov och dubblar väntan om provet misslyckas
+def test_circuit_breaker_opens_and_probes(clock):
+    breaker = CircuitBreaker(2, recovery_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    # Bara ett prov åt gången
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.blocked_for() == 20
+
+    clock.now = 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+# ✅ Budgeten begränsar retries till en andel av de ordinarie kontrollerna
+def test_retry_budget_limits_retries(clock):
+    budget = RetryBudget(ratio=0.25, min_per_second=0, max_tokens=2, clock=clock)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    for _ in range(4):
+        budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+
+# ✅ Ett CDN-avbrott för många kanaler ger få retries och öppnar brytaren för hela origin
+def test_origin_outage_is_contained(clock):
+    policy = FailurePolicy(origin_failure_threshold=5, clock=clock, rng=random.Random(1))
+    retries = 0
+    for channel_id in range(400):
+        url = f"https://cdn.example/{channel_id}/index.m3u8"
+        if policy.before_check(channel_id, url) is not None:
+            continue
+        if policy.after_check(channel_id, url, failed(channel_id, url)) is not None:
+            retries += 1
+
+    assert retries <= 4
+    assert policy.before_check(999, "https://cdn.example/999/index.m3u8") > 0
+    # Andra origins påverkas inte
+    assert policy.before_check(1000, "https://other.example/index.m3u8") is None
+
+
+# ✅ Kanalbrytaren räknar slutgiltiga kontroller, inte varje omförsök
+def test_channel_breaker_counts_final_results(clock):
+    policy = FailurePolicy(channel_failure_threshold=3, max_retries=2, clock=clock, rng=random.Random(1))
+    url = "https://cdn.example/1.m3u8"
+    for check in range(2):
+        for attempt in range(3):
+            retry = policy.after_check(1, url, failed(1, url), attempt)
+            assert (retry is None) == (attempt == 2)
+        # Andra kanaler på samma origin svarar
+        policy.after_check(2, "https://cdn.example/2.m3u8", None)
+    assert policy.channels[1].state == CLOSED and policy.channels[1].failures == 2
+    for attempt in range(3):
+        policy.after_check(1, url, failed(1, url), attempt)
+    assert policy.channels[1].state == OPEN
+
+
+# ✅ En stoppad playlist är inget anropsfel och görs inte om
+def test_stalled_playlist_is_not_retried(clock):
+    policy = FailurePolicy(clock=clock)
+    url = "https://cdn.example/1.m3u8"
+    assert policy.after_check(1, url, failed(1, url, ERROR_STALLED)) is None
+    assert policy.channels[1].failures == 0
+
+
+# ✅ Ett misslyckat försök planeras om på schemaläggaren och rapporteras inte
+@pytest.mark.asyncio
+async def test_worker_reschedules_failed_check():
+    import asyncio
+    from unittest.mock import patch
+    from monitor_service.monitor import ChannelMonitor, MonitorWorker
+    from monitor_service.scheduler import PollScheduler
+
+    worker = MonitorWorker("http://database_service:5000",
+                           failure_policy=FailurePolicy(retry_base=0.5, rng=random.Random(1)))
+    worker.scheduler = PollScheduler()
+    worker.apply_channels([{"id": 1, "url": "https://cdn.example/1.m3u8"}])
+    monitor = worker.monitors[1]
+    reported = []
+
+    class Reporter:
+        def add(self, result):
+            reported.append(result)
+
+    async def check(self, client, options):
+        self.last_result = failed(1, self.url)
+        return self.last_result
+
+    worker.reporter = Reporter()
+    with patch.object(ChannelMonitor, 'check', check):
+        await worker.run_check(None, monitor, asyncio.Semaphore(1), 10)
+        assert monitor.attempt == 1 and reported == []
+        assert worker.scheduler.next_delay() <= 0.5
+
+        monitor.attempt = 2
+        await worker.run_check(None, monitor, asyncio.Semaphore(1), 10)
+    assert monitor.attempt == 0 and len(reported) == 1
+
+
+# ✅ Kanaler bakom en öppen brytare rapporteras röda varje varv istället för att försvinna
+@pytest.mark.asyncio
+async def test_open_circuit_reports_red_results(clock):
+    import asyncio
+    import httpx
+    from monitor_service.monitor import MonitorWorker
+    from monitor_service.scheduler import PollScheduler
+    from monitor_service.status import ERROR_CIRCUIT_OPEN
+
+    worker = MonitorWorker("http://database_service:5000", failure_policy=FailurePolicy(
+        origin_failure_threshold=3, max_retries=0, clock=clock, rng=random.Random(1)))
+    worker.scheduler = PollScheduler()
+    worker.apply_channels([{"id": i, "url": f"https://cdn.example/{i}/master.m3u8"} for i in range(5)])
+    reported = []
+
+    class Reporter:
+        def add(self, result):
+            reported.append(result)
+
+    worker.reporter = Reporter()
+    semaphore = asyncio.Semaphore(10)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(503))) as client:
+        for _ in range(4):
+            for channel_id in range(5):
+                worker.dispatch(client, semaphore, channel_id, 0)
+            await asyncio.gather(*worker.tasks.values())
+            clock.now += 10
+
+    assert len(reported) == 20 and all(r.status == RED for r in reported)
+    blocked = [r for r in reported if r.error == ERROR_CIRCUIT_OPEN]
+    # Första varvet startar alla kontroller innan någon svarat, därefter är origin-brytaren
+    # öppen och bara ett prov släpps igenom efter recovery_timeout (30s)
+    assert len(blocked) == 14
+    assert {r.channel_id for r in blocked} == set(range(5))
+
+
+# ✅ En kanal som tas bort medan den kontrolleras får ingen ny brytare när kontrollen blir klar
+@pytest.mark.asyncio
+async def test_removed_channel_breaker_stays_gone():
+    import asyncio
+    from unittest.mock import patch
+    from monitor_service.monitor import ChannelMonitor, MonitorWorker
+    from monitor_service.scheduler import PollScheduler
+
+    worker = MonitorWorker("http://database_service:5000", failure_policy=FailurePolicy(max_retries=0))
+    worker.scheduler = PollScheduler()
+    worker.apply_channels([{"id": 1, "url": "https://cdn.example/1.m3u8"}])
+    release = asyncio.Event()
+
+    async def check(self, client, options):
+        await release.wait()
+        self.last_result = failed(1, self.url)
+        return self.last_result
+
+    with patch.object(ChannelMonitor, 'check', check):
+        task = asyncio.create_task(worker.run_check(None, worker.monitors[1], asyncio.Semaphore(1), 10))
+        await asyncio.sleep(0)
+        worker.apply_channels([])
+        release.set()
+        await task
+    assert 1 not in worker.failure_policy.channels
+    assert 1 not in worker.scheduler
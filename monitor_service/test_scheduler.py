@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+import pytest
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service.scheduler import PollScheduler, jittered, poll_interval
+from monitor_service.stall import ADVANCING, WAITING
+from monitor_service.status import ChannelStatus, RenditionStatus
+
+
+def result_with(*renditions):
+    result = ChannelStatus(1, "https://cdn.example/master.m3u8")
+    for target_duration, verdict in renditions:
+        rendition = RenditionStatus("variant", "https://cdn.example/v.m3u8")
+        rendition.target_duration = target_duration
+        rendition.stall_verdict = verdict
+        result.renditions.append(rendition)
+    return result
+
+# ✅ Omplanering ersätter tidigare tid och borttagna nycklar körs aldrig
+def test_schedule_reschedule_and_remove(clock):
+    scheduler = PollScheduler(clock=clock)
+    scheduler.schedule("a", 5)
+    scheduler.schedule("b", 2)
+    scheduler.schedule("c", 1)
+    scheduler.schedule("a", 1.5)
+    scheduler.remove("c")
+
+    assert scheduler.next_delay() == 1.5
+    clock.now = 3
+    assert scheduler.pop_due() == [("a", 1.5), ("b", 1.0)]
+    assert len(scheduler) == 0
+    assert scheduler.next_delay() is None
+
+# ✅ Pollintervallet följer HLS reload-reglerna
+def test_poll_interval_follows_target_duration():
+    assert poll_interval(None, 10) == 10
+    assert poll_interval(result_with((6, ADVANCING), (4, WAITING)), 10) == 4
+    assert poll_interval(result_with((6, WAITING)), 10) == 3
+    assert poll_interval(result_with((1, WAITING)), 10, min_interval=1) == 1
+
+# ✅ Jitter håller sig inom ±10%
+def test_jitter_bounds():
+    values = [jittered(10, 0.1) for _ in range(1000)]
+    assert 9 <= min(values) and max(values) <= 11
+    assert len(set(values)) > 1
+
+# ✅ run() anropar dispatch när poster förfaller och vaknar för nya poster
+@pytest.mark.asyncio
+async def test_run_dispatches_due_keys():
+    scheduler = PollScheduler()
+    stop_event = asyncio.Event()
+    dispatched = []
+
+    def dispatch(key, lateness):
+        dispatched.append(key)
+        if key == "first":
+            scheduler.schedule("second", 0.05)
+        else:
+            stop_event.set()
+
+    scheduler.schedule("first", 0.05)
+    await asyncio.wait_for(scheduler.run(dispatch, stop_event), timeout=2)
+    assert dispatched == ["first", "second"]
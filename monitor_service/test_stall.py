@@ -0,0 +1,59 @@
+import os
+import sys
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service.playlist import parse_playlist
+from monitor_service.stall import ChannelState, ADVANCING, WAITING, STALLED, ENDED, RESET
+
+
+def media(sequence, count=3, endlist=False):
+    lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:4", f"#EXT-X-MEDIA-SEQUENCE:{sequence}"]
+    for i in range(count):
+        lines += ["#EXTINF:4.0,", f"seg{sequence + i}.ts"]
+    if endlist:
+        lines.append("#EXT-X-ENDLIST")
+    return parse_playlist("\n".join(lines))
+
+
+# ✅ En playlist som slutar uppdateras flaggas efter stall_factor * target duration
+def test_stall_detected_after_target_duration_multiple(clock):
+    state = ChannelState(stall_factor=3, clock=clock)
+
+    assert state.observe("720p", media(100)).verdict == ADVANCING
+    clock.now = 4
+    assert state.observe("720p", media(101)).verdict == ADVANCING
+    clock.now = 10
+    assert state.observe("720p", media(101)).verdict == WAITING
+    clock.now = 17
+    observed = state.observe("720p", media(101))
+    assert observed.verdict == STALLED
+    assert observed.stall_seconds == 13
+    clock.now = 18
+    assert state.observe("720p", media(102)).verdict == ADVANCING
+
+# ✅ ENDLIST och bakåtgående media sequence räknas inte som stopp
+def test_ended_and_reset(clock):
+    state = ChannelState(clock=clock)
+    state.observe("vod", media(0, endlist=True))
+    clock.now = 100
+    assert state.observe("vod", media(0, endlist=True)).verdict == ENDED
+
+    state.observe("live", media(500))
+    clock.now = 104
+    assert state.observe("live", media(0)).verdict == RESET
+
+# ✅ Historiken har fast storlek och borttagna renditioner släpps
+def test_bounded_history_and_retain(clock):
+    state = ChannelState(history=4, clock=clock)
+    for i in range(10):
+        clock.now = i * 4
+        state.observe("720p", media(100 + i))
+    observed = state.renditions["720p"]
+    assert [p for _, p in observed.history()] == [109, 110, 111, 112]
+    assert observed.advance_rate() == 0.25
+
+    state.observe("1080p", media(100))
+    state.retain(["1080p"])
+    assert list(state.renditions) == ["1080p"]
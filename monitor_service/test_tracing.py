@@ -0,0 +1,62 @@
+import os
+import sys
+import httpx
+import pytest
+import structlog
+from structlog.testing import capture_logs
+
+# Se till att Python hittar projektets rotmapp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from monitor_service import tracing
+from monitor_service.monitor import fetch_manifest
+
+MEDIA = b"#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXT-X-MEDIA-SEQUENCE:1\n#EXTINF:6.0,\nseg1.ts\n"
+
+
+@pytest.fixture
+def trace_all():
+    tracing.configure_tracing(1.0)
+    yield
+    tracing.configure_tracing(0)
+    structlog.reset_defaults()
+
+
+# ✅ Avstängd tracing skapar inga trace-objekt
+def test_disabled_tracing_is_noop():
+    tracing.configure_tracing(0)
+    assert tracing.start_trace('manifest', 'https://cdn.example/a.m3u8') is None
+
+
+# ✅ httpcore-händelser blir tider per fas, utan connect räknas anslutningen som återanvänd
+@pytest.mark.asyncio
+async def test_request_trace_phases(trace_all):
+    trace = tracing.start_trace('segment', 'https://cdn.example/seg1.ts')
+    for name in ('http11.send_request_headers', 'http11.receive_response_headers', 'http11.receive_response_body'):
+        await trace(f'{name}.started', {})
+        await trace(f'{name}.complete', {})
+    trace.add('parse', 0.0)
+
+    with capture_logs() as logs:
+        trace.emit(status=200)
+
+    event = logs[0]
+    assert event['event'] == 'http_trace'
+    assert event['kind'] == 'segment'
+    assert event['reused'] is True
+    assert event['status'] == 200
+    assert {'send_ms', 'wait_ms', 'body_ms', 'parse_ms', 'total_ms'} <= set(event)
+
+
+# ✅ Strömmande manifesthämtning loggar status och parsningstid när den samplas
+@pytest.mark.asyncio
+async def test_streamed_manifest_is_traced(trace_all):
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=MEDIA))
+    async with httpx.AsyncClient(transport=transport) as client:
+        with capture_logs() as logs:
+            summary = await fetch_manifest("https://cdn.example/a.m3u8", client=client, streaming=True)
+
+    assert summary.media_sequence == 1
+    assert [log['kind'] for log in logs] == ['manifest']
+    assert logs[0]['status'] == 200
+    assert 'parse_ms' in logs[0]
@@ -0,0 +1,115 @@
+import logging
+import random
+import time
+
+import structlog
+
+# Andel anrop som tidsmäts per fas, 0 stänger av tracing helt
+DEFAULT_SAMPLE_RATE = 0.0
+
+# httpcore trace-händelser -> fas
+_PHASES = {
+    'connection.connect_tcp': 'connect',
+    'connection.connect_unix_socket': 'connect',
+    'connection.start_tls': 'tls',
+    'http11.send_request_headers': 'send',
+    'http11.send_request_body': 'send',
+    'http2.send_request_headers': 'send',
+    'http2.send_request_body': 'send',
+    'http11.receive_response_headers': 'wait',
+    'http2.receive_response_headers': 'wait',
+    'http11.receive_response_body': 'body',
+    'http2.receive_response_body': 'body',
+}
+
+_sample_rate = DEFAULT_SAMPLE_RATE
+logger = structlog.get_logger('monitor_service.trace')
+
+
+def configure_tracing(sample_rate=DEFAULT_SAMPLE_RATE):
+    """Sätt samplingsgrad och skicka structlog-händelser som JSON via vanliga logging"""
+    global _sample_rate
+    _sample_rate = max(0.0, min(1.0, sample_rate))
+    if _sample_rate > 0:
+        structlog.configure(
+            processors=[
+                structlog.processors.TimeStamper(fmt='iso'),
+                structlog.processors.JSONRenderer(),
+            ],
+            logger_factory=structlog.stdlib.LoggerFactory(),
+            wrapper_class=structlog.make_filtering_bound_logger(logging.INFO),
+        )
+
+
+def sampled():
+    return _sample_rate > 0 and (_sample_rate >= 1 or random.random() < _sample_rate)
+
+
+class RequestTrace:
+    """
+    Tider per fas för ett HTTP-anrop, fylls i av httpx trace-extension.
+    Saknas connect/tls återanvändes en befintlig anslutning (DNS ingår i connect).
+    """
+    __slots__ = ('kind', 'url', 'phases', 'fields', '_started', '_begin')
+
+    def __init__(self, kind, url):
+        self.kind = kind
+        self.url = str(url)
+        self.phases = {}
+        self.fields = {}
+        self._started = {}
+        self._begin = time.perf_counter()
+
+    async def __call__(self, event, info):
+        name, _, stage = event.rpartition('.')
+        phase = _PHASES.get(name)
+        if phase is None:
+            return
+        now = time.perf_counter()
+        if stage == 'started':
+            self._started[name] = now
+        else:
+            started = self._started.pop(name, None)
+            if started is not None:
+                self.add(phase, now - started)
+
+    def extensions(self):
+        return {'trace': self}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def emit(self, **fields):
+        phases = dict(self.phases)
+        # Parsning sker medan body läses, räkna den bara en gång
+        if 'parse' in phases and 'body' in phases:
+            phases['body'] = max(0.0, phases['body'] - phases['parse'])
+        logger.info(
+            'http_trace',
+            kind=self.kind,
+            url=self.url,
+            reused='connect' not in phases,
+            total_ms=round((time.perf_counter() - self._begin) * 1000, 2),
+            **{f'{phase}_ms': round(seconds * 1000, 2) for phase, seconds in phases.items()},
+            **self.fields,
+            **fields,
+        )
+
+
+def start_trace(kind, url):
+    """En RequestTrace om anropet samplas, annars None (det enda som kostar när tracing är av)"""
+    if not sampled():
+        return None
+    return RequestTrace(kind, url)
+
+
+def trace_response(response, *args, **kwargs):
+    """requests response-hook för det synkrona läget, där bara tiden till headers finns"""
+    if sampled():
+        logger.info(
+            'http_trace',
+            kind='sync',
+            url=response.url,
+            status=response.status_code,
+            wait_ms=round(response.elapsed.total_seconds() * 1000, 2),
+        )